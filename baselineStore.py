@@ -0,0 +1,330 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from itertools import groupby
+from icecream import ic
+from outputSinks import add_output_arguments, sink_from_args
+from latencyStats import HdrHistogram, mann_whitney
+
+
+# Constants
+BASELINE_METRICS = ("load_time", "ttfb", "size_kb")
+COMPARED_PERCENTILES = (50, 95)
+DEFAULT_ALPHA = 0.01
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+MIN_SAMPLES = 5
+# Every key of a comparison, e.g. for CSV columns
+COMPARISON_FIELDS = (
+    "url", "metric", "status", "baseline_count", "current_count",
+    *(f"{side}_p{percent}" for percent in COMPARED_PERCENTILES for side in ("baseline", "current")),
+    *(f"p{percent}_change" for percent in COMPARED_PERCENTILES),
+    "p_value", "q_value",
+)
+
+
+class BaselineStore:
+    """
+    SQLite store of per-URL performance distributions.
+    Every URL keeps one serialized HdrHistogram per metric of BASELINE_METRICS, so
+    a baseline takes a few hundred bytes per metric however many samples it holds.
+    """
+
+    def __init__(self, path):
+        """
+        Open (or create) the database.
+        Args:
+            path (str): The database file.
+        """
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS baselines (
+                url TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                histogram BLOB NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (url, metric)
+            ) WITHOUT ROWID
+            """
+        )
+        self.connection.commit()
+
+    def save(self, url, histograms):
+        """
+        Replace the baseline of a URL.
+        Runs without any measured metric (e.g. every sample failed) leave the stored
+        baseline untouched.
+        Args:
+            url (str): The URL.
+            histograms (dict): A mapping of metric name to HdrHistogram; metrics
+                outside BASELINE_METRICS are ignored.
+        Returns:
+            bool: True if the baseline was saved.
+        """
+        rows = [
+            (url, metric, histograms[metric].to_bytes(), time.time())
+            for metric in BASELINE_METRICS if metric in histograms and histograms[metric].total_count
+        ]
+        if not rows:
+            ic(f"No measurements for {url}, keeping its stored baseline")
+            return False
+        self.connection.execute("DELETE FROM baselines WHERE url = ?", (url,))
+        self.connection.executemany("INSERT INTO baselines VALUES (?, ?, ?, ?)", rows)
+        self.connection.commit()
+        return True
+
+    def load(self, url):
+        """
+        Load the baseline of a URL.
+        Args:
+            url (str): The URL.
+        Returns:
+            dict: A mapping of metric name to HdrHistogram, empty if there is no baseline.
+        """
+        return {
+            metric: HdrHistogram.from_bytes(blob)
+            for metric, blob in self.connection.execute(
+                "SELECT metric, histogram FROM baselines WHERE url = ?", (url,)
+            )
+        }
+
+    def runs(self, current_path):
+        """
+        Pair the baselines with the runs stored in another database, one URL at a time.
+        Only one URL's histograms are decoded at a time, so memory use does not grow
+        with the number of URLs.
+        Args:
+            current_path (str): The database with the runs to compare.
+        Yields:
+            tuple: (url, baseline histograms, current histograms) for every URL of the
+                other database; the baseline mapping is empty for new URLs.
+        """
+        self.connection.execute("ATTACH DATABASE ? AS current", (current_path,))
+        try:
+            rows = self.connection.execute(
+                """
+                SELECT run.url, run.metric, run.histogram, baselines.histogram
+                FROM current.baselines AS run
+                LEFT JOIN main.baselines AS baselines USING (url, metric)
+                ORDER BY run.url
+                """
+            )
+            for url, group in groupby(rows, key=lambda row: row[0]):
+                baseline = {}
+                current = {}
+                for _, metric, run_blob, baseline_blob in group:
+                    current[metric] = HdrHistogram.from_bytes(run_blob)
+                    if baseline_blob is not None:
+                        baseline[metric] = HdrHistogram.from_bytes(baseline_blob)
+                yield url, baseline, current
+        finally:
+            self.connection.execute("DETACH DATABASE current")
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def relative_change(baseline, current):
+    """
+    Get the relative change from a baseline value.
+    Args:
+        baseline (float): The baseline value.
+        current (float): The current value.
+    Returns:
+        float: e.g. 0.25 for 25% higher; infinite if the baseline is 0 and the current is not.
+    """
+    if baseline:
+        return current / baseline - 1
+    return float("inf") if current else 0.0
+
+
+def compare_metric(baseline, current):
+    """
+    Compare the current distribution of a metric with its baseline.
+    Args:
+        baseline (HdrHistogram): The baseline distribution.
+        current (HdrHistogram): The current distribution.
+    Returns:
+        dict: The sample counts, the COMPARED_PERCENTILES of both with their relative
+            change, and the one-sided Mann-Whitney p-value of the current values
+            being larger (None if either side has fewer than MIN_SAMPLES values).
+    """
+    comparison = {"baseline_count": baseline.total_count, "current_count": current.total_count}
+    for percent in COMPARED_PERCENTILES:
+        before = baseline.percentile(percent)
+        after = current.percentile(percent)
+        comparison[f"baseline_p{percent}"] = before
+        comparison[f"current_p{percent}"] = after
+        comparison[f"p{percent}_change"] = (
+            None if before is None or after is None else relative_change(before, after)
+        )
+    enough = min(baseline.total_count, current.total_count) >= MIN_SAMPLES
+    comparison["p_value"] = mann_whitney(baseline, current)[1] if enough else None
+    return comparison
+
+
+def benjamini_hochberg(p_values):
+    """
+    Adjust p-values for testing many URLs and metrics at once.
+    Args:
+        p_values (list): The p-values.
+    Returns:
+        list: The Benjamini-Hochberg q-values (false discovery rates), in the same order.
+    """
+    count = len(p_values)
+    q_values = [1.0] * count
+    smallest = 1.0
+    for rank, index in enumerate(sorted(range(count), key=p_values.__getitem__, reverse=True)):
+        smallest = min(smallest, p_values[index] * count / (count - rank))
+        q_values[index] = smallest
+    return q_values
+
+
+def compare_runs(runs, alpha=DEFAULT_ALPHA, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compare current runs with their baselines and flag regressions.
+    A metric regresses when its values are significantly larger than the baseline's
+    (Mann-Whitney, with the false discovery rate over all comparisons kept at alpha)
+    and its p50 or p95 grew by at least the threshold, so tiny but consistent
+    shifts are not flagged.
+    Args:
+        runs (iterable): (url, baseline histograms, current histograms) tuples, where
+            the histograms map metric names to HdrHistograms.
+        alpha (float): The accepted false discovery rate.
+        threshold (float): The minimum relative growth of p50 or p95, e.g. 0.1 for 10%.
+    Returns:
+        list: One comparison per URL and metric, with a "status" of "regression",
+            "ok", "insufficient" (too few samples) or "new" (no baseline).
+    """
+    comparisons = []
+    for url, baseline, histograms in runs:
+        for metric in BASELINE_METRICS:
+            if metric not in histograms:
+                continue
+            comparison = {"url": url, "metric": metric}
+            if metric in baseline:
+                comparison.update(compare_metric(baseline[metric], histograms[metric]))
+            comparisons.append(comparison)
+
+    tested = [comparison for comparison in comparisons if comparison.get("p_value") is not None]
+    for comparison, q_value in zip(tested, benjamini_hochberg([comparison["p_value"] for comparison in tested])):
+        comparison["q_value"] = q_value
+    for comparison in comparisons:
+        if "baseline_count" not in comparison:
+            comparison["status"] = "new"
+        elif comparison["p_value"] is None:
+            comparison["status"] = "insufficient"
+        else:
+            grew = any(
+                (comparison[f"p{percent}_change"] or 0) >= threshold for percent in COMPARED_PERCENTILES
+            )
+            comparison["status"] = "regression" if comparison["q_value"] <= alpha and grew else "ok"
+    return comparisons
+
+
+def generate_comparison_report(comparisons, show_all=False, file=None):
+    """
+    Print the regressions (or every comparison) against the baseline.
+    Args:
+        comparisons (list): The result of compare_runs.
+        show_all (bool): Whether to list every comparison instead of only regressions.
+        file (file): Where to print the report (default: stdout).
+    """
+    statuses = {}
+    for comparison in comparisons:
+        statuses[comparison["status"]] = statuses.get(comparison["status"], 0) + 1
+    print("\nBaseline Comparison", file=file)
+    print("=" * 110, file=file)
+    print(", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())) or "Nothing to compare",
+          file=file)
+    listed = [
+        comparison for comparison in comparisons
+        if show_all or comparison["status"] == "regression"
+    ]
+    if listed:
+        print(f"{'Status':<13}{'Metric':<11}{'Base p50':>10}{'p50':>10}{'Change':>9}"
+              f"{'Base p95':>10}{'p95':>10}{'Change':>9}{'q':>9}  URL", file=file)
+    for comparison in listed:
+        if "baseline_count" not in comparison:
+            print(f"{comparison['status']:<13}{comparison['metric']:<11}{'':>86}  {comparison['url']}", file=file)
+            continue
+        # Times are shown in milliseconds, the size in KB
+        scale = 1 if comparison["metric"] == "size_kb" else 1000
+        columns = ""
+        for percent in COMPARED_PERCENTILES:
+            change = comparison[f"p{percent}_change"]
+            columns += (f"{comparison[f'baseline_p{percent}'] * scale:>10.1f}"
+                        f"{comparison[f'current_p{percent}'] * scale:>10.1f}"
+                        f"{change:>+9.1%}")
+        q_value = comparison.get("q_value")
+        q_text = f"{q_value:>9.4f}" if q_value is not None else f"{'-':>9}"
+        print(f"{comparison['status']:<13}{comparison['metric']:<11}{columns}{q_text}  {comparison['url']}", file=file)
+    print("=" * 110, file=file)
+
+
+# Main function to handle CLI arguments
+def main():
+    """
+    Main function to compare a whole store of current runs with a baseline store.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare the runs saved in one baseline store with another and flag regressions."
+    )
+    parser.add_argument("baseline", type=str, help="The baseline database.")
+    parser.add_argument("current", type=str, help="The database with the runs to check.")
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=DEFAULT_ALPHA,
+        help=f"Accepted false discovery rate over all comparisons (default: {DEFAULT_ALPHA})."
+    )
+    parser.add_argument(
+        "--regression-threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help=f"Minimum relative growth of p50 or p95 to flag (default: {DEFAULT_REGRESSION_THRESHOLD})."
+    )
+    parser.add_argument("--all", action="store_true", help="List every comparison, not only regressions.")
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    # A mistyped path must not pass as "nothing to compare"
+    for path in (args.baseline, args.current):
+        if not os.path.exists(path):
+            parser.error(f"database not found: {path}")
+
+    try:
+        sink = sink_from_args(args, fields=COMPARISON_FIELDS)
+    except (OSError, RuntimeError) as e:
+        parser.error(str(e))
+
+    with BaselineStore(args.baseline) as baseline:
+        comparisons = compare_runs(baseline.runs(args.current), args.alpha, args.regression_threshold)
+    ic(f"Compared {len({comparison['url'] for comparison in comparisons})} URLs with the baseline")
+    # Keep stdout clean for the records when they are streamed there
+    report = sys.stderr if sink is not None and sink.path == "-" else sys.stdout
+    generate_comparison_report(comparisons, args.all, report)
+    if sink is not None:
+        with sink:
+            for comparison in comparisons:
+                sink.write(comparison)
+
+    # Fail the run when anything regressed, e.g. in CI
+    if any(comparison["status"] == "regression" for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import json
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlsplit
+from outputSinks import to_jsonable
+
+
+# Constants
+HAR_VERSION = "1.2"
+HAR_CREATOR = {"name": "template-scraper", "version": "0.1.0"}
+
+
+def har_timestamp(epoch):
+    """
+    Format a Unix timestamp as a HAR ISO 8601 date.
+    Args:
+        epoch (float): Seconds since the epoch.
+    Returns:
+        str: e.g. "2024-01-31T12:00:00.123Z".
+    """
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def to_ms(seconds):
+    """
+    Convert a phase duration to HAR milliseconds.
+    Args:
+        seconds (float): The duration, or None if the phase did not happen.
+    Returns:
+        float: The milliseconds, or -1 for phases that did not happen.
+    """
+    return -1 if seconds is None else round(seconds * 1000, 3)
+
+
+def har_headers(pairs):
+    """
+    Convert (name, value) pairs to HAR header objects.
+    Args:
+        pairs (list): The headers as pairs.
+    Returns:
+        list: [{"name", "value"}] objects.
+    """
+    return [{"name": name, "value": value} for name, value in pairs]
+
+
+def header_value(pairs, name):
+    """
+    Get the first value of a header from (name, value) pairs.
+    Args:
+        pairs (list): The headers as pairs.
+        name (str): The header name, in lower case.
+    Returns:
+        str | None: The value, or None if the header is missing.
+    """
+    return next((value for key, value in pairs if key.lower() == name), None)
+
+
+def hop_entry(hop, page_id, content_size=None, body_size=None, queued=0.0):
+    """
+    Build a HAR entry for one traced request hop.
+    Args:
+        hop (dict): A hop record from PhaseTrace.results().
+        page_id (str): The id of the page the request belongs to.
+        content_size (int): The decoded body size; taken from Content-Length if not given.
+        body_size (int): The body size on the wire; taken from Content-Length if not given.
+        queued (float): Seconds the request waited before it was sent, added to "blocked".
+    Returns:
+        dict: The HAR entry.
+    """
+    timings = hop["timings"]
+    response_headers = hop["response_headers"]
+    content_length = header_value(response_headers, "content-length")
+    content_length = int(content_length) if content_length and content_length.isdigit() else -1
+
+    connect = timings["connect"]
+    if connect is not None and timings["tls"] is not None:
+        # HAR counts the TLS handshake in both "connect" and "ssl"
+        connect += timings["tls"]
+    blocked = None
+    if timings["blocked"] is not None or queued:
+        blocked = (timings["blocked"] or 0.0) + queued
+    har_timings = {
+        "blocked": to_ms(blocked),
+        "dns": to_ms(timings["dns"]),
+        "connect": to_ms(connect),
+        "ssl": to_ms(timings["tls"]),
+        "send": max(0, to_ms(timings["send"])),
+        "wait": max(0, to_ms(timings["wait"])),
+        "receive": max(0, to_ms(timings["receive"])),
+    }
+
+    entry = {
+        "pageref": page_id,
+        "startedDateTime": har_timestamp(hop["started_at"] - queued),
+        "time": round(sum(value for key, value in har_timings.items() if key != "ssl" and value > 0), 3),
+        "request": {
+            "method": hop["method"],
+            "url": hop["url"],
+            "httpVersion": hop["http_version"] or "HTTP/1.1",
+            "cookies": [],
+            "headers": har_headers(hop["request_headers"]),
+            "queryString": har_headers(parse_qsl(urlsplit(hop["url"]).query, keep_blank_values=True)),
+            "headersSize": -1,
+            "bodySize": 0,
+        },
+        "response": {
+            "status": hop["status_code"] or 0,
+            "statusText": hop.get("reason") or "",
+            "httpVersion": hop["http_version"] or "",
+            "cookies": [],
+            "headers": har_headers(response_headers),
+            "content": {
+                "size": content_length if content_size is None else content_size,
+                "mimeType": header_value(response_headers, "content-type") or "x-unknown",
+            },
+            "redirectURL": hop["location"] or "",
+            "headersSize": -1,
+            "bodySize": content_length if body_size is None else body_size,
+        },
+        "cache": {},
+        "timings": har_timings,
+    }
+    if content_size is not None and body_size is not None and content_size > body_size:
+        entry["response"]["content"]["compression"] = content_size - body_size
+    if hop["server_address"]:
+        entry["serverIPAddress"] = hop["server_address"]
+    if hop["status_code"] is None:
+        entry["response"]["_error"] = "No response"
+    return entry
+
+
+def traced_entries(hops, page_id, wire_bytes=None, decoded_bytes=None, queued=0.0):
+    """
+    Build the HAR entries of a traced request and its redirect hops.
+    Args:
+        hops (list): The hop records from PhaseTrace.results().
+        page_id (str): The id of the page the requests belong to.
+        wire_bytes (int): The final body's size on the wire (optional).
+        decoded_bytes (int): The final body's decoded size (optional).
+        queued (float): Seconds the first request waited before it was sent.
+    Returns:
+        list: One HAR entry per hop.
+    """
+    entries = []
+    for number, hop in enumerate(hops):
+        final = number == len(hops) - 1
+        entries.append(hop_entry(
+            hop,
+            page_id,
+            content_size=decoded_bytes if final else None,
+            body_size=wire_bytes if final else None,
+            queued=queued if number == 0 else 0.0,
+        ))
+    return entries
+
+
+class HarWriter:
+    """
+    Writes a HAR 1.2 log incrementally.
+    Entries are written to the file as they are added, and only the small page
+    list is kept until close(), which is why "entries" comes before "pages".
+    """
+
+    def __init__(self, path):
+        """
+        Open the HAR file and write the log header.
+        Args:
+            path (str): The output file.
+        """
+        self.path = path
+        self.pages = []
+        self.entry_count = 0
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write(
+            f'{{"log": {{"version": "{HAR_VERSION}", "creator": {json.dumps(HAR_CREATOR)}, "entries": ['
+        )
+
+    def add_page(self, title, started_at, on_load=None):
+        """
+        Register a page that entries can refer to.
+        Args:
+            title (str): The page title, e.g. its URL.
+            started_at (float): Unix timestamp of the page's first request.
+            on_load (float): Seconds until the page finished loading (optional).
+        Returns:
+            str: The page id.
+        """
+        page_id = f"page_{len(self.pages) + 1}"
+        self.pages.append({
+            "startedDateTime": har_timestamp(started_at),
+            "id": page_id,
+            "title": title,
+            "pageTimings": {"onContentLoad": -1, "onLoad": to_ms(on_load)},
+        })
+        return page_id
+
+    def add_entry(self, entry):
+        """
+        Write one entry.
+        Args:
+            entry (dict): The HAR entry.
+        """
+        self.file.write(("," if self.entry_count else "") + "\n" + json.dumps(entry, default=to_jsonable))
+        self.entry_count += 1
+
+    def add_results(self, results, title):
+        """
+        Write a fetch_url_details result as a page with one entry per redirect hop.
+        Args:
+            results (dict): The result of fetch_url_details.
+            title (str): The page title, e.g. the requested URL.
+        """
+        if not results.get("hops"):
+            return
+        transfer = results.get("transfer") or {}
+        total = results["hops"][-1]["start_offset"] + results["hops"][-1]["total_time"]
+        page_id = self.add_page(title, results["hops"][0]["started_at"], total)
+        for entry in traced_entries(
+            results["hops"], page_id, transfer.get("wire_bytes"), transfer.get("decoded_bytes")
+        ):
+            self.add_entry(entry)
+
+    def add_waterfall(self, resources, totals, title):
+        """
+        Write a waterfall as a page with one entry per request of every resource.
+        Args:
+            resources (list): The resource records from load_page.
+            totals (dict): The totals from load_page.
+            title (str): The page title, e.g. the page URL.
+        """
+        traced = [resource for resource in resources if resource["hops"]]
+        if not traced:
+            return
+        document = traced[0]
+        started_at = document["hops"][0]["started_at"] - document["queued"] - document["start_offset"]
+        page_id = self.add_page(title, started_at, totals["load_time"])
+        for resource in traced:
+            for entry in traced_entries(
+                resource["hops"], page_id, resource["wire_bytes"], resource["decoded_bytes"], resource["queued"]
+            ):
+                self.add_entry(entry)
+
+    def close(self):
+        """
+        Write the page list and close the file.
+        """
+        self.file.write(f'\n], "pages": {json.dumps(self.pages)}}}}}\n')
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,344 @@
+import math
+import zlib
+import base64
+import struct
+from array import array
+from fractions import Fraction
+from itertools import compress
+
+
+# Constants
+SUMMARY_PERCENTILES = (50, 90, 99)
+DEFAULT_UNIT = 1e-6
+DEFAULT_HIGHEST = 3600 * 10 ** 6
+DEFAULT_SIGNIFICANT_FIGURES = 3
+SERIAL_VERSION = 1
+SERIAL_HEADER = struct.Struct("<BqqBd")
+
+
+def encode_varint(value, out):
+    """
+    Append a zigzag-encoded variable-length integer to a bytearray.
+    Args:
+        value (int): The integer; negative values are allowed.
+        out (bytearray): The buffer to append to.
+    """
+    value = (value << 1) ^ (value >> 63)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data):
+    """
+    Decode the zigzag-encoded variable-length integers written by encode_varint.
+    Args:
+        data (bytes): The encoded integers.
+    Yields:
+        int: Each integer.
+    """
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            yield (value >> 1) ^ -(value & 1)
+            value = 0
+            shift = 0
+
+
+class HdrHistogram:
+    """
+    HDR-style histogram for recording latencies in constant memory.
+    Values are tracked from the unit (e.g. 1 microsecond) up to the highest
+    trackable value with a fixed number of significant decimal digits: every
+    recorded value lands in a bucket whose width is at most 10^-figures of the
+    value, so any percentile is answered with that relative precision no matter
+    how many values were recorded. Values above the range are clamped to it.
+    Histograms with the same settings can be merged, e.g. across workers.
+    """
+
+    def __init__(self, highest=DEFAULT_HIGHEST, significant_figures=DEFAULT_SIGNIFICANT_FIGURES, unit=DEFAULT_UNIT):
+        """
+        Args:
+            highest (int): The highest trackable value, in units.
+            significant_figures (int): The number of significant decimal digits, 1 to 5.
+            unit (float): The value of one unit in the caller's scale, e.g. 1e-6 to
+                record seconds with microsecond resolution.
+        """
+        if not 1 <= significant_figures <= 5:
+            raise ValueError("significant_figures must be between 1 and 5")
+        self.highest = max(2, int(highest))
+        self.significant_figures = significant_figures
+        self.unit = unit
+
+        largest_single_unit_value = 2 * 10 ** significant_figures
+        self.sub_bucket_count_magnitude = math.ceil(math.log2(largest_single_unit_value))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+        smallest_untrackable = self.sub_bucket_count
+        self.bucket_count = 1
+        while smallest_untrackable <= self.highest:
+            smallest_untrackable <<= 1
+            self.bucket_count += 1
+        self.counts = array("q", [0]) * ((self.bucket_count + 1) * self.sub_bucket_half_count)
+
+        self.total_count = 0
+        self.total = 0
+        self.min_value = None
+        self.max_value = None
+        self.clamped = 0
+
+    def _index(self, value):
+        bucket_index = max(0, (value | self.sub_bucket_mask).bit_length() - self.sub_bucket_half_count_magnitude - 1)
+        sub_bucket_index = value >> bucket_index
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket_index - self.sub_bucket_half_count
+
+    def _range(self, index):
+        # The lowest value and the width of the bucket at a counts index
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        return sub_bucket_index << bucket_index, 1 << bucket_index
+
+    def record(self, value, count=1):
+        """
+        Record a value.
+        Args:
+            value (float): The value in the caller's scale, e.g. seconds.
+            count (int): How many times to record it.
+        """
+        units = max(0, round(value / self.unit))
+        if units > self.highest:
+            units = self.highest
+            self.clamped += count
+        self.counts[self._index(units)] += count
+        self.total_count += count
+        self.total += units * count
+        self.min_value = units if self.min_value is None else min(self.min_value, units)
+        self.max_value = units if self.max_value is None else max(self.max_value, units)
+
+    def merge(self, other):
+        """
+        Add the values of another histogram with the same settings.
+        Args:
+            other (HdrHistogram): The histogram to add.
+        """
+        if (other.highest, other.significant_figures, other.unit) != (
+            self.highest, self.significant_figures, self.unit
+        ):
+            raise ValueError("Cannot merge histograms with different settings")
+        for index, count in other.nonzero():
+            self.counts[index] += count
+        self.total_count += other.total_count
+        self.total += other.total
+        self.clamped += other.clamped
+        if other.total_count:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+            self.max_value = other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+
+    def nonzero(self):
+        """
+        Iterate over the non-empty buckets by their index in the counts array.
+        Empty buckets are skipped at C speed, so sparse histograms are cheap to walk.
+        Yields:
+            tuple: (index, count) in ascending order of value.
+        """
+        if not self.total_count:
+            return
+        # Only the buckets between the smallest and largest recorded value can be non-empty
+        start = self._index(self.min_value)
+        end = self._index(self.max_value) + 1
+        counts = self.counts
+        for index in compress(range(start, end), counts[start:end]):
+            yield index, counts[index]
+
+    def buckets(self):
+        """
+        Iterate over the non-empty buckets in ascending order.
+        Yields:
+            tuple: (representative value in the caller's scale, count), where the value
+                is the middle of the bucket, kept within the recorded minimum and maximum
+                so a histogram of identical values reports that value exactly.
+        """
+        for index, count in self.nonzero():
+            lowest, width = self._range(index)
+            yield min(max(lowest + width // 2, self.min_value), self.max_value) * self.unit, count
+
+    def percentile(self, percent):
+        """
+        Get the value at a percentile.
+        Args:
+            percent (float): The percentile, from 0 to 100.
+        Returns:
+            float | None: The highest value equivalent to the percentile's bucket, capped at
+                the recorded maximum, or None if nothing was recorded.
+        """
+        if not self.total_count:
+            return None
+        # The rank in exact arithmetic: in floats, p99.9 of 100000 values would be rank 99901
+        target = max(1, math.ceil(Fraction(str(percent)) * self.total_count / 100))
+        seen = 0
+        for index, count in self.nonzero():
+            seen += count
+            if seen >= target:
+                lowest, width = self._range(index)
+                return min(max(lowest + width - 1, self.min_value), self.max_value) * self.unit
+        return self.max_value * self.unit
+
+    @property
+    def mean(self):
+        """
+        The exact mean of the recorded values (at unit resolution), or None if empty.
+        """
+        return self.total / self.total_count * self.unit if self.total_count else None
+
+    def stddev(self):
+        """
+        Get the standard deviation of the buckets' representative values.
+        As in HdrHistogram, the mean it deviates from is taken over the same values,
+        so identical values have no spread.
+        Returns:
+            float | None: The population standard deviation, or None if empty.
+        """
+        if not self.total_count:
+            return None
+        buckets = list(self.buckets())
+        mean = sum(value * count for value, count in buckets) / self.total_count
+        variance = sum((value - mean) ** 2 * count for value, count in buckets) / self.total_count
+        return math.sqrt(variance)
+
+    def summary(self):
+        """
+        Describe the recorded distribution.
+        Returns:
+            dict: count, min, mean, p50, p90, p99, max and stddev in the caller's scale.
+        """
+        summary = {
+            "count": self.total_count,
+            "min": self.min_value * self.unit if self.total_count else None,
+            "mean": self.mean,
+        }
+        for percent in SUMMARY_PERCENTILES:
+            summary[f"p{percent}"] = self.percentile(percent)
+        summary["max"] = self.max_value * self.unit if self.total_count else None
+        summary["stddev"] = self.stddev()
+        return summary
+
+    def to_bytes(self):
+        """
+        Serialize the histogram compactly.
+        The counts are written as varints with runs of empty buckets collapsed into
+        one negative number, then zlib-compressed.
+        Returns:
+            bytes: The serialized histogram.
+        """
+        body = bytearray()
+        for value in (self.total_count, self.total, self.min_value or 0, self.max_value or 0, self.clamped):
+            encode_varint(value, body)
+        previous = -1
+        for index, count in self.nonzero():
+            if index - previous > 1:
+                encode_varint(previous + 1 - index, body)
+            encode_varint(count, body)
+            previous = index
+        header = SERIAL_HEADER.pack(SERIAL_VERSION, self.highest, len(self.counts), self.significant_figures, self.unit)
+        return header + zlib.compress(bytes(body))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuild a histogram serialized with to_bytes.
+        Args:
+            data (bytes): The serialized histogram.
+        Returns:
+            HdrHistogram: The histogram.
+        """
+        version, highest, length, significant_figures, unit = SERIAL_HEADER.unpack_from(data)
+        if version != SERIAL_VERSION:
+            raise ValueError(f"Unsupported histogram version {version}")
+        histogram = cls(highest, significant_figures, unit)
+        values = decode_varints(zlib.decompress(data[SERIAL_HEADER.size:]))
+        total_count, total, min_value, max_value, clamped = (next(values) for _ in range(5))
+        index = 0
+        for value in values:
+            if value < 0:
+                index -= value
+            else:
+                histogram.counts[index] = value
+                index += 1
+        histogram.total_count = total_count
+        histogram.total = total
+        histogram.clamped = clamped
+        if total_count:
+            histogram.min_value = min_value
+            histogram.max_value = max_value
+        return histogram
+
+    def to_text(self):
+        """
+        Serialize the histogram as base64 text, e.g. for JSON output.
+        Returns:
+            str: The serialized histogram.
+        """
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Rebuild a histogram serialized with to_text.
+        Args:
+            text (str): The serialized histogram.
+        Returns:
+            HdrHistogram: The histogram.
+        """
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def mann_whitney(baseline, current):
+    """
+    One-sided Mann-Whitney U test of whether current values tend to be larger.
+    The test runs on two histograms with the same settings instead of raw values:
+    values in the same bucket count as ties, so it walks only the non-empty
+    buckets. The p-value uses the normal approximation with tie and continuity
+    corrections.
+    Args:
+        baseline (HdrHistogram): The reference distribution.
+        current (HdrHistogram): The distribution to test.
+    Returns:
+        tuple: (U of current over baseline, p-value), or (None, None) if either is empty.
+    """
+    n1 = baseline.total_count
+    n2 = current.total_count
+    if not n1 or not n2:
+        return None, None
+    if (baseline.highest, baseline.significant_figures, baseline.unit) != (
+        current.highest, current.significant_figures, current.unit
+    ):
+        raise ValueError("Cannot compare histograms with different settings")
+
+    baseline_counts = dict(baseline.nonzero())
+    current_counts = dict(current.nonzero())
+    u = 0.0
+    below = 0
+    ties = 0
+    for index in sorted(baseline_counts.keys() | current_counts.keys()):
+        a = baseline_counts.get(index, 0)
+        b = current_counts.get(index, 0)
+        # Each current value beats the baseline values below it and half of its ties
+        u += b * (below + a / 2)
+        below += a
+        ties += (a + b) ** 3 - (a + b)
+
+    total = n1 + n2
+    variance = n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
@@ -0,0 +1,203 @@
+import math
+import time
+import httpx
+import asyncio
+from icecream import ic
+from latencyStats import HdrHistogram
+
+
+# Constants
+DEFAULT_STEP_DURATION = 30.0
+DEFAULT_RAMP_UP = 5.0
+DEFAULT_MAX_IN_FLIGHT = 100
+DEFAULT_LOAD_TIMEOUT = 10.0
+
+
+def slot_offset(number, rate, previous_rate=0.0, ramp_up=0.0):
+    """
+    Get the start time of a request in a schedule that ramps linearly between two rates.
+    The schedule sends request number n when the integral of the rate reaches n.
+    Args:
+        number (int): The request number, from 0.
+        rate (float): The target requests per second after the ramp-up.
+        previous_rate (float): The requests per second at the start of the ramp-up.
+        ramp_up (float): Seconds to ramp from previous_rate to rate.
+    Returns:
+        float: Seconds from the start of the step.
+    """
+    ramp_requests = ramp_up * (previous_rate + rate) / 2
+    if number >= ramp_requests:
+        return ramp_up + (number - ramp_requests) / rate
+    # Solve previous_rate * t + (rate - previous_rate) * t^2 / (2 * ramp_up) = number
+    slope = (rate - previous_rate) / (2 * ramp_up)
+    if slope == 0:
+        return number / previous_rate
+    return (-previous_rate + math.sqrt(previous_rate ** 2 + 4 * slope * number)) / (2 * slope)
+
+
+class StepStats:
+    """
+    Counters and latency histogram of one load step.
+    Only requests that complete within the measured window, after the step's
+    ramp-up and before its end, are counted, so the throughput is the number of
+    requests divided by the window's duration.
+    """
+
+    def __init__(self, measure_from, measure_until):
+        """
+        Args:
+            measure_from (float): perf_counter() time from which requests are counted.
+            measure_until (float): perf_counter() time after which requests are no longer counted.
+        """
+        self.measure_from = measure_from
+        self.measure_until = measure_until
+        self.latencies = HdrHistogram()
+        self.errors = 0
+        self.bytes = 0
+        self.status_codes = {}
+        self.error_types = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def record(self, latency, status_code=None, error_type=None, size=0):
+        """
+        Record one completed request.
+        Args:
+            latency (float): Seconds from sending the request to reading the whole body.
+            status_code (int): The response status, or None if the request failed.
+            error_type (str): The exception class name if the request failed.
+            size (int): The number of body bytes received.
+        """
+        if not self.measure_from <= time.perf_counter() <= self.measure_until:
+            return
+        self.latencies.record(latency)
+        self.bytes += size
+        if status_code is not None:
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        if error_type is not None:
+            self.error_types[error_type] = self.error_types.get(error_type, 0) + 1
+        if error_type is not None or status_code >= 400:
+            self.errors += 1
+
+
+async def send_one(client, url, stats):
+    """
+    Send one GET request, discard the body and record the outcome.
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to request.
+        stats (StepStats): The step to record into.
+    """
+    stats.in_flight += 1
+    stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+    started = time.perf_counter()
+    try:
+        async with client.stream("GET", url) as response:
+            async for chunk in response.aiter_raw():
+                pass
+        stats.record(time.perf_counter() - started, response.status_code,
+                     size=response.num_bytes_downloaded)
+    except httpx.HTTPError as e:
+        stats.record(time.perf_counter() - started, error_type=type(e).__name__)
+    finally:
+        stats.in_flight -= 1
+
+
+async def run_step(client, url, duration, ramp_up, concurrency=None, rate=None, previous_rate=0.0,
+                   max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """
+    Drive the URL for one step of the schedule with closed-loop workers.
+    With a concurrency, that many workers each send their next request as soon as
+    the previous one finished; the workers are started evenly over the ramp-up.
+    With a rate, up to max_in_flight workers take request start times from a
+    shared schedule that ramps linearly from previous_rate to rate. Workers that
+    fall behind send immediately, so an achieved throughput below the target
+    means the target (or max_in_flight) is saturated.
+    Args:
+        client (httpx.AsyncClient): The client to send the requests with.
+        url (str): The URL to request.
+        duration (float): Seconds to measure after the ramp-up.
+        ramp_up (float): Seconds to ramp up before measuring.
+        concurrency (int): The number of concurrent workers.
+        rate (float): The target requests per second (instead of a concurrency).
+        previous_rate (float): The rate to ramp up from.
+        max_in_flight (int): The maximum number of concurrent requests in rate mode.
+    Returns:
+        dict: The step's throughput, error rate, status codes, error types and latency summary.
+    """
+    started = time.perf_counter()
+    measure_from = started + ramp_up
+    end = measure_from + duration
+    stats = StepStats(measure_from, end)
+    next_number = 0
+
+    def take_slot():
+        nonlocal next_number
+        slot = started + slot_offset(next_number, rate, previous_rate, ramp_up)
+        next_number += 1
+        return slot if slot < end else None
+
+    async def concurrency_worker(number):
+        await asyncio.sleep(ramp_up * number / concurrency)
+        while time.perf_counter() < end:
+            await send_one(client, url, stats)
+
+    async def rate_worker():
+        while (slot := take_slot()) is not None:
+            await asyncio.sleep(max(0.0, slot - time.perf_counter()))
+            await send_one(client, url, stats)
+
+    if rate is None:
+        workers = [concurrency_worker(number) for number in range(concurrency)]
+    else:
+        workers = [rate_worker() for _ in range(max_in_flight)]
+    await asyncio.gather(*workers)
+
+    requests = stats.latencies.total_count
+    return {
+        "concurrency": concurrency,
+        "target_rps": rate,
+        "duration": duration,
+        "requests": requests,
+        "throughput_rps": requests / duration if duration else 0.0,
+        "errors": stats.errors,
+        "error_rate": stats.errors / requests if requests else 0.0,
+        "bytes": stats.bytes,
+        "peak_in_flight": stats.peak_in_flight,
+        "status_codes": stats.status_codes,
+        "error_types": stats.error_types,
+        "latency": stats.latencies.summary() if requests else None,
+    }
+
+
+async def run_load(url, headers, concurrency_steps=None, rate_steps=None, duration=DEFAULT_STEP_DURATION,
+                   ramp_up=DEFAULT_RAMP_UP, max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=DEFAULT_LOAD_TIMEOUT):
+    """
+    Run a step schedule of concurrency levels or target rates against a URL.
+    All steps share one connection pool, so later steps start with warm connections.
+    Args:
+        url (str): The URL to request.
+        headers (dict): The headers to use for the requests.
+        concurrency_steps (list): The concurrency of each step.
+        rate_steps (list): The target requests per second of each step (instead of concurrency_steps).
+        duration (float): Seconds to measure per step.
+        ramp_up (float): Seconds to ramp up at the start of each step.
+        max_in_flight (int): The maximum number of concurrent requests in rate mode.
+        timeout (float): The request timeout in seconds.
+    Yields:
+        dict: The result of each step, numbered from 1.
+    """
+    levels = concurrency_steps or rate_steps
+    pool_size = max(concurrency_steps) if concurrency_steps else max_in_flight
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=timeout) as client:
+        previous_rate = 0.0
+        for number, level in enumerate(levels, start=1):
+            ic(f"Load step {number}: {level} {'workers' if concurrency_steps else 'requests/s'} for {duration}s")
+            if concurrency_steps:
+                result = await run_step(client, url, duration, ramp_up, concurrency=level)
+            else:
+                result = await run_step(client, url, duration, ramp_up, rate=level,
+                                        previous_rate=previous_rate, max_in_flight=max_in_flight)
+                previous_rate = level
+            yield {"step": number, **result}
@@ -0,0 +1,339 @@
+import math
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from icecream import ic
+
+
+# Constants
+DEFAULT_METRICS_HOST = "127.0.0.1"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+METRIC_FAMILIES = {
+    "probe_requests": ("counter", "Probe requests by tool and status code (\"none\" without a response)."),
+    "probe_errors": ("counter", "Failed probe requests by tool and error class."),
+    "probe_bytes": ("counter", "Response body bytes received by tool."),
+    "probe_in_flight": ("gauge", "Probe requests in flight by tool."),
+    "probe_duration_seconds": ("histogram", "Probe request duration by tool."),
+    "probe_phase_seconds": ("histogram", "Probe request phase duration by tool and phase."),
+}
+
+
+class MetricsShard:
+    """
+    The metric values updated by one thread.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms kept in per-thread shards.
+    Every thread updates only its own shard, so the hot path takes no lock; the
+    shards are summed when the metrics are scraped. Series are keyed by the
+    family name and a tuple of (label, value) pairs.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Args:
+            buckets (tuple): The histogram bucket upper bounds in seconds, ascending.
+        """
+        self.buckets = tuple(buckets)
+        self.local = threading.local()
+        self.shards = []
+        self.shards_lock = threading.Lock()
+
+    def shard(self):
+        """
+        Get the calling thread's shard, creating it on first use.
+        Returns:
+            MetricsShard: The shard.
+        """
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = MetricsShard()
+            with self.shards_lock:
+                self.shards.append(shard)
+            return shard
+
+    def add(self, name, labels=(), value=1):
+        """
+        Add to a counter or gauge; gauges go down with a negative value.
+        Args:
+            name (str): The metric family, e.g. "probe_requests".
+            labels (tuple): (label, value) pairs.
+            value (float): The amount to add.
+        """
+        values = self.shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """
+        Record a value in a histogram.
+        Args:
+            name (str): The metric family, e.g. "probe_duration_seconds".
+            labels (tuple): (label, value) pairs.
+            value (float): The observed value in seconds.
+        """
+        histograms = self.shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # One count per bucket plus +Inf, followed by the sum
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def collect(self):
+        """
+        Sum the shards of every thread.
+        Returns:
+            tuple: (values, histograms) mapping (name, labels) to a number or to
+                per-bucket counts followed by the sum.
+        """
+        with self.shards_lock:
+            shards = list(self.shards)
+        values = {}
+        histograms = {}
+        for shard in shards:
+            # Copies are taken in one step so the owning thread can keep writing
+            for key, value in shard.values.copy().items():
+                values[key] = values.get(key, 0) + value
+            for key, histogram in shard.histograms.copy().items():
+                histogram = list(histogram)
+                if key in histograms:
+                    histograms[key] = [total + count for total, count in zip(histograms[key], histogram)]
+                else:
+                    histograms[key] = histogram
+        return values, histograms
+
+    def render(self, openmetrics=False):
+        """
+        Format the metrics in the Prometheus text or OpenMetrics exposition format.
+        Args:
+            openmetrics (bool): Whether to use the OpenMetrics format.
+        Returns:
+            str: The exposition text.
+        """
+        values, histograms = self.collect()
+        series = {}
+        for (name, labels), value in values.items():
+            series.setdefault(name, []).append((labels, value))
+        for (name, labels), histogram in histograms.items():
+            series.setdefault(name, []).append((labels, histogram))
+
+        lines = []
+        for name in sorted(series):
+            kind, description = METRIC_FAMILIES[name]
+            suffix = "_total" if kind == "counter" else ""
+            family = name if openmetrics else name + suffix
+            lines.append(f"# HELP {family} {description}")
+            lines.append(f"# TYPE {family} {kind}")
+            for labels, value in sorted(series[name]):
+                if kind != "histogram":
+                    lines.append(f"{name}{suffix}{format_labels(labels)} {format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), value):
+                    cumulative += count
+                    le = ("le", format_bound(bound))
+                    lines.append(f"{name}_bucket{format_labels(labels + (le,))} {cumulative}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(value[-1])}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    """
+    Format label pairs for the exposition format.
+    Args:
+        labels (tuple): (label, value) pairs.
+    Returns:
+        str: e.g. '{tool="robots",code="200"}', or "" without labels.
+    """
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def format_value(value):
+    """
+    Format a sample value, without a fraction for whole numbers.
+    Args:
+        value (float): The value.
+    Returns:
+        str: The formatted value.
+    """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_bound(bound):
+    """
+    Format a histogram bucket bound as a canonical float for the le label,
+    so a bucket has the same series in the Prometheus and OpenMetrics formats.
+    Args:
+        bound (float): The bucket upper bound, or math.inf.
+    Returns:
+        str: e.g. "0.25", "1.0" or "+Inf".
+    """
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+# The registry every tool reports to
+REGISTRY = MetricsRegistry()
+
+
+def record_probe(tool, status_code=None, error_class=None, duration=None, size=0, phases=None, registry=REGISTRY):
+    """
+    Count one finished probe request.
+    Args:
+        tool (str): The reporting tool, e.g. "robots".
+        status_code (int): The response status, or None without a response.
+        error_class (str): The exception class name if the probe failed (optional).
+        duration (float): Seconds the request took (optional).
+        size (int): Response body bytes received.
+        phases (dict): Seconds per phase, with None for phases that did not happen (optional).
+        registry (MetricsRegistry): The registry to update.
+    """
+    tool_label = (("tool", tool),)
+    registry.add("probe_requests", tool_label + (("code", str(status_code or "none")),))
+    if error_class:
+        registry.add("probe_errors", tool_label + (("error", error_class),))
+    if size:
+        registry.add("probe_bytes", tool_label, size)
+    if duration is not None:
+        registry.observe("probe_duration_seconds", tool_label, duration)
+    for phase, seconds in (phases or {}).items():
+        if seconds is not None:
+            registry.observe("probe_phase_seconds", tool_label + (("phase", phase),), seconds)
+
+
+@contextmanager
+def track_in_flight(tool, registry=REGISTRY):
+    """
+    Count a probe request as in flight while the block runs.
+    Args:
+        tool (str): The reporting tool.
+        registry (MetricsRegistry): The registry to update.
+    """
+    labels = (("tool", tool),)
+    registry.add("probe_in_flight", labels, 1)
+    try:
+        yield
+    finally:
+        registry.add("probe_in_flight", labels, -1)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the registry on /metrics, in OpenMetrics format if the scraper asks for it.
+    """
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.registry.render(openmetrics).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent, keep them out of the tool's output
+        pass
+
+
+def start_metrics_server(port, host=DEFAULT_METRICS_HOST, registry=REGISTRY):
+    """
+    Serve the metrics from a background thread.
+    Args:
+        port (int): The port to listen on.
+        host (str): The address to listen on.
+        registry (MetricsRegistry): The registry to serve.
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    handler = type("RegistryMetricsHandler", (MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    ic(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def stop_metrics_server(server, linger=0.0):
+    """
+    Stop a metrics server, optionally serving the final values for a while first.
+    Args:
+        server (ThreadingHTTPServer): The server, or None if none was started.
+        linger (float): Seconds to keep serving so a scraper can collect the final values.
+    """
+    if server is None:
+        return
+    if linger > 0:
+        ic(f"Serving final metrics for {linger:g} seconds")
+        try:
+            time.sleep(linger)
+        except KeyboardInterrupt:
+            pass
+    server.shutdown()
+    server.server_close()
+
+
+def add_metrics_arguments(parser):
+    """
+    Add the shared --metrics options to a command-line parser.
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus/OpenMetrics probe metrics on this port while running."
+    )
+    parser.add_argument(
+        "--metrics-host",
+        type=str,
+        default=DEFAULT_METRICS_HOST,
+        help=f"Address for the metrics endpoint (default: {DEFAULT_METRICS_HOST})."
+    )
+    parser.add_argument(
+        "--metrics-linger",
+        type=float,
+        default=0.0,
+        help="Seconds to keep serving the metrics after the run finishes (default: 0)."
+    )
+
+
+def metrics_server_from_args(args):
+    """
+    Start the metrics server selected with the options from add_metrics_arguments.
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+    Returns:
+        ThreadingHTTPServer | None: The server, or None if no port was given.
+    """
+    if args.metrics_port is None:
+        return None
+    return start_metrics_server(args.metrics_port, args.metrics_host)
@@ -0,0 +1,341 @@
+import time
+import httpx
+import random
+import signal
+import asyncio
+import argparse
+from icecream import ic
+from outputSinks import add_output_arguments, sink_from_args
+from metricsExporter import (
+    add_metrics_arguments, metrics_server_from_args, record_probe, stop_metrics_server, track_in_flight
+)
+from phaseTiming import PhaseTrace, TransferMeter, create_timed_async_client, warm_up_async_backend
+from timeSeriesStore import DEFAULT_RETENTION, TimeSeriesStore
+
+
+# Constants
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+)
+DEFAULT_DB = "monitor.sqlite"
+DEFAULT_INTERVAL = 60.0
+DEFAULT_JITTER = 0.1
+DEFAULT_CONCURRENCY = 10
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_KEEPALIVE = 300.0
+PRUNE_INTERVAL = 3600.0
+# Every key of a sample, e.g. for CSV columns
+SAMPLE_FIELDS = (
+    "url", "timestamp", "status_code", "ok", "bytes", "total_ms", "ttfb_ms",
+    "dns_ms", "connect_ms", "tls_ms", "wait_ms", "receive_ms", "error",
+)
+
+
+def load_targets(path, default_interval=DEFAULT_INTERVAL):
+    """
+    Load the URLs to monitor.
+    Each line holds a URL and optionally its probe interval in seconds; blank
+    lines and lines starting with "#" are skipped.
+    Args:
+        path (str): The targets file.
+        default_interval (float): The interval for URLs without one.
+    Returns:
+        list: (url, interval) pairs.
+    """
+    targets = []
+    with open(path, "r") as file:
+        for number, line in enumerate(file, start=1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            url = fields[0]
+            try:
+                parsed = httpx.URL(url)
+                # httpx percent-encodes characters that cannot appear in a host name
+                valid = parsed.scheme in ("http", "https") and bool(parsed.host) and "%" not in parsed.host
+            except httpx.InvalidURL:
+                valid = False
+            if not valid:
+                ic(f"Skipping line {number}: {url} is not an http(s) URL")
+                continue
+            try:
+                interval = float(fields[1]) if len(fields) > 1 else default_interval
+            except ValueError:
+                ic(f"Skipping line {number}: invalid interval {fields[1]!r}")
+                continue
+            targets.append((url, max(interval, 1.0)))
+    return targets
+
+
+async def probe_url(client, url):
+    """
+    Probe a URL once with phase tracing and a streamed, discarded body.
+    Args:
+        client (httpx.AsyncClient): A client from create_timed_async_client.
+        url (str): The URL to probe.
+    Returns:
+        dict: A sample for TimeSeriesStore.record, plus "error" if the request failed.
+    """
+    timestamp = time.time()
+    status_code = None
+    error = None
+    error_class = None
+    with PhaseTrace() as trace, track_in_flight("monitor"):
+        meter = TransferMeter(trace.started)
+        try:
+            async with client.stream(
+                "GET", url, follow_redirects=True, extensions={"trace": trace.atrace}
+            ) as response:
+                async for chunk in response.aiter_bytes():
+                    meter.update(len(chunk), response.num_bytes_downloaded)
+                meter.finish()
+            status_code = response.status_code
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            error_class = type(e).__name__
+            error = str(e) or error_class
+    total = time.perf_counter() - trace.started
+    results = trace.results()
+    record_probe("monitor", status_code, error_class, total, meter.wire_bytes, results["timings"])
+
+    def ms(seconds):
+        return None if seconds is None else seconds * 1000
+
+    sample = {
+        "url": url,
+        "timestamp": timestamp,
+        "status_code": status_code,
+        "ok": error is None and status_code < 400,
+        "bytes": meter.wire_bytes,
+        "total_ms": ms(total),
+        "ttfb_ms": ms(results["ttfb"]),
+        **{f"{phase}_ms": ms(results["timings"][phase]) for phase in ("dns", "connect", "tls", "wait", "receive")},
+    }
+    if error is not None:
+        sample["error"] = error
+    return sample
+
+
+async def monitor_target(url, interval, jitter, client, semaphore, store, stop, sink=None):
+    """
+    Probe one URL on its interval until stopped.
+    The first probe is placed randomly within the first interval so targets do not
+    fire together, and every interval is stretched or shrunk by up to the jitter.
+    Args:
+        url (str): The URL to probe.
+        interval (float): Seconds between probes.
+        jitter (float): The maximum relative change of each interval, e.g. 0.1.
+        client (httpx.AsyncClient): The shared client.
+        semaphore (asyncio.Semaphore): Limits the number of concurrent probes.
+        store (TimeSeriesStore): Where to record the samples.
+        stop (asyncio.Event): Set to stop monitoring.
+        sink (OutputSink): Where to stream the samples as well (optional).
+    """
+    loop = asyncio.get_running_loop()
+    next_run = loop.time() + random.uniform(0, interval)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=max(0.0, next_run - loop.time()))
+            return
+        except asyncio.TimeoutError:
+            pass
+
+        async with semaphore:
+            sample = await probe_url(client, url)
+        store.record(sample)
+        if sink is not None:
+            sink.write(sample)
+        if not sample["ok"]:
+            ic(f"Probe failed for {url}: {sample.get('error') or sample['status_code']}")
+
+        # Skip runs that were missed instead of firing them back to back
+        next_run = max(next_run + interval * (1 + random.uniform(-jitter, jitter)), loop.time())
+
+
+async def prune_periodically(store, stop):
+    """
+    Apply the retention policy now and then every PRUNE_INTERVAL seconds until stopped.
+    Args:
+        store (TimeSeriesStore): The store to prune.
+        stop (asyncio.Event): Set to stop pruning.
+    """
+    while not stop.is_set():
+        store.prune()
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=PRUNE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_monitor(targets, store, user_agent, jitter=DEFAULT_JITTER, concurrency=DEFAULT_CONCURRENCY,
+                      timeout=DEFAULT_TIMEOUT, keepalive=DEFAULT_KEEPALIVE, duration=None, sink=None):
+    """
+    Monitor every target until interrupted (or for a fixed duration).
+    All probes share one client whose idle connections are kept for the keepalive
+    time, so probes reuse warm connections instead of reconnecting every run.
+    Args:
+        targets (list): (url, interval) pairs.
+        store (TimeSeriesStore): Where to record the samples.
+        user_agent (str): The user agent to use for the requests.
+        jitter (float): The maximum relative change of each interval.
+        concurrency (int): The maximum number of concurrent probes.
+        timeout (float): The request timeout in seconds.
+        keepalive (float): Seconds to keep idle connections open.
+        duration (float): Seconds to run before stopping (optional).
+        sink (OutputSink): Where to stream the samples as well (optional).
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+    if duration:
+        loop.call_later(duration, stop.set)
+
+    limits = httpx.Limits(max_connections=concurrency, keepalive_expiry=keepalive)
+    semaphore = asyncio.Semaphore(concurrency)
+    await warm_up_async_backend()
+    async with create_timed_async_client({"User-Agent": user_agent}, limits=limits, timeout=timeout) as client:
+        ic(f"Monitoring {len(targets)} URLs")
+        await asyncio.gather(
+            prune_periodically(store, stop),
+            *(
+                monitor_target(url, interval, jitter, client, semaphore, store, stop, sink)
+                for url, interval in targets
+            ),
+        )
+    ic("Monitor stopped")
+
+
+def print_summary(store, seconds):
+    """
+    Print the per-URL statistics of the last seconds from the rollups.
+    Args:
+        store (TimeSeriesStore): The store to read.
+        seconds (float): How far back to look.
+    """
+    # Minute rollups are only kept for the store's configured retention
+    resolution = "minute" if seconds <= store.retention["minute"] else "hour"
+    print(f"\nMonitor Summary for the last {seconds:g} seconds")
+    print("=" * 118)
+    print(f"{'Probes':>7}{'Errors':>8}{'Mean ms':>10}{'Std ms':>9}{'Min ms':>9}{'P90 ms':>9}{'P99 ms':>9}"
+          f"{'Max ms':>9}{'TTFB ms':>10}  URL")
+    for summary in store.summary(time.time() - seconds, resolution):
+        total = {"mean": 0, "stddev": 0, "min": 0, "max": 0, **(summary["total_ms"] or {})}
+        ttfb = summary["ttfb_ms"]["mean"] if summary["ttfb_ms"] else 0
+        print(f"{summary['count']:>7}{summary['error_rate']:>8.1%}{total['mean']:>10.1f}{total['stddev']:>9.1f}"
+              f"{total['min']:>9}{total.get('p90') or 0:>9.0f}{total.get('p99') or 0:>9.0f}{total['max']:>9}"
+              f"{ttfb:>10.1f}  {summary['url']}")
+    print("=" * 118)
+
+
+# Main function to handle CLI arguments
+def main():
+    """
+    Main function to handle command-line arguments and run the monitor.
+    """
+    parser = argparse.ArgumentParser(description="Continuously probe URLs and store the timings.")
+    parser.add_argument(
+        "targets",
+        type=str,
+        nargs="?",
+        help="File with one URL per line, optionally followed by its interval in seconds."
+    )
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"Time-series database (default: {DEFAULT_DB}).")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help=f"Probe interval in seconds for URLs without one (default: {DEFAULT_INTERVAL})."
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=DEFAULT_JITTER,
+        help=f"Maximum relative random change of each interval (default: {DEFAULT_JITTER})."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum number of concurrent probes (default: {DEFAULT_CONCURRENCY})."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"Request timeout in seconds (default: {DEFAULT_TIMEOUT})."
+    )
+    parser.add_argument(
+        "--keepalive",
+        type=float,
+        default=DEFAULT_KEEPALIVE,
+        help=f"Seconds to keep idle connections warm between probes (default: {DEFAULT_KEEPALIVE})."
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Stop after this many seconds instead of running until interrupted."
+    )
+    for name in ("raw", "minute", "hour"):
+        parser.add_argument(
+            f"--{name}-retention",
+            type=float,
+            default=DEFAULT_RETENTION[name],
+            help=f"Seconds to keep {name} data (default: {DEFAULT_RETENTION[name]})."
+        )
+    parser.add_argument(
+        "--report",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Print the statistics of the last SECONDS from the database and exit."
+    )
+    parser.add_argument(
+        "--user-agent",
+        type=str,
+        default=None,
+        help="Custom User-Agent string for the requests. "
+             "If not provided, a default browser user agent will be used."
+    )
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    retention = {"raw": args.raw_retention, "minute": args.minute_retention, "hour": args.hour_retention}
+    store = TimeSeriesStore(args.db, retention)
+    try:
+        if args.report is not None:
+            print_summary(store, args.report)
+            return
+        if not args.targets:
+            parser.error("a targets file is required unless --report is given")
+
+        if args.concurrency < 1:
+            parser.error("--concurrency must be at least 1")
+        try:
+            targets = load_targets(args.targets, args.interval)
+        except OSError as e:
+            parser.error(f"cannot read targets file: {e}")
+        if not targets:
+            parser.error(f"no URLs to monitor in {args.targets}")
+        try:
+            metrics = metrics_server_from_args(args)
+            sink = sink_from_args(args, fields=SAMPLE_FIELDS)
+        except (OSError, RuntimeError) as e:
+            parser.error(str(e))
+        try:
+            asyncio.run(run_monitor(
+                targets, store, args.user_agent or DEFAULT_USER_AGENT, args.jitter, args.concurrency,
+                args.timeout, args.keepalive, args.duration, sink,
+            ))
+        finally:
+            if sink is not None:
+                sink.close()
+            stop_metrics_server(metrics, args.metrics_linger)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
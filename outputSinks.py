@@ -0,0 +1,302 @@
+import io
+import csv
+import sys
+import json
+import gzip
+import time
+import zlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from collections.abc import Mapping
+from icecream import ic
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Constants
+SINK_FORMATS = ("jsonl", "csv")
+COMPRESSIONS = ("none", "gzip", "zstd")
+DEFAULT_BUFFER_SIZE = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def to_jsonable(value):
+    """
+    Convert values that json cannot encode, such as httpx.Headers or timedelta.
+    Args:
+        value: The value to convert.
+    Returns:
+        A JSON-serialisable equivalent of the value.
+    """
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+def infer_format(path):
+    """
+    Guess the output format and compression from a file name.
+    Args:
+        path (str): The output path, e.g. "results.csv.gz".
+    Returns:
+        tuple: (format, compression), e.g. ("csv", "gzip").
+    """
+    name = path.lower()
+    compression = "none"
+    if name.endswith(".gz"):
+        compression, name = "gzip", name[:-3]
+    elif name.endswith(".zst"):
+        compression, name = "zstd", name[:-4]
+    return ("csv" if name.endswith(".csv") else "jsonl"), compression
+
+
+class OutputSink(ABC):
+    """
+    Buffered, streaming writer for one record per result.
+    Records are encoded as they arrive and written out whenever the buffer fills or
+    the oldest buffered record has waited for the flush interval, even if no record
+    follows it, so nothing holds the whole result list and other tools can tail the
+    output live. Compressed streams are sync-flushed so they stay decodable while the
+    file is still being written.
+    """
+
+    def __init__(self, path="-", compression="none", buffer_size=DEFAULT_BUFFER_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """
+        Open the output stream.
+        Args:
+            path (str): The output file, or "-" for stdout.
+            compression (str): "none", "gzip" or "zstd".
+            buffer_size (int): Bytes to buffer before writing.
+            flush_interval (float): Maximum seconds a record stays buffered; 0 flushes every record.
+        """
+        self.path = path
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.last_flush = time.monotonic()
+        self.count = 0
+        # Records written while a flush is pending are flushed by a timer thread
+        self.lock = threading.Lock()
+        self.timer = None
+        self.closed = False
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd output requires the 'zstandard' package")
+
+        self.file = sys.stdout.buffer if path == "-" else open(path, "wb")
+        if compression == "gzip":
+            self.stream = gzip.GzipFile(fileobj=self.file, mode="wb")
+        elif compression == "zstd":
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.file, closefd=False)
+        else:
+            self.stream = self.file
+
+    @abstractmethod
+    def encode(self, record):
+        """
+        Encode one record as bytes, including the line terminator.
+        Args:
+            record (dict): The record to encode.
+        Returns:
+            bytes: The encoded record.
+        """
+
+    def write(self, record):
+        """
+        Buffer one record and flush if the buffer is full or the interval has passed.
+        Otherwise a flush is scheduled for when the interval ends, so the record is
+        written out even if the producer goes idle.
+        Args:
+            record (dict): The record to write.
+        """
+        with self.lock:
+            self.buffer += self.encode(record)
+            self.count += 1
+            elapsed = time.monotonic() - self.last_flush
+            if len(self.buffer) >= self.buffer_size or elapsed >= self.flush_interval:
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.flush_interval - elapsed, self._flush_pending)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _flush_pending(self):
+        # Runs on the timer thread once the interval of the oldest buffered record ends
+        with self.lock:
+            self.timer = None
+            if self.buffer and not self.closed:
+                self._flush()
+
+    def flush(self):
+        """
+        Write the buffered records and push them through compression to the file.
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.file is sys.stdout.buffer:
+            # Keep records ordered after anything printed through the text layer
+            sys.stdout.flush()
+        if self.buffer:
+            self.stream.write(self.buffer)
+            self.buffer.clear()
+        if self.compression == "gzip":
+            self.stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == "zstd":
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Flush the remaining records and close the output.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self._flush()
+            self.closed = True
+        if self.stream is not self.file:
+            self.stream.close()
+        if self.file is not sys.stdout.buffer:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JsonlSink(OutputSink):
+    """
+    Writes one JSON object per line.
+    """
+
+    def encode(self, record):
+        return (json.dumps(record, default=to_jsonable) + "\n").encode("utf-8")
+
+
+class CsvSink(OutputSink):
+    """
+    Writes one CSV row per record, with a header taken from the first record.
+    Nested values are JSON-encoded and missing keys are left empty. Records whose
+    shape varies (e.g. error results) need the full column list up front: keys
+    outside the header are dropped, with one warning naming them, so a long run
+    is not aborted halfway through its output.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        Args:
+            *args: Positional arguments for OutputSink.
+            fields (list): The column names; taken from the first record if not given.
+            **kwargs: Keyword arguments for OutputSink.
+        """
+        super().__init__(*args, **kwargs)
+        self.fields = list(fields) if fields else None
+        self.text = io.StringIO()
+        self.writer = None
+        self.warned = False
+
+    def encode(self, record):
+        if self.writer is None:
+            self.fields = self.fields or list(record.keys())
+            self.writer = csv.DictWriter(self.text, fieldnames=self.fields, extrasaction="ignore")
+            self.writer.writeheader()
+        if not self.warned and (extra := record.keys() - set(self.fields)):
+            ic(f"Dropping CSV values without a column: {', '.join(sorted(extra))}")
+            self.warned = True
+        self.writer.writerow({
+            key: json.dumps(value, default=to_jsonable)
+            if isinstance(value, (Mapping, list, tuple)) else value
+            for key, value in record.items()
+        })
+        data = self.text.getvalue().encode("utf-8")
+        self.text.seek(0)
+        self.text.truncate()
+        return data
+
+
+def open_sink(path="-", output_format=None, compression=None, flush_interval=DEFAULT_FLUSH_INTERVAL,
+              fields=None):
+    """
+    Open a streaming output sink.
+    Args:
+        path (str): The output file, or "-" for stdout.
+        output_format (str): "jsonl" or "csv"; inferred from the file name if not given.
+        compression (str): "none", "gzip" or "zstd"; inferred from the file name if not given.
+        flush_interval (float): Maximum seconds a record stays buffered; 0 flushes every record.
+        fields (list): CSV column names; every key the records may have (optional).
+    Returns:
+        OutputSink: The sink; use it as a context manager or call close().
+    """
+    inferred_format, inferred_compression = infer_format(path)
+    output_format = output_format or inferred_format
+    compression = compression or inferred_compression
+    if output_format == "csv":
+        return CsvSink(path, compression, flush_interval=flush_interval, fields=fields)
+    return JsonlSink(path, compression, flush_interval=flush_interval)
+
+
+def add_output_arguments(parser):
+    """
+    Add the shared --output options to a command-line parser.
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Stream one record per result to this file ('-' for stdout). Format and "
+             "compression are inferred from the extension, e.g. results.jsonl.gz."
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=SINK_FORMATS,
+        default=None,
+        help="Output format: jsonl or csv (default: from the file name, else jsonl)."
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default=None,
+        help="Output compression: none, gzip or zstd (zstd needs the 'zstandard' package)."
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help=f"Maximum seconds a record stays buffered before it is written; 0 writes "
+             f"every record at once (default: {DEFAULT_FLUSH_INTERVAL})."
+    )
+
+
+def sink_from_args(args, default_path=None, fields=None):
+    """
+    Open the sink selected with the options from add_output_arguments.
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+        default_path (str): The path to use when --output is not given (optional).
+        fields (list): Every key the records may have, used as the CSV columns (optional).
+    Returns:
+        OutputSink | None: The sink, or None if no output was requested.
+    """
+    path = args.output or default_path
+    if path is None:
+        return None
+    return open_sink(path, args.output_format, args.compression, args.flush_interval, fields)
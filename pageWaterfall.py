@@ -0,0 +1,297 @@
+import re
+import time
+import codecs
+import httpx
+import asyncio
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+from icecream import ic
+from phaseTiming import PhaseTrace, TransferMeter, create_timed_async_client, warm_up_async_backend
+
+
+# Constants
+DEFAULT_PER_ORIGIN_LIMIT = 6
+DEFAULT_WATERFALL_TIMEOUT = 30.0
+MAX_STYLESHEET_BYTES = 2 * 1024 * 1024
+PRELOAD_TYPES = {"script": "script", "style": "stylesheet", "image": "image", "font": "font"}
+FONT_EXTENSIONS = (".woff2", ".woff", ".ttf", ".otf", ".eot")
+CSS_URL = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""", re.IGNORECASE)
+CSS_IMPORT = re.compile(r"""@import\s+(?:url\()?\s*['"]([^'"]+)['"]""", re.IGNORECASE)
+# Every key of a resource record, e.g. for CSV columns
+RESOURCE_FIELDS = (
+    "url", "type", "initiator", "start_offset", "queued", "status_code", "http_version", "content_type",
+    "duration", "end_offset", "wire_bytes", "decoded_bytes", "timings", "ttfb", "hops", "trace_offset",
+    "error",
+)
+
+
+class ResourceExtractor(HTMLParser):
+    """
+    Streaming HTML parser that reports scripts, stylesheets, images and preloaded
+    fonts as soon as their tags are seen, like a browser's preload scanner.
+    """
+
+    def __init__(self, base_url, on_resource):
+        """
+        Args:
+            base_url (str): The document URL, used to resolve relative links.
+            on_resource (callable): Called with (url, resource type) for every resource.
+        """
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.on_resource = on_resource
+        # Whether each open <picture> has picked its image yet. <source> is only an image
+        # candidate inside <picture> (in <video>/<audio> it is media), and like a browser
+        # only the first candidate, or else the <img> fallback, is fetched.
+        self.pictures = []
+
+    def found(self, link, resource_type):
+        if not link:
+            return
+        url = urljoin(self.base_url, link.strip())
+        if urlsplit(url).scheme in ("http", "https"):
+            self.on_resource(url.split("#", 1)[0], resource_type)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        rel = (attrs.get("rel") or "").lower().split()
+        if tag == "base" and attrs.get("href"):
+            self.base_url = urljoin(self.base_url, attrs["href"])
+        elif tag == "script":
+            self.found(attrs.get("src"), "script")
+        elif tag == "link" and "stylesheet" in rel:
+            self.found(attrs.get("href"), "stylesheet")
+        elif tag == "link" and ("preload" in rel or "modulepreload" in rel):
+            default = "script" if "modulepreload" in rel else None
+            self.found(attrs.get("href"), PRELOAD_TYPES.get(attrs.get("as"), default))
+        elif tag == "picture":
+            self.pictures.append(False)
+        elif tag == "source" and self.pictures:
+            # Picture sources only have a srcset; take its first candidate
+            link = first_srcset_candidate(attrs.get("srcset"))
+            if link and not self.pictures[-1]:
+                self.pictures[-1] = True
+                self.found(link, "image")
+        elif tag == "img" and self.pictures and self.pictures[-1]:
+            # A <source> was already picked, the fallback is not loaded
+            pass
+        elif tag in ("img", "input") and (tag != "input" or attrs.get("type") == "image"):
+            # Take the first srcset candidate when there is no src
+            self.found(attrs.get("src") or first_srcset_candidate(attrs.get("srcset")), "image")
+
+    def handle_endtag(self, tag):
+        if tag == "picture" and self.pictures:
+            self.pictures.pop()
+
+
+def first_srcset_candidate(srcset):
+    """
+    Get the URL of the first candidate of a srcset attribute.
+    Args:
+        srcset (str): The attribute value, e.g. "a.webp 1x, b.webp 2x", or None.
+    Returns:
+        str | None: The first URL, or None if there is none.
+    """
+    candidate = (srcset or "").split(",")[0].split()
+    return candidate[0] if candidate else None
+
+
+def stylesheet_resources(css, base_url):
+    """
+    Find the fonts and imported stylesheets referenced by a stylesheet.
+    Args:
+        css (str): The stylesheet text.
+        base_url (str): The stylesheet URL, used to resolve relative links.
+    Returns:
+        list: (url, resource type) pairs.
+    """
+    resources = [(urljoin(base_url, link), "stylesheet") for link in CSS_IMPORT.findall(css)]
+    for link in CSS_URL.findall(css):
+        if urlsplit(link).path.lower().endswith(FONT_EXTENSIONS):
+            resources.append((urljoin(base_url, link), "font"))
+    return resources
+
+
+class Waterfall:
+    """
+    Loads a page and its sub-resources concurrently over one connection pool.
+    Resources are fetched as soon as they are discovered, through a per-origin
+    limit like a browser's six connections per host, and each one is traced.
+    """
+
+    def __init__(self, client, per_origin_limit=DEFAULT_PER_ORIGIN_LIMIT):
+        """
+        Args:
+            client (httpx.AsyncClient): A client from create_timed_async_client.
+            per_origin_limit (int): The maximum number of concurrent requests per origin.
+        """
+        self.client = client
+        self.per_origin_limit = per_origin_limit
+        self.origin_limits = {}
+        self.seen = set()
+        self.tasks = []
+        self.started = time.perf_counter()
+
+    def schedule(self, url, resource_type, initiator):
+        """
+        Start fetching a resource unless it was already requested.
+        Args:
+            url (str): The resource URL.
+            resource_type (str): "document", "script", "stylesheet", "image" or "font".
+            initiator (str): The URL of the document or stylesheet that referenced it.
+        """
+        if url in self.seen or resource_type is None:
+            return
+        self.seen.add(url)
+        self.tasks.append(asyncio.ensure_future(self.fetch(url, resource_type, initiator)))
+
+    async def fetch(self, url, resource_type, initiator):
+        """
+        Fetch and trace one resource, parsing documents and stylesheets for more.
+        Args:
+            url (str): The resource URL.
+            resource_type (str): The resource type.
+            initiator (str): The referencing URL, or None for the page itself.
+        Returns:
+            dict: The resource record with its timing offsets relative to the page start.
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        limit = self.origin_limits.setdefault(origin, asyncio.Semaphore(self.per_origin_limit))
+        discovered = time.perf_counter()
+        record = {
+            "url": url,
+            "type": resource_type,
+            "initiator": initiator,
+            "start_offset": discovered - self.started,
+        }
+        async with limit:
+            record["queued"] = time.perf_counter() - discovered
+            with PhaseTrace() as trace:
+                meter = TransferMeter(trace.started)
+                try:
+                    async with self.client.stream(
+                        "GET", url, follow_redirects=True, extensions={"trace": trace.atrace}
+                    ) as response:
+                        await self.read_body(response, resource_type, meter)
+                        meter.finish()
+                    record.update({
+                        "status_code": response.status_code,
+                        "http_version": response.http_version,
+                        "content_type": response.headers.get("Content-Type"),
+                    })
+                except (httpx.HTTPError, httpx.InvalidURL) as e:
+                    ic(f"Error fetching {url}: {e}")
+                    record["error"] = str(e)
+
+        end = time.perf_counter()
+        record.update({
+            "duration": end - discovered,
+            "end_offset": end - self.started,
+            "wire_bytes": meter.wire_bytes,
+            "decoded_bytes": meter.decoded_bytes,
+            **trace.results(),
+            "trace_offset": trace.started - self.started,
+        })
+        return record
+
+    async def read_body(self, response, resource_type, meter):
+        """
+        Stream a body through the meter, feeding documents and stylesheets to their parsers.
+        Args:
+            response (httpx.Response): The streaming response.
+            resource_type (str): The resource type.
+            meter (TransferMeter): The meter to update.
+        """
+        content_type = response.headers.get("Content-Type", "").lower()
+        parse_html = resource_type == "document" and "html" in content_type
+        parse_css = resource_type == "stylesheet" and response.status_code == 200
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        base_url = str(response.url)
+        extractor = ResourceExtractor(base_url, lambda url, kind: self.schedule(url, kind, base_url))
+        css = []
+        css_size = 0
+
+        async for chunk in response.aiter_bytes():
+            meter.update(len(chunk), response.num_bytes_downloaded)
+            if parse_html:
+                extractor.feed(decoder.decode(chunk))
+            elif parse_css and css_size < MAX_STYLESHEET_BYTES:
+                css.append(decoder.decode(chunk))
+                css_size += len(chunk)
+
+        if parse_html:
+            extractor.feed(decoder.decode(b"", final=True))
+            extractor.close()
+        if css:
+            for url, kind in stylesheet_resources("".join(css), base_url):
+                self.schedule(url, kind, base_url)
+
+    async def run(self, url):
+        """
+        Load the page and wait for every resource it pulls in.
+        Args:
+            url (str): The page URL.
+        Returns:
+            list: The resource records, the page first, in discovery order.
+        """
+        self.schedule(url, "document", None)
+        # Stylesheets can schedule fonts while earlier tasks are awaited
+        index = 0
+        while index < len(self.tasks):
+            await self.tasks[index]
+            index += 1
+        return [task.result() for task in self.tasks]
+
+
+def summarize_waterfall(resources):
+    """
+    Total the requests, bytes and load time of a waterfall.
+    Args:
+        resources (list): The resource records.
+    Returns:
+        dict: Request and failure counts, wire and decoded bytes, the time until the
+            last resource finished, and per-type and per-protocol breakdowns.
+    """
+    by_type = {}
+    by_protocol = {}
+    for resource in resources:
+        totals = by_type.setdefault(resource["type"], {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0})
+        totals["requests"] += 1
+        totals["wire_bytes"] += resource["wire_bytes"]
+        totals["decoded_bytes"] += resource["decoded_bytes"]
+        protocol = resource.get("http_version") or "failed"
+        by_protocol[protocol] = by_protocol.get(protocol, 0) + 1
+    return {
+        "requests": len(resources),
+        "failed": sum(1 for resource in resources if "error" in resource),
+        "wire_bytes": sum(resource["wire_bytes"] for resource in resources),
+        "decoded_bytes": sum(resource["decoded_bytes"] for resource in resources),
+        "load_time": max((resource["end_offset"] for resource in resources), default=0.0),
+        "by_type": by_type,
+        "by_protocol": by_protocol,
+    }
+
+
+async def load_page(url, headers, per_origin_limit=DEFAULT_PER_ORIGIN_LIMIT, http2=False,
+                    timeout=DEFAULT_WATERFALL_TIMEOUT):
+    """
+    Load a page with its scripts, stylesheets, images and fonts and time every request.
+    Args:
+        url (str): The page URL.
+        headers (dict): The headers to use for the requests.
+        per_origin_limit (int): The maximum number of concurrent requests per origin.
+        http2 (bool): Whether to negotiate HTTP/2 (needs the optional h2 package).
+        timeout (float): The request timeout in seconds.
+    Returns:
+        tuple: (resource records, totals from summarize_waterfall).
+    """
+    try:
+        client = create_timed_async_client(headers, timeout=timeout, http2=http2)
+    except ImportError:
+        ic("HTTP/2 needs the 'h2' package, falling back to HTTP/1.1")
+        client = create_timed_async_client(headers, timeout=timeout)
+    await warm_up_async_backend()
+    async with client:
+        resources = await Waterfall(client, per_origin_limit).run(url)
+    return resources, summarize_waterfall(resources)
@@ -1,7 +1,26 @@
+import sys
+import math
+import time
 import httpx
+import asyncio
 import argparse
+import importlib.util
 from icecream import ic
 from datetime import timedelta
+from harExport import HarWriter
+from baselineStore import (
+    DEFAULT_ALPHA, DEFAULT_REGRESSION_THRESHOLD, MIN_SAMPLES, BaselineStore, compare_runs, generate_comparison_report
+)
+from metricsExporter import (
+    add_metrics_arguments, metrics_server_from_args, record_probe, stop_metrics_server, track_in_flight
+)
+from outputSinks import add_output_arguments, sink_from_args
+from latencyStats import HdrHistogram
+from pageWaterfall import DEFAULT_PER_ORIGIN_LIMIT, RESOURCE_FIELDS, load_page
+from loadGenerator import DEFAULT_MAX_IN_FLIGHT, DEFAULT_RAMP_UP, DEFAULT_STEP_DURATION, run_load
+from phaseTiming import (
+    BODY_MILESTONES, PHASES, PhaseTrace, TransferMeter, create_timed_client, warm_up_async_backend
+)
 
 
 # Constants
@@ -9,32 +28,128 @@ DEFAULT_USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
 )
+CONNECTION_MODES = ("warm", "cold")
+DEFAULT_MAX_REDIRECTS = 20
+WATERFALL_WIDTH = 40
+ENCODINGS = ("identity", "gzip", "deflate", "br", "zstd")
+# Content-Encodings that httpx can only decode with an optional package installed
+OPTIONAL_DECODERS = {"br": ("brotli", "brotlicffi"), "zstd": ("zstandard",)}
+SIZE_HIGHEST = 2 ** 40
+# Every key of the records streamed to --output, e.g. for CSV columns
+RESULT_FIELDS = (
+    "url", "sample", "status_code", "size_kb", "load_time", "final_url", "redirect_count", "headers",
+    "timings", "ttfb", "hops", "transfer", "error",
+)
+ENCODING_FIELDS = (
+    "url", "accept_encoding", "status_code", "content_encoding", "http_version", "wire_bytes",
+    "decoded_bytes", "ratio", "ttfb", "total_time", "error",
+)
+
+
+def check_redirect(current_url: httpx.URL, next_url: httpx.URL, visited: set, redirects: int,
+                   max_redirects: int = DEFAULT_MAX_REDIRECTS, allow_downgrade: bool = False):
+    """
+    Decide whether a redirect may be followed.
+    Args:
+        current_url (httpx.URL): The URL that answered with the redirect.
+        next_url (httpx.URL): The redirect target.
+        visited (set): The URLs already requested in this chain.
+        redirects (int): The number of redirects followed so far.
+        max_redirects (int): The maximum number of redirects to follow.
+        allow_downgrade (bool): Whether to follow redirects from https to http.
+    Returns:
+        str | None: Why the redirect must not be followed, or None if it may.
+    """
+    if str(next_url) in visited:
+        return f"Redirect loop: {current_url} redirects back to {next_url}"
+    if current_url.scheme == "https" and next_url.scheme == "http" and not allow_downgrade:
+        return f"Insecure redirect: {current_url} downgrades to {next_url}"
+    if redirects >= max_redirects:
+        return f"Too many redirects: more than {max_redirects}"
+    return None
 
 
 # Function to fetch website and measure detailed performance
-def fetch_url_details(url: str, headers: dict) -> dict:
+def fetch_url_details(url: str, headers: dict, client: httpx.Client = None, max_redirects: int = DEFAULT_MAX_REDIRECTS,
+                      allow_downgrade: bool = False) -> dict:
     """
     Fetch the URL and measure performance details.
+    Redirects are followed one hop at a time and every hop is traced, so the time
+    is broken down into the blocked, DNS, TCP connect, TLS, send, wait (time to
+    first byte) and receive phases. Redirect loops and https-to-http downgrades
+    stop the chain at the offending hop with an error. The body is streamed and
+    discarded while it is measured, so memory use does not grow with the page size.
     Args:
         url (str): The URL to fetch.
         headers (dict): The headers to use for the request.
+        client (httpx.Client): A client from create_timed_client to reuse its warm
+            connections (optional); a new client is created and closed otherwise.
+        max_redirects (int): The maximum number of redirects to follow.
+        allow_downgrade (bool): Whether to follow redirects from https to http.
     Returns:
-        dict: A dictionary with performance metrics and response info.
+        dict: A dictionary with performance metrics and response info. "timings"
+            holds the seconds per phase summed over all hops, "ttfb" the seconds
+            until the final response headers arrived, "hops" the per-hop
+            breakdown and "transfer" the wire and decoded body sizes and the
+            throughput curve, with times counted from the first request.
     """
+    owns_client = client is None
+    client = client or create_timed_client(headers)
+    # Start the clock after the client (and its SSL context) is built
+    trace = PhaseTrace()
+    meter = TransferMeter(trace.started)
+    visited = {url}
+    redirects = 0
+    redirect_error = None
     try:
-        with httpx.Client(headers=headers) as client:
-            response = client.get(url, follow_redirects=True)
-
-            return {
-                "status_code": response.status_code,
-                "size_kb": len(response.content) / 1024,  # Convert bytes to KB
-                "load_time": response.elapsed.total_seconds(),  # Load time in seconds
-                "final_url": str(response.url),
-                "redirect_count": len(response.history),
-                "headers": response.headers,
-            }
+        with trace, track_in_flight("performance"):
+            request = client.build_request("GET", url, headers=headers, extensions={"trace": trace})
+            while True:
+                response = client.send(request, stream=True, follow_redirects=False)
+                if response.next_request is None:
+                    break
+                # Finish the redirect so its connection can be reused, then vet the target
+                response.read()
+                response.close()
+                redirect_error = check_redirect(
+                    request.url, response.next_request.url, visited, redirects, max_redirects, allow_downgrade
+                )
+                if redirect_error:
+                    ic(redirect_error)
+                    break
+                request = response.next_request
+                visited.add(str(request.url))
+                redirects += 1
+
+            # Measure the final body; a rejected redirect has already been read
+            try:
+                if redirect_error is None:
+                    for chunk in response.iter_bytes():
+                        meter.update(len(chunk), response.num_bytes_downloaded)
+                    meter.finish()
+            finally:
+                response.close()
+
+        results = {
+            "status_code": response.status_code,
+            "size_kb": meter.decoded_bytes / 1024,  # Convert bytes to KB
+            "load_time": response.elapsed.total_seconds(),  # Load time in seconds
+            "final_url": str(response.url),
+            "redirect_count": redirects,
+            "headers": response.headers,
+            **trace.results(),
+            "transfer": meter.results(),
+        }
+        if redirect_error:
+            results["error"] = redirect_error
+        record_probe(
+            "performance", response.status_code, "RedirectError" if redirect_error else None,
+            time.perf_counter() - trace.started, meter.wire_bytes, results["timings"],
+        )
+        return results
     except httpx.RequestError as e:
         ic(f"Request error: {e}")
+        record_probe("performance", error_class=type(e).__name__, duration=time.perf_counter() - trace.started)
         return {
             "status_code": None,
             "size_kb": 0.0,
@@ -42,30 +157,418 @@ def fetch_url_details(url: str, headers: dict) -> dict:
             "final_url": url,
             "redirect_count": 0,
             "headers": None,
+            **trace.results(),
+            "transfer": meter.results(),
             "error": str(e),
         }
+    finally:
+        if owns_client:
+            client.close()
+
+
+def format_phases(timings: dict) -> str:
+    """
+    Format phase timings as one line of milliseconds.
+    Args:
+        timings (dict): Seconds per phase, with None for phases that did not happen.
+    Returns:
+        str: e.g. "dns 12.1 ms | connect 20.4 ms | ...".
+    """
+    return " | ".join(
+        f"{phase} {timings[phase] * 1000:.1f} ms"
+        for phase in PHASES if timings.get(phase) is not None
+    )
+
+
+def run_samples(url: str, headers: dict, samples: int, warmup: int = 0, connections: str = "warm",
+                **fetch_options):
+    """
+    Measure the URL repeatedly.
+    Args:
+        url (str): The URL to fetch.
+        headers (dict): The headers to use for the requests.
+        samples (int): The number of measured requests.
+        warmup (int): The number of unmeasured requests to send first.
+        connections (str): "warm" to reuse one connection pool for every request,
+            or "cold" to open a new client (and connection) per request.
+        **fetch_options: Extra keyword arguments for fetch_url_details.
+    Yields:
+        dict: The fetch_url_details results of the measured requests.
+    """
+    client = create_timed_client(headers) if connections == "warm" else None
+    try:
+        for number in range(warmup + samples):
+            results = fetch_url_details(url, headers, client, **fetch_options)
+            if number >= warmup:
+                yield results
+    finally:
+        if client is not None:
+            client.close()
+
+
+def record_sample(histograms: dict, results: dict) -> bool:
+    """
+    Fold the load time, time to first byte, each phase and the size of a sample into histograms.
+    Failed samples (request errors and responses with a status other than 2xx or 3xx)
+    are left out, so a site that starts failing fast cannot pass for a faster one;
+    phases that did not happen in a sample (such as the TLS handshake on a reused
+    connection) are left out of that phase's histogram.
+    Args:
+        histograms (dict): A mapping of metric name to HdrHistogram, updated in place.
+        results (dict): A fetch_url_details result.
+    Returns:
+        bool: Whether the sample was recorded, False if it failed.
+    """
+    if "error" in results or not 200 <= (results["status_code"] or 0) < 400:
+        return False
+    metrics = {"load_time": results["load_time"], "ttfb": results["ttfb"], **results["timings"]}
+    metrics["size_kb"] = results["size_kb"]
+    metrics["wire_kb"] = results["transfer"]["wire_bytes"] / 1024
+    for metric, value in metrics.items():
+        if value is None:
+            continue
+        if metric not in histograms:
+            # Times are kept to the microsecond, sizes to the byte
+            sizes = metric.endswith("_kb")
+            histograms[metric] = HdrHistogram(SIZE_HIGHEST, unit=1 / 1024) if sizes else HdrHistogram()
+        histograms[metric].record(value)
+    return True
+
+
+def summarize_samples(histograms: dict) -> dict:
+    """
+    Summarise the histograms filled by record_sample.
+    Args:
+        histograms (dict): A mapping of metric name to HdrHistogram.
+    Returns:
+        dict: A mapping of metric name to its summary; times are in seconds.
+    """
+    return {metric: histogram.summary() for metric, histogram in histograms.items()}
+
+
+def generate_samples_report(summary: dict, url: str, samples: int, errors: int, file=None) -> None:
+    """
+    Print the distribution of every metric over the samples.
+    Args:
+        summary (dict): The result of summarize_samples.
+        url (str): The tested URL.
+        samples (int): The number of measured requests.
+        errors (int): The number of failed requests.
+        file (file): Where to print the report (default: stdout).
+    """
+    columns = ("min", "mean", "p50", "p90", "p99", "max", "stddev")
+    print(f"\nPerformance Samples for {url}", file=file)
+    print("=" * 86, file=file)
+    print(f"Samples: {samples} ({errors} failed)", file=file)
+    print(f"{'Metric':<16}" + "".join(f"{column:>10}" for column in columns), file=file)
+    for metric, stats in summary.items():
+        # Times are shown in milliseconds, the sizes in KB
+        scale = 1 if metric.endswith("_kb") else 1000
+        label = metric if metric.endswith("_kb") else f"{metric}_ms"
+        print(f"{label:<16}" + "".join(f"{stats[column] * scale:>10.2f}" for column in columns), file=file)
+    print("=" * 86, file=file)
+
+
+def check_baseline(path: str, url: str, histograms: dict, update: bool = False, alpha: float = DEFAULT_ALPHA,
+                   threshold: float = DEFAULT_REGRESSION_THRESHOLD, file=None) -> None:
+    """
+    Compare the sampled distributions with the URL's baseline, or store them as the baseline.
+    Exits with status 1 if a metric regressed.
+    Args:
+        path (str): The baseline database.
+        url (str): The sampled URL.
+        histograms (dict): The histograms filled by record_sample.
+        update (bool): Whether to replace the baseline instead of comparing.
+        alpha (float): The significance level of the comparison.
+        threshold (float): The minimum relative growth of p50 or p95 to flag.
+        file (file): Where to print the comparison report (default: stdout).
+    """
+    with BaselineStore(path) as store:
+        baseline = store.load(url)
+        if update or not baseline:
+            if store.save(url, histograms):
+                ic(f"Saved the baseline for {url} to {path}")
+            return
+    comparisons = compare_runs([(url, baseline, histograms)], alpha, threshold)
+    generate_comparison_report(comparisons, show_all=True, file=file)
+    if any(comparison["status"] == "regression" for comparison in comparisons):
+        sys.exit(1)
+
+
+def can_decode(content_encoding: str) -> bool:
+    """
+    Check whether httpx can decode a Content-Encoding header value.
+    Args:
+        content_encoding (str): The header value, e.g. "gzip" or "br".
+    Returns:
+        bool: True if every listed coding is supported with the installed packages.
+    """
+    for coding in content_encoding.lower().split(","):
+        coding = coding.strip()
+        if coding in OPTIONAL_DECODERS:
+            if not any(importlib.util.find_spec(package) for package in OPTIONAL_DECODERS[coding]):
+                return False
+        elif coding not in ("", "identity", "gzip", "deflate"):
+            return False
+    return True
+
+
+async def fetch_encoding(client: httpx.AsyncClient, url: str, encoding: str) -> dict:
+    """
+    Fetch the URL with a single Accept-Encoding and measure the transfer.
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to fetch.
+        encoding (str): The Accept-Encoding value to send.
+    Returns:
+        dict: The negotiated Content-Encoding, wire and decoded sizes, compression
+            ratio (decoded / wire), time to first byte and total time in seconds.
+            The decoded size and ratio are None if the coding cannot be decoded.
+    """
+    started = time.perf_counter()
+    meter = TransferMeter(started)
+    try:
+        async with client.stream("GET", url, headers={"Accept-Encoding": encoding}) as response:
+            ttfb = time.perf_counter() - started
+            async for chunk in response.aiter_bytes():
+                meter.update(len(chunk), response.num_bytes_downloaded)
+            meter.finish()
+    except httpx.HTTPError as e:
+        ic(f"Request error for Accept-Encoding {encoding}: {e}")
+        return {"accept_encoding": encoding, "error": str(e)}
+
+    content_encoding = response.headers.get("Content-Encoding", "identity")
+    decoded = can_decode(content_encoding)
+    return {
+        "accept_encoding": encoding,
+        "status_code": response.status_code,
+        "content_encoding": content_encoding,
+        "http_version": response.http_version,
+        "wire_bytes": meter.wire_bytes,
+        "decoded_bytes": meter.decoded_bytes if decoded else None,
+        "ratio": meter.decoded_bytes / meter.wire_bytes if decoded and meter.wire_bytes else None,
+        "ttfb": ttfb,
+        "total_time": time.perf_counter() - started,
+    }
+
+
+async def compare_encodings(url: str, headers: dict, encodings=ENCODINGS) -> list:
+    """
+    Fetch the URL once per Accept-Encoding, concurrently over one connection pool.
+    Args:
+        url (str): The URL to fetch.
+        headers (dict): The headers to use for the requests.
+        encodings (tuple): The Accept-Encoding values to try.
+    Returns:
+        list: The fetch_encoding result for each encoding, in order.
+    """
+    await warm_up_async_backend()
+    async with httpx.AsyncClient(headers=headers, follow_redirects=True) as client:
+        return await asyncio.gather(*(fetch_encoding(client, url, encoding) for encoding in encodings))
+
+
+def generate_encoding_report(results: list, url: str, file=None) -> None:
+    """
+    Print the size and timing of the URL for every Accept-Encoding.
+    Args:
+        results (list): The results of compare_encodings.
+        url (str): The tested URL.
+        file (file): Where to print the report (default: stdout).
+    """
+    identity = next(
+        (result["wire_bytes"] for result in results
+         if result["accept_encoding"] == "identity" and "error" not in result), None
+    )
+    print(f"\nCompression Report for {url}", file=file)
+    print("=" * 92, file=file)
+    print(f"{'Accept':<10}{'Received':<12}{'Wire KB':>10}{'Decoded KB':>12}{'Ratio':>8}"
+          f"{'vs identity':>13}{'TTFB ms':>10}{'Total ms':>10}", file=file)
+    for result in results:
+        if "error" in result:
+            print(f"{result['accept_encoding']:<10}Error: {result['error']}", file=file)
+            continue
+        decoded = f"{result['decoded_bytes'] / 1024:.2f}" if result["decoded_bytes"] is not None else "n/a"
+        ratio = f"{result['ratio']:.2f}x" if result["ratio"] is not None else "n/a"
+        saving = f"{result['wire_bytes'] / identity:.1%}" if identity else "n/a"
+        print(f"{result['accept_encoding']:<10}{result['content_encoding']:<12}"
+              f"{result['wire_bytes'] / 1024:>10.2f}{decoded:>12}{ratio:>8}{saving:>13}"
+              f"{result['ttfb'] * 1000:>10.1f}{result['total_time'] * 1000:>10.1f}", file=file)
+
+    compressed = [
+        result for result in results
+        if "error" not in result and result["content_encoding"].lower() not in ("identity", "")
+    ]
+    if not compressed:
+        print("The server did not compress the response for any Accept-Encoding.", file=file)
+    else:
+        best = min(compressed, key=lambda result: result["wire_bytes"])
+        print(f"Smallest transfer: {best['content_encoding']} ({best['wire_bytes'] / 1024:.2f} KB)", file=file)
+    undecodable = sorted({
+        result["content_encoding"] for result in results
+        if "error" not in result and result["decoded_bytes"] is None
+    })
+    if undecodable:
+        print(f"Not decoded (install the optional decoder packages): {', '.join(undecodable)}", file=file)
+    print("=" * 92, file=file)
+
+
+def generate_waterfall_report(resources: list, totals: dict, url: str, file=None) -> None:
+    """
+    Print every resource of the page as a waterfall bar, followed by the totals.
+    Args:
+        resources (list): The resource records from load_page.
+        totals (dict): The totals from load_page.
+        url (str): The tested URL.
+        file (file): Where to print the report (default: stdout).
+    """
+    scale = WATERFALL_WIDTH / totals["load_time"] if totals["load_time"] else 0
+    print(f"\nWaterfall for {url}", file=file)
+    print("=" * 120, file=file)
+    print(f"{'Type':<11}{'Status':>6} {'Proto':<9}{'KB':>9}{'Start ms':>10}{'Dur ms':>9}  "
+          f"{'Timeline':<{WATERFALL_WIDTH}}  URL", file=file)
+    for resource in sorted(resources, key=lambda resource: resource["start_offset"]):
+        # Queued time is drawn as dots, the request itself as hashes
+        begin = round(resource["start_offset"] * scale)
+        queued = round(resource["queued"] * scale)
+        length = max(1, round(resource["end_offset"] * scale) - begin - queued)
+        bar = (" " * begin + "." * queued + "#" * length)[:WATERFALL_WIDTH]
+        status = resource.get("status_code") or "ERR"
+        print(f"{resource['type']:<11}{status:>6} {resource.get('http_version') or '-':<9}"
+              f"{resource['wire_bytes'] / 1024:>9.1f}{resource['start_offset'] * 1000:>10.1f}"
+              f"{resource['duration'] * 1000:>9.1f}  {bar:<{WATERFALL_WIDTH}}  {resource['url']}", file=file)
+    print("-" * 120, file=file)
+    print(f"Requests: {totals['requests']} ({totals['failed']} failed), "
+          f"{totals['wire_bytes'] / 1024:.1f} KB on the wire, {totals['decoded_bytes'] / 1024:.1f} KB decoded, "
+          f"loaded in {totals['load_time'] * 1000:.1f} ms", file=file)
+    for resource_type, type_totals in totals["by_type"].items():
+        print(f"    {resource_type}: {type_totals['requests']} requests, {type_totals['wire_bytes'] / 1024:.1f} KB",
+              file=file)
+    print(f"Protocols: {totals['by_protocol']}", file=file)
+    print("=" * 120, file=file)
+
+
+def parse_steps(value: str, integers: bool = False) -> list:
+    """
+    Parse a comma-separated list of load levels for argparse.
+    Args:
+        value (str): e.g. "10,50,100".
+        integers (bool): Whether only whole numbers are allowed.
+    Returns:
+        list: The positive levels as numbers.
+    """
+    try:
+        levels = [
+            float(level) if "." in level and not integers else int(level)
+            for level in value.split(",") if level.strip()
+        ]
+    except ValueError:
+        kind = "whole numbers" if integers else "numbers"
+        raise argparse.ArgumentTypeError(f"invalid step list: {value!r} (steps must be {kind})")
+    if not levels or any(not 0 < level < math.inf for level in levels):
+        raise argparse.ArgumentTypeError("steps must be positive numbers")
+    return levels
+
+
+def parse_concurrency_steps(value: str) -> list:
+    """
+    Parse a comma-separated list of concurrency levels for argparse.
+    Args:
+        value (str): e.g. "1,10,50".
+    Returns:
+        list: The positive levels as integers.
+    """
+    return parse_steps(value, integers=True)
+
+
+async def run_load_test(url: str, headers: dict, sink=None, **load_options) -> list:
+    """
+    Run the load schedule and stream every finished step to the sink.
+    Args:
+        url (str): The URL to load.
+        headers (dict): The headers to use for the requests.
+        sink (OutputSink): Where to write the step records (optional).
+        **load_options: Keyword arguments for run_load.
+    Returns:
+        list: The step results.
+    """
+    steps = []
+    async for step in run_load(url, headers, **load_options):
+        steps.append(step)
+        if sink is not None:
+            sink.write({"url": url, **step})
+    return steps
+
+
+def generate_load_report(steps: list, url: str, file=None) -> None:
+    """
+    Print throughput, error rate and latency percentiles per load step.
+    Args:
+        steps (list): The step results from run_load.
+        url (str): The tested URL.
+        file (file): Where to print the report (default: stdout).
+    """
+    print(f"\nLoad Test Report for {url}", file=file)
+    print("=" * 96, file=file)
+    print(f"{'Step':<6}{'Level':>10}{'Requests':>10}{'Req/s':>10}{'Errors':>9}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'Max ms':>10}{'Peak':>8}", file=file)
+    for step in steps:
+        level = f"{step['concurrency']} conc" if step["concurrency"] else f"{step['target_rps']} rps"
+        latency = step["latency"] or dict.fromkeys(("p50", "p90", "p99", "max"), 0.0)
+        print(f"{step['step']:<6}{level:>10}{step['requests']:>10}{step['throughput_rps']:>10.1f}"
+              f"{step['error_rate']:>9.1%}" + "".join(
+                  f"{latency[column] * 1000:>10.1f}" for column in ("p50", "p90", "p99", "max")
+              ) + f"{step['peak_in_flight']:>8}", file=file)
+        if step["error_types"]:
+            print(f"      Errors: {step['error_types']}", file=file)
+    print("=" * 96, file=file)
 
 
 # Function to generate and print a performance report
-def generate_report(results: dict, url: str) -> None:
+def generate_report(results: dict, url: str, file=None) -> None:
     """
     Generate and print the performance analysis report.
     Args:
         results (dict): The results of the performance test.
         url (str): The tested URL.
+        file (file): Where to print the report (default: stdout).
     """
-    print(f"\nPerformance Report for {url}")
-    print("=" * 50)
-    print(f"Status Code: {results.get('status_code', 'N/A')}")
-    print(f"Page Size: {results.get('size_kb', 0):.2f} KB")
-    print(f"Load Time: {timedelta(seconds=results.get('load_time', 0))}")
-    print(f"Final URL: {results.get('final_url', 'N/A')}")
-    print(f"Redirect Count: {results.get('redirect_count', 0)}")
+    print(f"\nPerformance Report for {url}", file=file)
+    print("=" * 50, file=file)
+    print(f"Status Code: {results.get('status_code', 'N/A')}", file=file)
+    print(f"Page Size: {results.get('size_kb', 0):.2f} KB", file=file)
+    print(f"Load Time: {timedelta(seconds=results.get('load_time', 0))}", file=file)
+    print(f"Final URL: {results.get('final_url', 'N/A')}", file=file)
+    print(f"Redirect Count: {results.get('redirect_count', 0)}", file=file)
+    if results.get("ttfb") is not None:
+        print(f"Time to First Byte: {results['ttfb'] * 1000:.1f} ms", file=file)
+    if results.get("timings"):
+        print(f"Phases (all hops): {format_phases(results['timings'])}", file=file)
+    if transfer := results.get("transfer"):
+        print(f"Transferred: {transfer['wire_bytes'] / 1024:.2f} KB on the wire, "
+              f"{transfer['decoded_bytes'] / 1024:.2f} KB decoded", file=file)
+        milestones = [
+            f"{percent}% at {transfer['time_to_percent'][str(percent)] * 1000:.1f} ms"
+            for percent in BODY_MILESTONES if transfer["time_to_percent"][str(percent)] is not None
+        ]
+        if transfer["time_to_first_byte"] is not None:
+            milestones.insert(0, f"first byte at {transfer['time_to_first_byte'] * 1000:.1f} ms")
+        if milestones:
+            print(f"Body: {', '.join(milestones)}", file=file)
+        if transfer["throughput"]:
+            rates = [point[2] for point in transfer["curve"] if point[2] is not None]
+            peak = f", {max(rates) / 1024:.1f} KB/s peak" if rates else ""
+            print(f"Throughput: {transfer['throughput'] / 1024:.1f} KB/s mean{peak}", file=file)
+    for number, hop in enumerate(results.get("hops", []), start=1):
+        connection = "reused connection" if hop["connection_reused"] else "new connection"
+        print(f"Hop {number}: {hop['status_code']} {hop['url']} ({hop['http_version']}, {connection})", file=file)
+        if hop["location"]:
+            print(f"    Location: {hop['location']}", file=file)
+        print(f"    {format_phases(hop['timings'])}", file=file)
     if results.get("headers"):
-        print(f"Response Headers: {dict(results['headers'])}")
+        print(f"Response Headers: {dict(results['headers'])}", file=file)
     if error := results.get("error"):
-        print(f"Error: {error}")
-    print("=" * 50)
+        print(f"Error: {error}", file=file)
+    print("=" * 50, file=file)
 
 
 # Main function to handle CLI arguments
@@ -82,6 +585,123 @@ def main():
         help="Custom User-Agent string for the request. "
              "If not provided, a default browser user agent will be used."
     )
+    parser.add_argument(
+        "--max-redirects",
+        type=int,
+        default=DEFAULT_MAX_REDIRECTS,
+        help=f"Maximum number of redirects to follow (default: {DEFAULT_MAX_REDIRECTS})."
+    )
+    parser.add_argument(
+        "--allow-insecure-redirects",
+        action="store_true",
+        help="Follow redirects from https to http instead of stopping at the downgrade."
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=1,
+        help="Number of measured requests; more than one prints percentiles per phase (default: 1)."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=0,
+        help="Number of unmeasured requests to send before sampling (default: 0)."
+    )
+    parser.add_argument(
+        "--connections",
+        choices=CONNECTION_MODES,
+        default="warm",
+        help="'warm' reuses one connection pool across requests, 'cold' opens a new "
+             "connection for every request (default: warm)."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Baseline database: compare the samples with the URL's stored baseline and exit "
+             "with status 1 on a regression, or store them if the URL has no baseline yet."
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the samples as the URL's new baseline instead of comparing."
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=DEFAULT_ALPHA,
+        help=f"Significance level of the baseline comparison (default: {DEFAULT_ALPHA})."
+    )
+    parser.add_argument(
+        "--regression-threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help="Minimum relative growth of p50 or p95 that counts as a regression "
+             f"(default: {DEFAULT_REGRESSION_THRESHOLD})."
+    )
+    parser.add_argument(
+        "--compare-encodings",
+        action="store_true",
+        help="Fetch the URL with each Accept-Encoding (identity, gzip, deflate, br, zstd) "
+             "concurrently and compare wire size, ratio and timing."
+    )
+    parser.add_argument(
+        "--waterfall",
+        action="store_true",
+        help="Load the page with its scripts, stylesheets, images and fonts and print a waterfall."
+    )
+    parser.add_argument(
+        "--per-origin-limit",
+        type=int,
+        default=DEFAULT_PER_ORIGIN_LIMIT,
+        help=f"Concurrent requests per origin with --waterfall (default: {DEFAULT_PER_ORIGIN_LIMIT}, like a browser)."
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Negotiate HTTP/2 with --waterfall (needs the optional 'h2' package)."
+    )
+    parser.add_argument(
+        "--har",
+        type=str,
+        default=None,
+        help="Write every traced request (redirect hops, samples and waterfall resources) "
+             "to this HAR 1.2 file."
+    )
+    load_levels = parser.add_mutually_exclusive_group()
+    load_levels.add_argument(
+        "--load-concurrency",
+        type=parse_concurrency_steps,
+        default=None,
+        help="Run a load test with these concurrency steps, e.g. 10,50,100."
+    )
+    load_levels.add_argument(
+        "--load-rps",
+        type=parse_steps,
+        default=None,
+        help="Run a load test with these target requests/second steps, e.g. 50,100,200."
+    )
+    parser.add_argument(
+        "--step-duration",
+        type=float,
+        default=DEFAULT_STEP_DURATION,
+        help=f"Seconds to measure each load step (default: {DEFAULT_STEP_DURATION})."
+    )
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=DEFAULT_RAMP_UP,
+        help=f"Seconds to ramp up at the start of each load step, not measured (default: {DEFAULT_RAMP_UP})."
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"Maximum concurrent requests with --load-rps (default: {DEFAULT_MAX_IN_FLIGHT})."
+    )
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     # Validate URL format
@@ -89,17 +709,136 @@ def main():
         print("Invalid URL. Please include 'http://' or 'https://'.")
         return
 
+    if args.samples < 1 or args.warmup < 0:
+        parser.error("--samples must be at least 1 and --warmup cannot be negative")
+    # Only sample runs are compared with a baseline
+    if args.baseline and (
+        args.waterfall or args.compare_encodings or args.load_concurrency or args.load_rps
+    ):
+        parser.error("--baseline cannot be combined with --waterfall, --compare-encodings, "
+                     "--load-concurrency or --load-rps")
+    if args.baseline and args.samples < MIN_SAMPLES:
+        parser.error(f"--baseline needs at least {MIN_SAMPLES} --samples")
+    if args.max_in_flight < 1:
+        parser.error("--max-in-flight must be at least 1")
+    if not args.step_duration > 0 or not args.ramp_up >= 0:
+        parser.error("--step-duration must be positive and --ramp-up cannot be negative")
+    # Encoding comparisons and load tests do not trace their requests
+    if args.har and (args.compare_encodings or args.load_concurrency or args.load_rps):
+        parser.error("--har cannot be combined with --compare-encodings, --load-concurrency or --load-rps")
+
     # Set user agent
     user_agent = args.user_agent or DEFAULT_USER_AGENT
     headers = {"User-Agent": user_agent}
 
-    # Analyze the website performance
-    ic(f"Analyzing performance for {args.url} with User-Agent: {user_agent}")
-    results = fetch_url_details(args.url, headers)
+    # Every mode streams its own kind of record; load test steps all share one shape
+    if args.waterfall:
+        fields = ("page", *RESOURCE_FIELDS)
+    elif args.compare_encodings:
+        fields = ENCODING_FIELDS
+    elif args.load_concurrency or args.load_rps:
+        fields = None
+    else:
+        fields = RESULT_FIELDS
+
+    try:
+        metrics = metrics_server_from_args(args)
+        sink = sink_from_args(args, fields=fields)
+        try:
+            har = HarWriter(args.har) if args.har else None
+        except OSError:
+            if sink is not None:
+                sink.close()
+            raise
+    except (OSError, RuntimeError) as e:
+        parser.error(str(e))
+
+    # Keep stdout clean for the records when they are streamed there
+    report = sys.stderr if sink is not None and sink.path == "-" else sys.stdout
+
+    try:
+        if args.waterfall:
+            # Load the page with all of its sub-resources
+            ic(f"Loading {args.url} with its sub-resources")
+            resources, totals = asyncio.run(load_page(args.url, headers, max(1, args.per_origin_limit), args.http2))
+            generate_waterfall_report(resources, totals, args.url, report)
+            if har is not None:
+                har.add_waterfall(resources, totals, args.url)
+            if sink is not None:
+                for resource in resources:
+                    sink.write({"page": args.url, **resource})
+            return
+
+        if args.compare_encodings:
+            # Compare the transfer for every content coding
+            ic(f"Comparing content encodings for {args.url}")
+            results = asyncio.run(compare_encodings(args.url, headers))
+            generate_encoding_report(results, args.url, report)
+            if sink is not None:
+                for result in results:
+                    sink.write({"url": args.url, **result})
+            return
+
+        if args.load_concurrency or args.load_rps:
+            # Drive the website through the load schedule
+            ic(f"Load testing {args.url}")
+            steps = asyncio.run(run_load_test(
+                args.url, headers, sink,
+                concurrency_steps=args.load_concurrency,
+                rate_steps=args.load_rps,
+                duration=args.step_duration,
+                ramp_up=args.ramp_up,
+                max_in_flight=args.max_in_flight,
+            ))
+            generate_load_report(steps, args.url, report)
+            return
+
+        if args.samples > 1 or args.warmup > 0:
+            # Benchmark the website with repeated requests
+            ic(f"Sampling {args.url} {args.samples} times after {args.warmup} warmup requests "
+               f"with {args.connections} connections")
+            histograms = {}
+            errors = 0
+            number = 0
+            for number, results in enumerate(
+                run_samples(
+                    args.url, headers, args.samples, args.warmup, args.connections,
+                    max_redirects=args.max_redirects, allow_downgrade=args.allow_insecure_redirects,
+                ),
+                start=1,
+            ):
+                if not record_sample(histograms, results):
+                    errors += 1
+                if har is not None:
+                    har.add_results(results, f"{args.url} (sample {number})")
+                if sink is not None:
+                    sink.write({"url": args.url, "sample": number, **results})
+            generate_samples_report(summarize_samples(histograms), args.url, number, errors, report)
+            if args.baseline:
+                check_baseline(args.baseline, args.url, histograms, args.update_baseline,
+                               args.alpha, args.regression_threshold, report)
+            return
+
+        # Analyze the website performance
+        ic(f"Analyzing performance for {args.url} with User-Agent: {user_agent}")
+        results = fetch_url_details(
+            args.url, headers, max_redirects=args.max_redirects, allow_downgrade=args.allow_insecure_redirects
+        )
 
-    # Generate and print the report
-    generate_report(results, args.url)
+        # Generate and print the report
+        generate_report(results, args.url, report)
 
+        # Stream the results as a structured record
+        if sink is not None:
+            sink.write({"url": args.url, **results})
+        if har is not None:
+            har.add_results(results, args.url)
+    finally:
+        if sink is not None:
+            sink.close()
+        if har is not None:
+            har.close()
+        stop_metrics_server(metrics, args.metrics_linger)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,443 @@
+import time
+import anyio
+import socket
+import httpx
+import httpcore
+import contextvars
+
+
+# Constants
+PHASES = ("blocked", "dns", "connect", "tls", "send", "wait", "receive")
+DEFAULT_CURVE_RESOLUTION = 0.1
+BODY_MILESTONES = (50, 90, 100)
+
+# The trace that DNS lookups made by the timed network backend are recorded into
+ACTIVE_TRACE = contextvars.ContextVar("active_trace", default=None)
+
+
+class TimedNetworkBackend(httpcore.NetworkBackend):
+    """
+    Wraps an httpcore network backend to resolve host names itself, so the DNS
+    lookup can be timed apart from the TCP connect (httpcore reports both as
+    "connect_tcp"). The lookup time is recorded into the trace that is active in
+    the current context.
+    """
+
+    def __init__(self, backend):
+        """
+        Args:
+            backend (httpcore.NetworkBackend): The backend that opens the sockets.
+        """
+        self.backend = backend
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise httpcore.ConnectError(e) from e
+        trace = ACTIVE_TRACE.get()
+        if trace is not None:
+            trace.record_dns(started, time.perf_counter())
+
+        # Try every resolved address in turn, like socket.create_connection
+        error = None
+        for *_, address in addresses:
+            try:
+                return self.backend.connect_tcp(address[0], port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    def sleep(self, seconds):
+        self.backend.sleep(seconds)
+
+
+class AsyncTimedNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Async counterpart of TimedNetworkBackend. Like httpcore's own async backends,
+    it bounds the lookup by the connect timeout.
+    """
+
+    def __init__(self, backend):
+        """
+        Args:
+            backend (httpcore.AsyncNetworkBackend): The backend that opens the sockets.
+        """
+        self.backend = backend
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        started = time.perf_counter()
+        try:
+            with anyio.fail_after(timeout):
+                addresses = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except TimeoutError as e:
+            raise httpcore.ConnectTimeout(f"DNS lookup for {host} timed out") from e
+        except OSError as e:
+            raise httpcore.ConnectError(e) from e
+        trace = ACTIVE_TRACE.get()
+        if trace is not None:
+            trace.record_dns(started, time.perf_counter())
+
+        error = None
+        for *_, address in addresses:
+            try:
+                return await self.backend.connect_tcp(address[0], port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+def _time_name_resolution(client, backend_class):
+    """
+    Wrap the network backend of every connection pool of a client, including the
+    pools of the proxies httpx mounted from the environment, to time DNS lookups.
+    httpx does not expose the backend; if its pools ever stop carrying one where
+    this looks for it, the lookup is simply reported as part of the connect phase.
+    Args:
+        client (httpx.Client | httpx.AsyncClient): The client to instrument.
+        backend_class (type): TimedNetworkBackend or AsyncTimedNetworkBackend.
+    Returns:
+        httpx.Client | httpx.AsyncClient: The same client.
+    """
+    for transport in (client._transport, *client._mounts.values()):
+        pool = getattr(transport, "_pool", None)
+        if pool is not None and hasattr(pool, "_network_backend"):
+            pool._network_backend = backend_class(pool._network_backend)
+    return client
+
+
+def _start_active_hop(request):
+    trace = ACTIVE_TRACE.get()
+    if trace is not None:
+        trace.start_hop(request)
+
+
+def _finish_active_hop(response):
+    trace = ACTIVE_TRACE.get()
+    if trace is not None:
+        trace.finish_hop(response)
+
+
+async def _astart_active_hop(request):
+    _start_active_hop(request)
+
+
+async def _afinish_active_hop(response):
+    _finish_active_hop(response)
+
+
+def create_timed_client(headers=None, **client_options):
+    """
+    Create a client that reports every hop to the trace active in the current context.
+    The client is a standard httpx.Client (so it honours the environment's proxies
+    like any other) whose connections also time their DNS lookups. It can be reused
+    across traced requests, e.g. to measure warm connections.
+    Args:
+        headers (dict): Default request headers (optional).
+        **client_options: Further keyword arguments for httpx.Client, e.g. http2 or timeout.
+    Returns:
+        httpx.Client: The client.
+    """
+    client = httpx.Client(
+        headers=headers,
+        event_hooks={"request": [_start_active_hop], "response": [_finish_active_hop]},
+        **client_options,
+    )
+    return _time_name_resolution(client, TimedNetworkBackend)
+
+
+def create_timed_async_client(headers=None, limits=httpx.Limits(), timeout=httpx.Timeout(5.0),
+                              **client_options):
+    """
+    Async counterpart of create_timed_client. Each concurrent request must run in
+    its own task so it can have its own active trace.
+    Args:
+        headers (dict): Default request headers (optional).
+        limits (httpx.Limits): The connection pool limits.
+        timeout (httpx.Timeout | float): The request timeout.
+        **client_options: Further keyword arguments for httpx.AsyncClient, e.g. http2.
+    Returns:
+        httpx.AsyncClient: The client.
+    """
+    client = httpx.AsyncClient(
+        headers=headers,
+        limits=limits,
+        timeout=timeout,
+        event_hooks={"request": [_astart_active_hop], "response": [_afinish_active_hop]},
+        **client_options,
+    )
+    return _time_name_resolution(client, AsyncTimedNetworkBackend)
+
+
+async def warm_up_async_backend():
+    """
+    Load anyio's backend for the running event loop.
+    The backend is imported on its first use, so call this before the first
+    timed async request to keep the import out of that request's timings.
+    """
+    await anyio.sleep(0)
+
+
+class PhaseTrace:
+    """
+    Collects per-phase timings for a request and each of its redirect hops.
+    Enter it as a context manager to make it the active trace, send the request
+    with a client from create_timed_client, and pass the instance as the "trace"
+    request extension to receive httpcore's connection and HTTP events (with an
+    async client, pass its atrace method instead).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.hops = []
+        self.token = None
+
+    def __enter__(self):
+        self.token = ACTIVE_TRACE.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        ACTIVE_TRACE.reset(self.token)
+
+    def __call__(self, name, info):
+        """
+        The httpcore trace callback: timestamp every event of the current hop.
+        Args:
+            name (str): The event name, e.g. "http11.send_request_headers.started".
+            info (dict): The event details.
+        """
+        if not self.hops:
+            return
+        # Drop the "connection." / "http11." / "http2." prefix
+        event = name.split(".", 1)[1]
+        self.hops[-1]["events"].setdefault(event, time.perf_counter())
+
+    async def atrace(self, name, info):
+        """
+        The httpcore trace callback for async clients, which must be a coroutine.
+        Args:
+            name (str): The event name.
+            info (dict): The event details.
+        """
+        self(name, info)
+
+    def record_dns(self, started, completed):
+        """
+        Record the DNS lookup of the current hop.
+        Args:
+            started (float): perf_counter() when the lookup started.
+            completed (float): perf_counter() when the lookup completed.
+        """
+        if self.hops:
+            self.hops[-1]["dns"] = (started, completed)
+
+    def start_hop(self, request):
+        """
+        Begin a new hop; use as a "request" event hook.
+        Args:
+            request (httpx.Request): The request about to be sent.
+        """
+        self.hops.append({
+            "start": time.perf_counter(),
+            "started_at": time.time(),
+            "method": request.method,
+            "url": str(request.url),
+            "request_headers": list(request.headers.multi_items()),
+            "events": {},
+            "dns": None,
+        })
+
+    def finish_hop(self, response):
+        """
+        Record the response of the current hop; use as a "response" event hook.
+        Args:
+            response (httpx.Response): The response, before its body is read.
+        """
+        hop = self.hops[-1]
+        hop["status_code"] = response.status_code
+        hop["reason"] = response.reason_phrase
+        hop["http_version"] = response.http_version
+        hop["response_headers"] = list(response.headers.multi_items())
+        hop["location"] = response.headers.get("Location")
+        hop["server_address"] = None
+        stream = response.extensions.get("network_stream")
+        if stream is not None:
+            address = stream.get_extra_info("server_addr")
+            hop["server_address"] = address[0] if address else None
+
+    def hop_timings(self, hop):
+        """
+        Turn the event timestamps of one hop into phase durations.
+        Args:
+            hop (dict): A hop collected by this trace.
+        Returns:
+            dict: Seconds per phase in PHASES, with None for phases that did not
+                happen (e.g. dns, connect and tls on a reused connection).
+        """
+        events = hop["events"]
+
+        def between(start_event, end_event):
+            if start_event in events and end_event in events:
+                return events[end_event] - events[start_event]
+            return None
+
+        timings = dict.fromkeys(PHASES)
+        if hop["dns"]:
+            timings["dns"] = hop["dns"][1] - hop["dns"][0]
+        connect = between("connect_tcp.started", "connect_tcp.complete")
+        if connect is not None:
+            timings["connect"] = max(0.0, connect - (timings["dns"] or 0.0))
+        timings["tls"] = between("start_tls.started", "start_tls.complete")
+        timings["send"] = between("send_request_headers.started", "send_request_body.complete")
+        timings["wait"] = between("send_request_body.complete", "receive_response_headers.complete")
+        timings["receive"] = between("receive_response_headers.complete", "receive_response_body.complete")
+
+        first_activity = hop["dns"][0] if hop["dns"] else events.get(
+            "connect_tcp.started", events.get("send_request_headers.started")
+        )
+        if first_activity is not None:
+            timings["blocked"] = max(0.0, first_activity - hop["start"])
+        return timings
+
+    def results(self):
+        """
+        Summarise the collected hops.
+        Returns:
+            dict: {"timings": seconds per phase summed over all hops, "ttfb": seconds
+                from the first request to the final response headers, "hops": one
+                record per hop with its URL, status, headers, timings and whether
+                the connection was reused}.
+        """
+        hops = []
+        totals = dict.fromkeys(PHASES)
+        for hop in self.hops:
+            timings = self.hop_timings(hop)
+            for phase, value in timings.items():
+                if value is not None:
+                    totals[phase] = (totals[phase] or 0.0) + value
+            hops.append({
+                "url": hop["url"],
+                "method": hop["method"],
+                "status_code": hop.get("status_code"),
+                "reason": hop.get("reason"),
+                "http_version": hop.get("http_version"),
+                "location": hop.get("location"),
+                "server_address": hop.get("server_address"),
+                "connection_reused": "connect_tcp.started" not in hop["events"],
+                "started_at": hop["started_at"],
+                "start_offset": hop["start"] - self.started,
+                "timings": timings,
+                "total_time": sum(value for value in timings.values() if value is not None),
+                "request_headers": hop["request_headers"],
+                "response_headers": hop.get("response_headers", []),
+            })
+
+        ttfb = None
+        if self.hops and "receive_response_headers.complete" in self.hops[-1]["events"]:
+            ttfb = self.hops[-1]["events"]["receive_response_headers.complete"] - self.hops[0]["start"]
+        return {"timings": totals, "ttfb": ttfb, "hops": hops}
+
+
+class TransferMeter:
+    """
+    Measures a response body while it streams, without keeping the bytes.
+    Feed it every decoded chunk together with the response's running count of
+    bytes read off the wire (httpx's num_bytes_downloaded); it keeps the byte
+    totals and a throughput curve sampled at a fixed resolution. It does no I/O
+    itself, so sync and async readers share it.
+    """
+
+    def __init__(self, started=None, resolution=DEFAULT_CURVE_RESOLUTION):
+        """
+        Args:
+            started (float): perf_counter() time the curve is measured from (default: now).
+            resolution (float): Minimum seconds between two curve points.
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.resolution = resolution
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.first_byte = None
+        self.finished = None
+        self.curve = []
+
+    def update(self, chunk_size, wire_bytes):
+        """
+        Record one decoded chunk.
+        Args:
+            chunk_size (int): The size of the decoded chunk.
+            wire_bytes (int): The total body bytes received on the wire so far.
+        """
+        now = time.perf_counter() - self.started
+        if self.first_byte is None:
+            self.first_byte = now
+        self.decoded_bytes += chunk_size
+        self.wire_bytes = wire_bytes
+        if not self.curve or now - self.curve[-1][0] >= self.resolution:
+            self.curve.append((now, self.wire_bytes, self.decoded_bytes))
+
+    def finish(self):
+        """
+        Mark the end of the body and record the final curve point.
+        """
+        self.finished = time.perf_counter() - self.started
+        if not self.curve or self.curve[-1][1:] != (self.wire_bytes, self.decoded_bytes):
+            self.curve.append((self.finished, self.wire_bytes, self.decoded_bytes))
+
+    def time_to_fraction(self, fraction):
+        """
+        Get the time until a share of the wire bytes had arrived, interpolated along the curve.
+        Args:
+            fraction (float): The share of the body, from 0 to 1.
+        Returns:
+            float | None: Seconds from the start, or None if no body was received.
+        """
+        if not self.wire_bytes:
+            return None
+        target = self.wire_bytes * fraction
+        previous_time, previous_bytes = self.first_byte, 0
+        for point_time, point_bytes, _ in self.curve:
+            if point_bytes >= target:
+                if point_bytes == previous_bytes:
+                    return point_time
+                share = (target - previous_bytes) / (point_bytes - previous_bytes)
+                return previous_time + (point_time - previous_time) * share
+            previous_time, previous_bytes = point_time, point_bytes
+        return self.curve[-1][0]
+
+    def results(self):
+        """
+        Summarise the transfer.
+        Returns:
+            dict: Wire and decoded byte counts, seconds to the first body byte and
+                to each of BODY_MILESTONES percent of the body, the mean throughput in
+                bytes per second, and the curve as [seconds, wire bytes, bytes/second
+                since the previous point] triples.
+        """
+        transfer_time = (self.finished or 0.0) - (self.first_byte or 0.0)
+        curve = []
+        previous_time, previous_bytes = self.first_byte or 0.0, 0
+        for point_time, point_bytes, _ in self.curve:
+            interval = point_time - previous_time
+            curve.append([point_time, point_bytes, (point_bytes - previous_bytes) / interval if interval > 0 else None])
+            previous_time, previous_bytes = point_time, point_bytes
+        return {
+            "wire_bytes": self.wire_bytes,
+            "decoded_bytes": self.decoded_bytes,
+            "time_to_first_byte": self.first_byte,
+            "time_to_percent": {
+                str(percent): self.time_to_fraction(percent / 100) for percent in BODY_MILESTONES
+            },
+            "throughput": self.wire_bytes / transfer_time if transfer_time > 0 else None,
+            "curve": curve,
+        }
@@ -1,5 +1,13 @@
+import sys
 import requests
 import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from outputSinks import add_output_arguments, sink_from_args
+from metricsExporter import (
+    add_metrics_arguments, metrics_server_from_args, record_probe, stop_metrics_server, track_in_flight
+)
 
 def checkWebsiteReachability(url, user_agent):
     """
@@ -12,7 +20,12 @@ def checkWebsiteReachability(url, user_agent):
     """
     headers = {"User-Agent": user_agent}
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        with track_in_flight("reachability"):
+            response = requests.get(url, headers=headers, timeout=10)
+        record_probe(
+            "reachability", response.status_code, duration=response.elapsed.total_seconds(),
+            size=len(response.content),
+        )
         return {
             "url": url,
             "reachable": True,
@@ -20,36 +33,39 @@ def checkWebsiteReachability(url, user_agent):
             "reason": response.reason,
             "elapsed_time": response.elapsed.total_seconds(),
         }
-    except requests.exceptions.Timeout:
+    except requests.exceptions.Timeout as e:
+        record_probe("reachability", error_class=type(e).__name__)
         return {
             "url": url,
             "reachable": False,
             "error": "Timeout occurred while trying to reach the website.",
         }
     except requests.exceptions.RequestException as e:
+        record_probe("reachability", error_class=type(e).__name__)
         return {
             "url": url,
             "reachable": False,
             "error": str(e),
         }
 
-def generateReport(result):
+def generateReport(result, file=None):
     """
     Print a report for the website reachability check.
     Args:
         result (dict): A dictionary containing reachability details.
+        file (file): Where to print the report (default: stdout).
     """
-    print("\nWebsite Reachability Report")
-    print("=" * 30)
-    print(f"URL: {result['url']}")
+    print("\nWebsite Reachability Report", file=file)
+    print("=" * 30, file=file)
+    print(f"URL: {result['url']}", file=file)
     if result["reachable"]:
-        print(f"  Status: Reachable")
-        print(f"  Status Code: {result['status_code']} ({result['reason']})")
-        print(f"  Response Time: {result['elapsed_time']} seconds")
+        print(f"  Status: Reachable", file=file)
+        print(f"  Status Code: {result['status_code']} ({result['reason']})", file=file)
+        print(f"  Response Time: {result['elapsed_time']} seconds", file=file)
     else:
-        print(f"  Status: Not Reachable")
-        print(f"  Error: {result.get('error', 'Unknown Error')}")
-    print("=" * 30)
+        print(f"  Status: Not Reachable", file=file)
+        print(f"  Error: {result.get('error', 'Unknown Error')}", file=file)
+    print("=" * 30, file=file)
 
 def main():
     """
@@ -60,6 +76,8 @@ def main():
     parser.add_argument("--user-agent", type=str, default=None, 
                         help="Custom User-Agent string to use for the request. "
                              "If not provided, a default browser user agent will be used.")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     # Default user agent if none is provided
@@ -74,9 +92,27 @@ def main():
         print("Invalid URL. Please include 'http://' or 'https://'.")
         return
 
-    # Check website reachability
-    result = checkWebsiteReachability(args.url, user_agent)
-    generateReport(result)
+    try:
+        metrics = metrics_server_from_args(args)
+        sink = sink_from_args(args)
+    except (OSError, RuntimeError) as e:
+        parser.error(str(e))
+
+    # Keep stdout clean for the record when it is streamed there
+    report = sys.stderr if sink is not None and sink.path == "-" else sys.stdout
+
+    try:
+        # Check website reachability
+        result = checkWebsiteReachability(args.url, user_agent)
+        generateReport(result, report)
+
+        # Stream the result as a structured record
+        if sink is not None:
+            sink.write(result)
+    finally:
+        if sink is not None:
+            sink.close()
+        stop_metrics_server(metrics, args.metrics_linger)
 
 if __name__ == "__main__":
     main()
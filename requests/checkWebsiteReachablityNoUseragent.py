@@ -1,4 +1,10 @@
+import sys
 import requests
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from outputSinks import open_sink
+from metricsExporter import record_probe, track_in_flight
 
 def checkWebsiteReachability(url):
     """
@@ -9,7 +15,12 @@ def checkWebsiteReachability(url):
         dict: A report containing status and details about the request.
     """
     try:
-        response = requests.get(url, timeout=10)
+        with track_in_flight("reachability"):
+            response = requests.get(url, timeout=10)
+        record_probe(
+            "reachability", response.status_code, duration=response.elapsed.total_seconds(),
+            size=len(response.content),
+        )
         return {
             "url": url,
             "reachable": True,
@@ -17,13 +28,15 @@ def checkWebsiteReachability(url):
             "reason": response.reason,
             "elapsed_time": response.elapsed.total_seconds(),
         }
-    except requests.exceptions.Timeout:
+    except requests.exceptions.Timeout as e:
+        record_probe("reachability", error_class=type(e).__name__)
         return {
             "url": url,
             "reachable": False,
             "error": "Timeout occurred while trying to reach the website.",
         }
     except requests.exceptions.RequestException as e:
+        record_probe("reachability", error_class=type(e).__name__)
         return {
             "url": url,
             "reachable": False,
@@ -60,6 +73,15 @@ def main():
     result = checkWebsiteReachability(url)
     generateReport(result)
 
+    # Optionally stream the result as a structured record; piped input may end before this question
+    try:
+        output = input("Output file for a JSONL/CSV record (leave empty to skip): ").strip()
+    except EOFError:
+        output = ""
+    if output:
+        with open_sink(output) as sink:
+            sink.write(result)
+
 if __name__ == "__main__":
     main()
 
@@ -1,14 +1,50 @@
+import sys
 import httpx
-from typing import Dict, Any
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from outputSinks import add_output_arguments, sink_from_args
+from metricsExporter import (
+    add_metrics_arguments, metrics_server_from_args, record_probe, stop_metrics_server, track_in_flight
+)
 
 DEFAULT_USER_AGENT = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 )
+# Crawlers follow at least five redirects for robots.txt
+MAX_ROBOTS_REDIRECTS = 5
+
+
+def same_site_redirect(response: httpx.Response) -> Optional[httpx.URL]:
+    """
+    Get the target of a redirect that stays on the same website.
+    The scheme may change (http to https) and a leading "www." is ignored, so the
+    usual canonical-host redirects are followed, but other hosts are not.
+
+    Args:
+        response (httpx.Response): The response to a robots.txt request.
+
+    Returns:
+        Optional[httpx.URL]: The redirect target, or None if the response is not a
+            redirect or leaves the website.
+    """
+    if not response.has_redirect_location:
+        return None
+    target = response.url.join(response.headers["Location"])
+
+    def site(host):
+        return host.lower().removeprefix("www.")
+
+    if target.scheme not in ("http", "https") or site(target.host) != site(response.url.host):
+        return None
+    return target
 
 
 def fetch_robots_txt(url: str, user_agent: str = DEFAULT_USER_AGENT) -> str:
     """
     Fetch the content of the robots.txt file for a given website.
+    Redirects are followed as long as they stay on the same website.
 
     Args:
         url (str): The base URL of the website (e.g., "https://example.com").
@@ -21,15 +57,72 @@ def fetch_robots_txt(url: str, user_agent: str = DEFAULT_USER_AGENT) -> str:
     headers = {"User-Agent": user_agent}
 
     try:
-        response = httpx.get(robots_url, headers=headers, timeout=10)
+        with track_in_flight("robots"):
+            response = httpx.get(robots_url, headers=headers, timeout=10)
+            for _ in range(MAX_ROBOTS_REDIRECTS):
+                if (target := same_site_redirect(response)) is None:
+                    break
+                response = httpx.get(target, headers=headers, timeout=10)
+        record_probe(
+            "robots", response.status_code, duration=response.elapsed.total_seconds(),
+            size=response.num_bytes_downloaded,
+        )
+        response.raise_for_status()
+        return response.text
+    except httpx.RequestError as exc:
+        record_probe("robots", error_class=type(exc).__name__)
+        return f"Request error: {exc}"
+    except httpx.HTTPStatusError as exc:
+        return f"HTTP error: {exc}"
+
+
+async def fetch_robots_txt_async(client: httpx.AsyncClient, url: str) -> str:
+    """
+    Fetch the content of the robots.txt file using a shared async client.
+    Redirects are followed as long as they stay on the same website.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with; its headers are used.
+        url (str): The base URL of the website (e.g., "https://example.com").
+
+    Returns:
+        str: The content of the robots.txt file as a string, or an error message.
+    """
+    robots_url = url.rstrip("/") + "/robots.txt"
+
+    try:
+        with track_in_flight("robots"):
+            response = await client.get(robots_url, follow_redirects=False)
+            for _ in range(MAX_ROBOTS_REDIRECTS):
+                if (target := same_site_redirect(response)) is None:
+                    break
+                response = await client.get(target, follow_redirects=False)
+        record_probe(
+            "robots", response.status_code, duration=response.elapsed.total_seconds(),
+            size=response.num_bytes_downloaded,
+        )
         response.raise_for_status()
         return response.text
     except httpx.RequestError as exc:
+        record_probe("robots", error_class=type(exc).__name__)
         return f"Request error: {exc}"
     except httpx.HTTPStatusError as exc:
         return f"HTTP error: {exc}"
 
 
+def is_fetch_error(content: str) -> bool:
+    """
+    Check whether a fetch result is an error message rather than robots.txt content.
+
+    Args:
+        content (str): The value returned by fetch_robots_txt or fetch_robots_txt_async.
+
+    Returns:
+        bool: True if the fetch failed.
+    """
+    return content.startswith("Request error") or content.startswith("HTTP error")
+
+
 def parse_robots_txt(content: str) -> Dict[str, Any]:
     """
     Parse the content of a robots.txt file into a structured dictionary.
@@ -105,7 +198,7 @@ def check_robots_txt(url: str, user_agent: str = DEFAULT_USER_AGENT) -> str:
     """
     content = fetch_robots_txt(url, user_agent)
 
-    if content.startswith("Request error") or content.startswith("HTTP error"):
+    if is_fetch_error(content):
         return content
 
     parsed_data = parse_robots_txt(content)
@@ -121,7 +214,35 @@ if __name__ == "__main__":
         "--user-agent", help="Custom User-Agent for the request.", default=DEFAULT_USER_AGENT
     )
 
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
-    report = check_robots_txt(args.url, args.user_agent)
-    print(report)
 
+    try:
+        metrics = metrics_server_from_args(args)
+        sink = sink_from_args(args)
+    except (OSError, RuntimeError) as e:
+        parser.error(str(e))
+
+    try:
+        if sink is None:
+            report = check_robots_txt(args.url, args.user_agent)
+            print(report)
+        else:
+            content = fetch_robots_txt(args.url, args.user_agent)
+            # Keep stdout clean for the record when it is streamed there
+            report_file = sys.stderr if sink.path == "-" else sys.stdout
+            with sink:
+                if is_fetch_error(content):
+                    print(content, file=report_file)
+                    sink.write({"url": args.url, "error": content})
+                else:
+                    parsed_data = parse_robots_txt(content)
+                    print(generate_report(parsed_data), file=report_file)
+                    sink.write({
+                        "url": args.url,
+                        "sitemaps": parsed_data["Sitemaps"],
+                        "rules": parsed_data["Rules"],
+                    })
+    finally:
+        stop_metrics_server(metrics, args.metrics_linger)
@@ -1,8 +1,47 @@
+import time
+import os
 import httpx
+import asyncio
+import hashlib
 import argparse
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+from urllib.parse import urlsplit
 from icecream import ic
 from tqdm import tqdm
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "robots"))
+from outputSinks import add_output_arguments, sink_from_args
+from metricsExporter import (
+    add_metrics_arguments, metrics_server_from_args, record_probe, stop_metrics_server, track_in_flight
+)
+from robotsCheck import fetch_robots_txt_async, is_fetch_error, parse_robots_txt
+from probeCache import DEFAULT_CACHE_TTL, ProbeCache
+from sitemapDiff import CHANGE_FIELDS, diff_site
+from soft404 import DEFAULT_PREFIX_BYTES, Soft404Detector, read_prefix
+from urlDedup import DEFAULT_DEDUP_CAPACITY, DEFAULT_FALSE_POSITIVE_RATE, BloomFilter, dedup_records
+from sitemapStats import load_stats, order_by_hit_rate, record_result, save_stats
+from sitemapExpander import (
+    DEFAULT_EXPAND_CONCURRENCY, DEFAULT_MAX_DECOMPRESSED_BYTES, DEFAULT_MAX_DEPTH, URL_RECORD_FIELDS,
+    expand_reachable
+)
+
+
+# Constants
+DEFAULT_CONCURRENCY = 20
+DEFAULT_TIMEOUT = 10
+DEFAULT_PER_HOST_LIMIT = 4
+DEFAULT_MAX_BODY_BYTES = 16 * 1024
+PROBE_METHODS = ("get", "head")
+HEAD_REJECTED_STATUSES = {405, 501}
+# Every key of a probe result, e.g. for CSV columns
+RESULT_FIELDS = (
+    "url", "path", "source", "reachable", "status_code", "reason", "method", "http_version",
+    "content_length", "content_type", "content_kind", "soft_404", "unchanged", "error",
+)
+
 
 def load_potential_sitemaps(file_path):
     """
@@ -25,53 +64,640 @@ def load_potential_sitemaps(file_path):
         return []
 
 
-def check_sitemap(base_url, path, user_agent):
+def build_sitemap_url(base_url, path):
+    """
+    Join a base URL and a sitemap path into a full URL.
+    Absolute URLs, such as sitemaps declared in robots.txt, are returned unchanged.
+    Args:
+        base_url (str): The base URL of the website.
+        path (str): The sitemap path to append, or an absolute sitemap URL.
+    Returns:
+        str: The full sitemap URL.
+    """
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+
+
+def create_client(user_agent, concurrency=DEFAULT_CONCURRENCY, http2=False):
+    """
+    Create the shared async client for sitemap probes.
+    In HTTP/2 mode all requests to an origin are multiplexed over one connection.
+    Servers that do not negotiate HTTP/2, and installs without the h2 package,
+    fall back to a pooled HTTP/1.1 keep-alive client.
+    Args:
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The maximum number of pooled connections.
+        http2 (bool): Try to negotiate HTTP/2.
+    Returns:
+        httpx.AsyncClient: The client.
+    """
+    headers = {"User-Agent": user_agent}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if http2:
+        try:
+            return httpx.AsyncClient(
+                headers=headers, timeout=DEFAULT_TIMEOUT, limits=limits, http2=True
+            )
+        except ImportError as e:
+            ic(f"HTTP/2 unavailable ({e}), falling back to HTTP/1.1 keep-alive")
+    return httpx.AsyncClient(headers=headers, timeout=DEFAULT_TIMEOUT, limits=limits)
+
+
+class CombinedLimit:
+    """
+    Holds a slot of several semaphores at once, e.g. a per-host and a global limit.
+    It can be passed anywhere a single semaphore is accepted. The semaphores are
+    always acquired in the same order, so limits shared by many holders cannot deadlock.
+    """
+
+    def __init__(self, *semaphores):
+        """
+        Args:
+            *semaphores (asyncio.Semaphore): The semaphores, most specific first.
+        """
+        self.semaphores = semaphores
+
+    async def __aenter__(self):
+        acquired = []
+        try:
+            for semaphore in self.semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for semaphore in reversed(self.semaphores):
+            semaphore.release()
+
+
+def check_sitemap(base_url, path, user_agent, method="get", max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                  http2=False, **probe_options):
     """
     Check if a specific sitemap path is reachable.
+    This is a blocking wrapper that runs its own event loop with a one-off client,
+    so it cannot be called while an event loop is running; async callers, and
+    loops over many paths, should await check_sitemap_async with a shared client.
     Args:
         base_url (str): The base URL of the website.
         path (str): The sitemap path to check.
         user_agent (str): The user agent to use for the request.
+        method (str): "get" for a full GET, "head" for HEAD-first probing.
+        max_body_bytes (int): Byte cap for the streamed GET fallback in "head" mode.
+        http2 (bool): Try to negotiate HTTP/2.
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
     Returns:
         dict: A result dictionary containing the URL, status, and details.
     """
-    full_url = f"{base_url.rstrip('/')}/{path.lstrip('/')}"
-    headers = {"User-Agent": user_agent}
+    return asyncio.run(_check_sitemap_once(
+        base_url, path, user_agent, http2, method=method, max_body_bytes=max_body_bytes, **probe_options
+    ))
+
+
+async def _check_sitemap_once(base_url, path, user_agent, http2, **probe_options):
+    async with create_client(user_agent, concurrency=1, http2=http2) as client:
+        return await check_sitemap_async(client, base_url, path, **probe_options)
+
+
+async def fetch_head_first(client, url, max_body_bytes=DEFAULT_MAX_BODY_BYTES, headers=None):
+    """
+    Probe a URL with HEAD, falling back to a bounded streamed GET if HEAD is rejected.
+    The fallback stops reading once the headers plus at most max_body_bytes have
+    arrived and then closes the stream, so large bodies are never downloaded.
+    Args:
+        client (httpx.AsyncClient): The client to send the requests with.
+        url (str): The URL to probe.
+        max_body_bytes (int): The maximum number of body bytes to read in the fallback.
+        headers (dict): Extra request headers, e.g. conditional headers (optional).
+    Returns:
+        httpx.Response: The HEAD response, or the closed GET response.
+    """
+    response = await client.head(url, headers=headers)
+    if response.status_code not in HEAD_REJECTED_STATUSES:
+        return response
+
+    ic(f"HEAD rejected for {url} ({response.status_code}), falling back to streamed GET")
+    async with client.stream("GET", url, headers=headers) as response:
+        bytes_read = 0
+        if max_body_bytes > 0:
+            async for chunk in response.aiter_raw():
+                bytes_read += len(chunk)
+                if bytes_read >= max_body_bytes:
+                    break
+    return response
+
+
+def build_result(url, response):
+    """
+    Build a result dictionary from a sitemap probe response.
+    Args:
+        url (str): The probed URL.
+        response (httpx.Response): The response to summarise.
+    Returns:
+        dict: The URL, reachability, status and any Content-Length/Content-Type.
+    """
+    result = {
+        "url": url,
+        "reachable": response.status_code == 200,
+        "status_code": response.status_code,
+        "reason": response.reason_phrase,
+        "method": response.request.method,
+        "http_version": response.http_version,
+    }
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        result["content_length"] = int(content_length)
+    if content_type := response.headers.get("Content-Type"):
+        result["content_type"] = content_type
+    return result
+
+
+def update_probe_cache(cache, url, response, result, body=None):
+    """
+    Record a probe response in the cache, or mark the cached entry as revalidated.
+    A 304 Not Modified answer to a conditional request means the sitemap is
+    unchanged since the cached 200, so the result is reported as reachable.
+    Soft 404s are stored without validators, so they are never revalidated into
+    a reachable 304 and are probed (and classified) again on every run.
+    Args:
+        cache (ProbeCache): The probe cache.
+        url (str): The probed URL.
+        response (httpx.Response): The probe response.
+        result (dict): The result dictionary to update in place.
+        body (bytes): The full response body if it was downloaded (optional).
+    """
+    if response.status_code == 304:
+        cache.refresh(url)
+        result["reachable"] = True
+        result["unchanged"] = True
+        return
+    if result.get("soft_404"):
+        cache.store(url, response.status_code)
+        return
+    cache.store(
+        url,
+        response.status_code,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        body_digest=hashlib.sha256(body).hexdigest() if body is not None else None,
+    )
+
+
+async def check_sitemap_async(client, base_url, path, semaphore=None, method="get",
+                              max_body_bytes=DEFAULT_MAX_BODY_BYTES, cache=None, soft404=None):
+    """
+    Check if a specific sitemap path is reachable using a shared async client.
+    Args:
+        client (httpx.AsyncClient): The shared client to send the request with.
+        base_url (str): The base URL of the website.
+        path (str): The sitemap path to check.
+        semaphore (asyncio.Semaphore): Limits the number of requests in flight (optional).
+        method (str): "get" for a full GET, "head" for HEAD-first probing.
+        max_body_bytes (int): Byte cap for the streamed GET fallback in "head" mode.
+        cache (ProbeCache): Revalidate against and update this cache (optional).
+        soft404 (Soft404Detector): Classify the candidate from a partial GET against the
+            origin's "not found" baseline; overrides method (optional).
+    Returns:
+        dict: A result dictionary in the same shape as check_sitemap, plus the probed "path".
+    """
+    full_url = build_sitemap_url(base_url, path)
+    conditional = cache.conditional_headers(full_url) if cache is not None else {}
     try:
-        response = httpx.get(full_url, headers=headers, timeout=10)
+        async with semaphore or nullcontext():
+            started = time.perf_counter()
+            with track_in_flight("sitemap"):
+                if soft404 is not None:
+                    response, prefix = await read_prefix(
+                        client, full_url, soft404.prefix_bytes, conditional
+                    )
+                elif method == "head":
+                    response = await fetch_head_first(client, full_url, max_body_bytes, conditional)
+                else:
+                    response = await client.get(full_url, headers=conditional)
+        record_probe(
+            "sitemap", response.status_code, duration=time.perf_counter() - started,
+            size=response.num_bytes_downloaded,
+        )
         ic(f"Checked {full_url}: {response.status_code} {response.reason_phrase}")
-        return {
-            "url": full_url,
-            "reachable": response.status_code == 200,
-            "status_code": response.status_code,
-            "reason": response.reason_phrase,
-        }
+        result = build_result(full_url, response)
+        if soft404 is not None and response.status_code != 304:
+            # The probe's slot is released by now; the baseline request takes its own
+            await soft404.classify(client, response, prefix, result, semaphore)
+        if cache is not None:
+            body = response.content if soft404 is None and method != "head" else None
+            update_probe_cache(cache, full_url, response, result, body)
     except httpx.RequestError as e:
         ic(f"Request error for {full_url}: {e}")
-        return {
+        record_probe("sitemap", error_class=type(e).__name__)
+        result = {
             "url": full_url,
             "reachable": False,
             "error": str(e),
         }
+    result["path"] = path
+    return result
+
+
+async def check_paths_in_order(client, base_url, paths, semaphore=None, stop_after=None,
+                               progress=None, **probe_options):
+    """
+    Probe sitemap paths in the given priority order, optionally stopping early.
+    Requests are started in list order (the semaphore is FIFO), and once stop_after
+    paths have been reachable every check that is still queued or in flight is cancelled.
+    Args:
+        client (httpx.AsyncClient): The shared client to send the requests with.
+        base_url (str): The base URL of the website.
+        paths (list): The sitemap paths to check, most likely hit first.
+        semaphore (asyncio.Semaphore): Limits the number of requests in flight (optional).
+        stop_after (int): Stop after this many reachable sitemaps (optional).
+        progress (tqdm): A progress bar to advance per finished check (optional).
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
+    Returns:
+        list: Result dictionaries of the checks finished before the limit, in the order of paths.
+    """
+    tasks = [
+        asyncio.create_task(check_sitemap_async(client, base_url, path, semaphore, **probe_options))
+        for path in paths
+    ]
+    kept = set()
+    pending = set(tasks)
+    hits = 0
+    try:
+        while pending and not (stop_after and hits >= stop_after):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Checks finishing together are taken in path order, up to the limit
+            for task in sorted(done, key=tasks.index):
+                if stop_after and hits >= stop_after:
+                    break
+                kept.add(task)
+                if progress is not None:
+                    progress.update(1)
+                hits += int(task.result()["reachable"])
+        if len(kept) < len(tasks):
+            ic(f"Found {hits} sitemaps on {base_url}, skipping the remaining paths")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return [task.result() for task in tasks if task in kept]
+
+
+async def check_sitemaps_async(base_url, paths, user_agent, concurrency=DEFAULT_CONCURRENCY,
+                               stop_after=None, http2=False, **probe_options):
+    """
+    Probe all sitemap paths of a website concurrently over one async client.
+    Args:
+        base_url (str): The base URL of the website.
+        paths (list): The sitemap paths to check, most likely hit first.
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The maximum number of requests in flight at once.
+        stop_after (int): Stop after this many reachable sitemaps (optional).
+        http2 (bool): Multiplex all paths over one HTTP/2 connection where possible.
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
+    Returns:
+        list: Result dictionaries in the same order as paths.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with create_client(user_agent, concurrency, http2) as client:
+        with tqdm(total=len(paths), desc="Sitemap checks", unit="sitemaps") as progress:
+            return await check_paths_in_order(
+                client, base_url, paths, semaphore, stop_after, progress, **probe_options
+            )
+
+
+async def discover_sitemaps(client, base_url, paths, semaphore=None, force_bruteforce=False,
+                            stop_after=None, **probe_options):
+    """
+    Discover sitemaps from robots.txt first and brute-force the candidate paths only if needed.
+    The candidates are probed when robots.txt declares no sitemaps, when every declared
+    sitemap fails, or when force_bruteforce is set.
+    Args:
+        client (httpx.AsyncClient): The shared client to send the requests with.
+        base_url (str): The base URL of the website.
+        paths (list): The candidate sitemap paths to fall back to.
+        semaphore (asyncio.Semaphore): Limits the number of requests in flight (optional).
+        force_bruteforce (bool): Probe the candidate paths even if a declared sitemap works.
+        stop_after (int): Stop probing candidates after this many hits (optional).
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
+    Returns:
+        list: Result dictionaries, each tagged with the "source" it was discovered from.
+    """
+    async with semaphore or nullcontext():
+        content = await fetch_robots_txt_async(client, base_url)
+
+    declared = []
+    if is_fetch_error(content):
+        ic(f"No robots.txt for {base_url}: {content}")
+    else:
+        declared = list(dict.fromkeys(parse_robots_txt(content)["Sitemaps"]))
+        ic(f"robots.txt for {base_url} declares {len(declared)} sitemaps")
+
+    results = await asyncio.gather(*(
+        check_sitemap_async(client, base_url, sitemap_url, semaphore, **probe_options)
+        for sitemap_url in declared
+    ))
+    for result in results:
+        result["source"] = "robots.txt"
+
+    if force_bruteforce or not any(result["reachable"] for result in results):
+        checked = {result["url"] for result in results}
+        candidates = [
+            path for path in dict.fromkeys(paths)
+            if build_sitemap_url(base_url, path) not in checked
+        ]
+        candidate_results = await check_paths_in_order(
+            client, base_url, candidates, semaphore, stop_after, **probe_options
+        )
+        for result in candidate_results:
+            result["source"] = "candidates"
+        results.extend(candidate_results)
+
+    return results
+
+
+async def discover_sitemaps_async(base_url, paths, user_agent, concurrency=DEFAULT_CONCURRENCY,
+                                  force_bruteforce=False, stop_after=None, http2=False,
+                                  **probe_options):
+    """
+    Run robots.txt-seeded sitemap discovery for one website over a fresh async client.
+    Args:
+        base_url (str): The base URL of the website.
+        paths (list): The candidate sitemap paths to fall back to.
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The maximum number of requests in flight at once.
+        force_bruteforce (bool): Probe the candidate paths even if a declared sitemap works.
+        stop_after (int): Stop probing candidates after this many hits (optional).
+        http2 (bool): Multiplex all requests over one HTTP/2 connection where possible.
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
+    Returns:
+        list: Result dictionaries, declared sitemaps first.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with create_client(user_agent, concurrency, http2) as client:
+        return await discover_sitemaps(
+            client, base_url, paths, semaphore, force_bruteforce, stop_after, **probe_options
+        )
+
+
+def load_sites(source):
+    """
+    Lazily read base URLs from a batch file, one per line.
+    Args:
+        source (str): Path to the batch file, or "-" to read from stdin.
+    Yields:
+        str: Each valid base URL in input order.
+    """
+    file = sys.stdin if source == "-" else open(source, "r")
+    try:
+        for line in file:
+            site = line.strip()
+            if not site or site.startswith("#"):
+                continue
+            if not site.startswith("http://") and not site.startswith("https://"):
+                ic(f"Skipping invalid URL: {site}")
+                continue
+            yield site
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+async def probe_sites(sites, paths, user_agent, concurrency=DEFAULT_CONCURRENCY,
+                      per_host_limit=DEFAULT_PER_HOST_LIMIT, discover=False,
+                      force_bruteforce=False, stop_after=None, http2=False, **probe_options):
+    """
+    Probe the site x path cross-product over one worker pool and stream the results.
+    Sites are consumed in windows of `concurrency` and their jobs interleaved path-major,
+    so consecutive jobs hit different hosts and the per-host cap rarely stalls a worker.
+    In discovery mode each job is a whole site run through discover_sitemaps, whose
+    requests (robots.txt, declared sitemaps and candidates) each take a per-host and a
+    global slot, so at most concurrency requests are in flight overall.
+    Args:
+        sites (iterable): Base URLs of the websites to check.
+        paths (list): The sitemap paths to check on every site.
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The global maximum number of requests in flight.
+        per_host_limit (int): The maximum number of requests in flight per host.
+        discover (bool): Seed each site from robots.txt before brute-forcing paths.
+        force_bruteforce (bool): In discovery mode, always probe the candidate paths too.
+        stop_after (int): Skip the remaining paths of a host after this many hits and cancel
+            its checks still in flight (optional).
+        http2 (bool): Multiplex each host's requests over one HTTP/2 connection where possible.
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
+    Yields:
+        dict: Result dictionaries in the check_sitemap shape, as each one finishes.
+    """
+    jobs = asyncio.Queue(maxsize=concurrency * 2)
+    results = asyncio.Queue()
+    host_semaphores = {}
+    host_pending = {}
+    host_hits = {}
+    host_probes = {}
+    global_limit = asyncio.Semaphore(concurrency)
+
+    async def produce():
+        try:
+            window = []
+            for site in sites:
+                window.append(site)
+                if len(window) >= concurrency:
+                    await enqueue(window)
+                    window = []
+            await enqueue(window)
+        except OSError as e:
+            ic(f"Error reading the sites: {e}")
+        finally:
+            # Always release the workers, even if reading the sites failed
+            for _ in range(concurrency):
+                await jobs.put(None)
+
+    async def enqueue(window):
+        for site in window:
+            host = urlsplit(site).netloc
+            if host not in host_semaphores:
+                host_semaphores[host] = asyncio.Semaphore(per_host_limit)
+                host_pending[host] = 0
+                host_hits[host] = 0
+                host_probes[host] = set()
+            host_pending[host] += 1 if discover else len(paths)
+        if discover:
+            for site in window:
+                await jobs.put((site, None))
+            return
+        for path in paths:
+            for site in window:
+                await jobs.put((site, path))
+
+    async def probe(client, site, host, path):
+        # Run the check as its own task so a sibling hitting stop_after can cancel it
+        check = asyncio.create_task(check_sitemap_async(client, site, path, **probe_options))
+        host_probes[host].add(check)
+        try:
+            return [await check]
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            return []
+        finally:
+            host_probes[host].discard(check)
+
+    async def work(client):
+        while (job := await jobs.get()) is not None:
+            site, path = job
+            host = urlsplit(site).netloc
+            try:
+                if stop_after and host_hits[host] >= stop_after:
+                    site_results = []
+                elif path is None:
+                    site_results = await discover_sitemaps(
+                        client, site, paths, CombinedLimit(host_semaphores[host], global_limit),
+                        force_bruteforce, stop_after, **probe_options
+                    )
+                else:
+                    async with host_semaphores[host]:
+                        # Re-check once a slot is free, a sibling job may have hit meanwhile
+                        if stop_after and host_hits[host] >= stop_after:
+                            site_results = []
+                        else:
+                            site_results = await probe(client, site, host, path)
+            except Exception as e:
+                ic(f"Unexpected error for {site} {path or ''}: {e}")
+                site_results = [{
+                    "url": build_sitemap_url(site, path or ""), "reachable": False, "error": str(e)
+                }]
+            if stop_after and host_hits[host] >= stop_after:
+                # The host reached the limit while this job was running
+                site_results = []
+            host_hits[host] += sum(int(result["reachable"]) for result in site_results)
+            if stop_after and host_hits[host] >= stop_after:
+                for sibling in host_probes[host]:
+                    sibling.cancel()
+            host_pending[host] -= 1
+            if not host_pending[host]:
+                del host_pending[host], host_semaphores[host], host_hits[host], host_probes[host]
+            for result in site_results:
+                await results.put(result)
+        await results.put(None)
+
+    async with create_client(user_agent, concurrency, http2) as client:
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work(client)) for _ in range(concurrency)]
+        try:
+            running = concurrency
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def stream_batch(sink, sites, paths, user_agent, concurrency, per_host_limit, discover=False,
+                       force_bruteforce=False, stop_after=None, stats=None, http2=False,
+                       **probe_options):
+    """
+    Run a batch probe and write one record per result to the sink as soon as it finishes.
+    Args:
+        sink (OutputSink): The sink to stream the results to.
+        sites (iterable): Base URLs of the websites to check.
+        paths (list): The sitemap paths to check on every site.
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The global maximum number of requests in flight.
+        per_host_limit (int): The maximum number of requests in flight per host.
+        discover (bool): Seed each site from robots.txt before brute-forcing paths.
+        force_bruteforce (bool): In discovery mode, always probe the candidate paths too.
+        stop_after (int): Skip the remaining paths of a host after this many hits (optional).
+        stats (dict): Per-path hit statistics to update with every result (optional).
+        http2 (bool): Multiplex each host's requests over one HTTP/2 connection where possible.
+        **probe_options: Extra keyword arguments forwarded to check_sitemap_async.
+    """
+    async for result in probe_sites(
+        sites, paths, user_agent, concurrency, per_host_limit, discover, force_bruteforce,
+        stop_after, http2, **probe_options
+    ):
+        if stats is not None:
+            record_result(stats, result)
+        sink.write(result)
+
+
+async def stream_expansion(sink, results, user_agent, concurrency, max_depth,
+                           max_decompressed_bytes, seen=None):
+    """
+    Expand the reachable sitemaps and write one record per URL to the sink.
+    Args:
+        sink (OutputSink): The sink to stream the URL records to.
+        results (list): Result dictionaries from the sitemap checks.
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The number of sitemaps fetched at once.
+        max_depth (int): How many levels of nested sitemap indexes to follow.
+        max_decompressed_bytes (int): The maximum decompressed size of a single sitemap.
+        seen (BloomFilter): Drop URLs already recorded in this filter (optional).
+    """
+    records = expand_reachable(results, user_agent, concurrency, max_depth, max_decompressed_bytes)
+    if seen is not None:
+        records = dedup_records(records, seen)
+    async for record in records:
+        sink.write(record)
+
+
+async def stream_diff(sink, results, base_url, snapshot_dir, user_agent, **expand_options):
+    """
+    Diff the site's sitemap inventory against the previous run and write each change to the sink.
+    Args:
+        sink (OutputSink): The sink to stream the changes to.
+        results (list): Result dictionaries from the sitemap checks.
+        base_url (str): The base URL of the website.
+        snapshot_dir (str): The root directory for the per-site snapshots.
+        user_agent (str): The user agent to use for the requests.
+        **expand_options: Extra keyword arguments forwarded to expand_reachable.
+    """
+    async for change in diff_site(results, base_url, snapshot_dir, user_agent, **expand_options):
+        sink.write(change)
 
 
-def generate_report(results):
+def generate_report(results, file=None):
     """
     Generate and print a report of sitemap checks.
     Args:
         results (list): A list of result dictionaries from sitemap checks.
+        file (file): Where to print the report (default: stdout).
     """
-    print("\nSitemap Check Report")
-    print("=" * 30)
+    print("\nSitemap Check Report", file=file)
+    print("=" * 30, file=file)
     for result in results:
-        print(f"URL: {result['url']}")
+        print(f"URL: {result['url']}", file=file)
         if result["reachable"]:
-            print(f"  Status: Reachable")
-            print(f"  Status Code: {result['status_code']} ({result['reason']})")
+            print(f"  Status: Reachable", file=file)
+            print(f"  Status Code: {result['status_code']} ({result['reason']})", file=file)
+            if "http_version" in result:
+                print(f"  Protocol: {result['http_version']}", file=file)
+            if result.get("unchanged"):
+                print(f"  Unchanged since the cached response", file=file)
+            if "content_kind" in result:
+                print(f"  Content Kind: {result['content_kind']}", file=file)
+            if "content_type" in result:
+                print(f"  Content-Type: {result['content_type']}", file=file)
+            if "content_length" in result:
+                print(f"  Content-Length: {result['content_length']} bytes", file=file)
         else:
-            print(f"  Status: Not Reachable")
-            print(f"  Error: {result.get('error', 'Unknown Error')}")
-        print("-" * 30)
+            print(f"  Status: Not Reachable", file=file)
+            if result.get("soft_404"):
+                print(f"  Soft 404: {result['status_code']} with a '{result['content_kind']}' "
+                      f"page matching the site's not-found response", file=file)
+            else:
+                print(f"  Error: {result.get('error', 'Unknown Error')}", file=file)
+        print("-" * 30, file=file)
 
 
 def main():
@@ -79,7 +705,14 @@ def main():
     Main function to handle command-line arguments and check for sitemaps.
     """
     parser = argparse.ArgumentParser(description="Check for a website's sitemap availability.")
-    parser.add_argument("url", type=str, help="The base URL of the website to check.")
+    parser.add_argument("url", type=str, nargs="?", help="The base URL of the website to check.")
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=None,
+        help="Path to a file with one base URL per line, or '-' to read from stdin. "
+             "Results are streamed as JSON lines."
+    )
     parser.add_argument(
         "--sitemap-file",
         type=str,
@@ -93,6 +726,144 @@ def main():
         help="Custom User-Agent string to use for the requests. "
              "If not provided, a default browser user agent will be used."
     )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Probe all sitemap paths concurrently over one shared connection pool."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum number of requests in flight in async mode (default: {DEFAULT_CONCURRENCY})."
+    )
+    parser.add_argument(
+        "--per-host-limit",
+        type=int,
+        default=DEFAULT_PER_HOST_LIMIT,
+        help=f"Maximum number of requests in flight per host in batch mode "
+             f"(default: {DEFAULT_PER_HOST_LIMIT})."
+    )
+    parser.add_argument(
+        "--probe-method",
+        choices=PROBE_METHODS,
+        default="get",
+        help="'get' downloads each candidate; 'head' probes with HEAD and falls back to a "
+             "bounded streamed GET when HEAD is rejected (default: get)."
+    )
+    parser.add_argument(
+        "--max-body-bytes",
+        type=int,
+        default=DEFAULT_MAX_BODY_BYTES,
+        help=f"Maximum body bytes read by the HEAD fallback (default: {DEFAULT_MAX_BODY_BYTES})."
+    )
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        help="Verify the sitemaps declared in robots.txt first and only probe the candidate "
+             "paths if none are declared or all of them fail."
+    )
+    parser.add_argument(
+        "--force-bruteforce",
+        action="store_true",
+        help="With --discover, probe the candidate paths even if a declared sitemap works."
+    )
+    parser.add_argument(
+        "--expand",
+        action="store_true",
+        help="Expand every reachable sitemap and stream its URLs as JSON lines after the report."
+    )
+    parser.add_argument(
+        "--expand-concurrency",
+        type=int,
+        default=DEFAULT_EXPAND_CONCURRENCY,
+        help=f"Number of sitemaps fetched at once while expanding "
+             f"(default: {DEFAULT_EXPAND_CONCURRENCY})."
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=DEFAULT_MAX_DEPTH,
+        help=f"Levels of nested sitemap indexes to follow (default: {DEFAULT_MAX_DEPTH})."
+    )
+    parser.add_argument(
+        "--max-decompressed-bytes",
+        type=int,
+        default=DEFAULT_MAX_DECOMPRESSED_BYTES,
+        help=f"Abort expanding a sitemap that decompresses to more than this many bytes "
+             f"(default: {DEFAULT_MAX_DECOMPRESSED_BYTES})."
+    )
+    parser.add_argument(
+        "--stats-file",
+        type=str,
+        default=None,
+        help="JSON file with per-path hit rates from previous runs. Candidates are probed "
+             "most likely first and the file is updated with this run's results."
+    )
+    parser.add_argument(
+        "--stop-after",
+        type=int,
+        default=None,
+        help="Stop probing a site's candidate paths after this many reachable sitemaps."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory for a persistent probe cache. Cached sitemaps are revalidated with "
+             "If-None-Match/If-Modified-Since and a 304 counts as unchanged and reachable."
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds before a cache entry is evicted (default: {DEFAULT_CACHE_TTL})."
+    )
+    parser.add_argument(
+        "--diff-dir",
+        type=str,
+        default=None,
+        help="Directory for per-site sitemap snapshots. Expands the reachable sitemaps and "
+             "streams only added, removed and lastmod-changed URLs as JSON lines."
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Drop URLs repeated across sitemaps while expanding, using a Bloom filter."
+    )
+    parser.add_argument(
+        "--dedup-capacity",
+        type=int,
+        default=DEFAULT_DEDUP_CAPACITY,
+        help=f"Expected number of distinct URLs for --dedup (default: {DEFAULT_DEDUP_CAPACITY})."
+    )
+    parser.add_argument(
+        "--dedup-fp-rate",
+        type=float,
+        default=DEFAULT_FALSE_POSITIVE_RATE,
+        help=f"Accepted false-positive rate for --dedup (default: {DEFAULT_FALSE_POSITIVE_RATE})."
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Multiplex the probes for a host over one HTTP/2 connection, falling back to "
+             "pooled HTTP/1.1 keep-alive when HTTP/2 is not available."
+    )
+    parser.add_argument(
+        "--detect-soft-404",
+        action="store_true",
+        help="Fingerprint each host's response to a random nonexistent path and flag candidates "
+             "that answer 200 with the same not-found page. Reads only the first bytes of each body."
+    )
+    parser.add_argument(
+        "--soft-404-bytes",
+        type=int,
+        default=DEFAULT_PREFIX_BYTES,
+        help=f"Body bytes read per response for soft-404 detection (default: {DEFAULT_PREFIX_BYTES})."
+    )
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     # Default user agent
@@ -102,8 +873,20 @@ def main():
     )
     user_agent = args.user_agent or default_user_agent
 
+    if not args.url and not args.batch:
+        parser.error("either a url or --batch is required")
+    if args.batch and args.batch != "-" and not os.path.isfile(args.batch):
+        parser.error(f"batch file not found: {args.batch}")
+    # Only a single site's full expansion is deduplicated
+    if args.dedup and (not args.expand or args.diff_dir or args.batch):
+        parser.error("--dedup needs --expand of a single url, without --batch or --diff-dir")
+    if args.dedup and args.dedup_capacity < 1:
+        parser.error("--dedup-capacity must be at least 1")
+    if args.dedup and not 0 < args.dedup_fp_rate < 1:
+        parser.error("--dedup-fp-rate must be between 0 and 1")
+
     # Validate URL
-    if not args.url.startswith("http://") and not args.url.startswith("https://"):
+    if args.url and not args.url.startswith("http://") and not args.url.startswith("https://"):
         print("Invalid URL. Please include 'http://' or 'https://'.")
         return
 
@@ -113,14 +896,122 @@ def main():
         print("No sitemap paths to check. Please ensure the sitemap file is populated.")
         return
 
+    # Probe the historically most successful paths first
+    stats = load_stats(args.stats_file) if args.stats_file else None
+    sitemap_paths = order_by_hit_rate(sitemap_paths, stats or {})
+    stop_after = args.stop_after if args.stop_after and args.stop_after > 0 else None
+
+    # Batch, expansion and diff records stream to stdout unless --output is given
+    streaming = args.batch or args.expand or args.diff_dir
+    if args.batch or not streaming:
+        fields = RESULT_FIELDS
+    else:
+        fields = CHANGE_FIELDS if args.diff_dir else URL_RECORD_FIELDS
+    try:
+        metrics = metrics_server_from_args(args)
+        sink = sink_from_args(args, "-" if streaming else None, fields)
+    except (OSError, RuntimeError) as e:
+        parser.error(str(e))
+
+    cache = ProbeCache(args.cache_dir, args.cache_ttl) if args.cache_dir else None
+    probe_options = {
+        "method": args.probe_method,
+        "max_body_bytes": args.max_body_bytes,
+        "cache": cache,
+        "soft404": Soft404Detector(max(1, args.soft_404_bytes)) if args.detect_soft_404 else None,
+    }
+    try:
+        run_checks(args, sitemap_paths, user_agent, stats, stop_after, probe_options, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+        if cache is not None:
+            cache.close()
+        stop_metrics_server(metrics, args.metrics_linger)
+
+
+def run_checks(args, sitemap_paths, user_agent, stats, stop_after, probe_options, sink):
+    """
+    Run the sitemap checks selected on the command line and report the results.
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+        sitemap_paths (list): The candidate sitemap paths, most likely hit first.
+        user_agent (str): The user agent to use for the requests.
+        stats (dict): Per-path hit statistics to update, or None.
+        stop_after (int): Stop probing a site after this many hits, or None.
+        probe_options (dict): Keyword arguments forwarded to check_sitemap_async.
+        sink (OutputSink): Where to stream records, or None for the printed report only.
+    """
+    # Stream the site x path cross-product in batch mode
+    if args.batch:
+        sites = load_sites(args.batch)
+        try:
+            asyncio.run(stream_batch(
+                sink, sites, sitemap_paths, user_agent, max(1, args.concurrency),
+                max(1, args.per_host_limit), args.discover, args.force_bruteforce, stop_after,
+                stats, args.http2, **probe_options
+            ))
+        finally:
+            if stats is not None:
+                save_stats(args.stats_file, stats)
+        return
+
+    # Keep stdout clean for the records when they are streamed there
+    report = sys.stderr if sink is not None and sink.path == "-" else sys.stdout
+
+    # Discover sitemaps from robots.txt before falling back to the candidates
+    if args.discover:
+        print(f"Discovering sitemaps for {args.url} via robots.txt...", file=report)
+        results = asyncio.run(discover_sitemaps_async(
+            args.url, sitemap_paths, user_agent, max(1, args.concurrency), args.force_bruteforce,
+            stop_after, args.http2, **probe_options
+        ))
+
     # Check each sitemap with progress bar
-    results = []
-    print(f"Checking {len(sitemap_paths)} sitemap paths for {args.url}...")
-    for path in tqdm(sitemap_paths, desc="Sitemap checks", unit="sitemaps"):
-        results.append(check_sitemap(args.url, path, user_agent))
+    elif args.use_async:
+        print(f"Checking {len(sitemap_paths)} sitemap paths for {args.url}...", file=report)
+        results = asyncio.run(
+            check_sitemaps_async(
+                args.url, sitemap_paths, user_agent, max(1, args.concurrency), stop_after,
+                args.http2, **probe_options
+            )
+        )
+    else:
+        # One request at a time, still over one shared connection
+        print(f"Checking {len(sitemap_paths)} sitemap paths for {args.url}...", file=report)
+        results = asyncio.run(
+            check_sitemaps_async(
+                args.url, sitemap_paths, user_agent, 1, stop_after, args.http2, **probe_options
+            )
+        )
+
+    # Remember which paths hit for the next run
+    if stats is not None:
+        for result in results:
+            record_result(stats, result)
+        save_stats(args.stats_file, stats)
 
     # Generate and print the report
-    generate_report(results)
+    generate_report(results, report)
+    if sink is not None and not (args.expand or args.diff_dir):
+        for result in results:
+            sink.write(result)
+
+    # Stream the changes since the previous snapshot, or the full URL inventory
+    if args.diff_dir:
+        asyncio.run(stream_diff(
+            sink, results, args.url, args.diff_dir, user_agent,
+            concurrency=max(1, args.expand_concurrency), max_depth=max(0, args.max_depth),
+            max_decompressed_bytes=args.max_decompressed_bytes
+        ))
+    elif args.expand:
+        seen = BloomFilter(args.dedup_capacity, args.dedup_fp_rate) if args.dedup else None
+        if seen is not None:
+            ic(f"Dedup filter uses {seen.memory_bytes / 1024 / 1024:.1f} MiB")
+        asyncio.run(stream_expansion(
+            sink, results, user_agent, max(1, args.expand_concurrency), max(0, args.max_depth),
+            args.max_decompressed_bytes, seen
+        ))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import os
+import time
+import sqlite3
+from icecream import ic
+
+
+# Constants
+CACHE_FILE_NAME = "probeCache.sqlite"
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+COMMIT_EVERY = 100
+
+
+class ProbeCache:
+    """
+    On-disk cache of sitemap probe responses, keyed by full URL.
+    Stores the status, validators (ETag / Last-Modified) and a body digest so later
+    runs can send conditional requests. Entries older than the TTL are evicted.
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_CACHE_TTL):
+        """
+        Open (or create) the cache database and evict expired entries.
+        Args:
+            cache_dir (str): The directory holding the cache database.
+            ttl (int): Seconds after which an entry is evicted.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.ttl = ttl
+        self.pending_writes = 0
+        self.connection = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE_NAME))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS probes (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body_digest TEXT,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS probes_fetched_at ON probes (fetched_at)")
+        evicted = self.evict_expired()
+        ic(f"Opened probe cache in {cache_dir}, evicted {evicted} expired entries")
+
+    def evict_expired(self):
+        """
+        Delete every entry older than the TTL.
+        Returns:
+            int: The number of evicted entries.
+        """
+        cursor = self.connection.execute(
+            "DELETE FROM probes WHERE fetched_at < ?", (time.time() - self.ttl,)
+        )
+        self.connection.commit()
+        return cursor.rowcount
+
+    def get(self, url):
+        """
+        Look up the cached probe for a URL.
+        Args:
+            url (str): The full sitemap URL.
+        Returns:
+            dict | None: The cached entry, or None if missing or expired.
+        """
+        row = self.connection.execute(
+            "SELECT status_code, etag, last_modified, body_digest, fetched_at FROM probes "
+            "WHERE url = ? AND fetched_at >= ?",
+            (url, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        status_code, etag, last_modified, body_digest, fetched_at = row
+        return {
+            "status_code": status_code,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_digest": body_digest,
+            "fetched_at": fetched_at,
+        }
+
+    def conditional_headers(self, url):
+        """
+        Build If-None-Match / If-Modified-Since headers from a cached 200 response.
+        Args:
+            url (str): The full sitemap URL.
+        Returns:
+            dict: The conditional request headers, empty if there is nothing to revalidate.
+        """
+        entry = self.get(url)
+        if entry is None or entry["status_code"] != 200:
+            return {}
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, status_code, etag=None, last_modified=None, body_digest=None):
+        """
+        Insert or replace the cached probe for a URL.
+        Args:
+            url (str): The full sitemap URL.
+            status_code (int): The response status code.
+            etag (str): The ETag response header, if any.
+            last_modified (str): The Last-Modified response header, if any.
+            body_digest (str): A digest of the response body, if it was read.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)",
+            (url, status_code, etag, last_modified, body_digest, time.time()),
+        )
+        self._written()
+
+    def refresh(self, url):
+        """
+        Mark a cached entry as revalidated now, e.g. after a 304 Not Modified.
+        Args:
+            url (str): The full sitemap URL.
+        """
+        self.connection.execute("UPDATE probes SET fetched_at = ? WHERE url = ?", (time.time(), url))
+        self._written()
+
+    def _written(self):
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.connection.commit()
+            self.pending_writes = 0
+
+    def close(self):
+        """
+        Commit pending writes and close the database.
+        """
+        self.connection.commit()
+        self.connection.close()
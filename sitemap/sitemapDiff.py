@@ -0,0 +1,293 @@
+import os
+import json
+import heapq
+import tempfile
+from urllib.parse import urlsplit
+from icecream import ic
+from sitemapExpander import expand_reachable
+
+
+# Constants
+SNAPSHOT_FILE = "urls.tsv"
+INDEX_FILE = "sitemaps.json"
+SORT_CHUNK_SIZE = 200_000
+# Every key of a change record, e.g. for CSV columns
+CHANGE_FIELDS = ("change", "loc", "lastmod", "previous_lastmod", "sitemap")
+
+
+def site_snapshot_dir(snapshot_dir, base_url):
+    """
+    Get the directory holding the snapshot of one website.
+    Args:
+        snapshot_dir (str): The root directory for all snapshots.
+        base_url (str): The base URL of the website.
+    Returns:
+        str: The website's snapshot directory.
+    """
+    host = urlsplit(base_url).netloc.replace(":", "_") or "default"
+    return os.path.join(snapshot_dir, host)
+
+
+def format_line(loc, lastmod, sitemap):
+    """
+    Serialise a URL record as one snapshot line.
+    Lines sort by loc first because the tab separator sorts below every URL character.
+    Args:
+        loc (str): The page URL.
+        lastmod (str): The <lastmod> value, or None.
+        sitemap (str): The sitemap the URL was listed in.
+    Returns:
+        str: The tab-separated line, including the newline.
+    """
+    fields = (loc, lastmod or "", sitemap or "")
+    return "\t".join(" ".join(field.split()) for field in fields) + "\n"
+
+
+def parse_line(line):
+    """
+    Parse a snapshot line back into its fields.
+    Args:
+        line (str): A line written by format_line.
+    Returns:
+        tuple: (loc, lastmod, sitemap), with an empty lastmod returned as None.
+    """
+    loc, lastmod, sitemap = line.rstrip("\n").split("\t")
+    return loc, lastmod or None, sitemap
+
+
+def read_lines(path):
+    """
+    Lazily read the lines of a snapshot or sort-run file.
+    Args:
+        path (str): The file to read; a missing file yields nothing.
+    Yields:
+        str: Each line, including the newline.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", newline="\n") as file:
+        yield from file
+
+
+def write_sorted_run(lines, directory):
+    """
+    Sort a chunk of snapshot lines in memory and spill it to a temporary run file.
+    Args:
+        lines (list): The lines to sort.
+        directory (str): The directory for the run file.
+    Returns:
+        str: The path of the run file.
+    """
+    lines.sort()
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", newline="\n", dir=directory, suffix=".run", delete=False
+    ) as file:
+        file.writelines(lines)
+        return file.name
+
+
+def merge_unique(sorted_streams):
+    """
+    Merge sorted line streams, keeping only the first line for every (loc, sitemap).
+    A URL listed in several sitemaps keeps one line per sitemap, so it survives
+    while any of them still lists it.
+    Args:
+        sorted_streams (list): Iterables of lines, each sorted.
+    Yields:
+        str: The merged lines in sorted order.
+    """
+    previous_loc = None
+    sitemaps = set()
+    for line in heapq.merge(*sorted_streams):
+        loc, _, sitemap = parse_line(line)
+        if loc != previous_loc:
+            previous_loc = loc
+            sitemaps.clear()
+        if sitemap not in sitemaps:
+            sitemaps.add(sitemap)
+            yield line
+
+
+def collapse_locs(records):
+    """
+    Collapse consecutive records of the same loc into one.
+    Args:
+        records (iterable): (loc, lastmod, sitemap) tuples, sorted by loc.
+    Yields:
+        tuple: One record per loc, the one with the latest lastmod.
+    """
+    current = None
+    for record in records:
+        if current is None or record[0] != current[0]:
+            if current is not None:
+                yield current
+            current = record
+        elif (record[1] or "") > (current[1] or ""):
+            current = record
+    if current is not None:
+        yield current
+
+
+def diff_snapshots(old_lines, new_lines):
+    """
+    Compare two sorted snapshots with a single streaming merge.
+    The lines of a URL listed in several sitemaps are compared as one URL.
+    Args:
+        old_lines (iterable): The previous snapshot lines, sorted.
+        new_lines (iterable): The current snapshot lines, sorted.
+    Yields:
+        dict: {"change": "added" | "removed" | "lastmod_changed", "loc", "lastmod", ...}.
+    """
+    old_records = collapse_locs(map(parse_line, old_lines))
+    new_records = collapse_locs(map(parse_line, new_lines))
+    old = next(old_records, None)
+    new = next(new_records, None)
+
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield {"change": "removed", "loc": old[0], "lastmod": old[1], "sitemap": old[2]}
+            old = next(old_records, None)
+        elif old is None or new[0] < old[0]:
+            yield {"change": "added", "loc": new[0], "lastmod": new[1], "sitemap": new[2]}
+            new = next(new_records, None)
+        else:
+            if old[1] != new[1]:
+                yield {
+                    "change": "lastmod_changed",
+                    "loc": new[0],
+                    "lastmod": new[1],
+                    "previous_lastmod": old[1],
+                    "sitemap": new[2],
+                }
+            old = next(old_records, None)
+            new = next(new_records, None)
+
+
+def load_index(site_dir):
+    """
+    Load the sitemap tree recorded by the previous run.
+    Args:
+        site_dir (str): The website's snapshot directory.
+    Returns:
+        dict: A mapping of sitemap URL to {"lastmod", "parent", "ok"}.
+    """
+    try:
+        with open(os.path.join(site_dir, INDEX_FILE), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        ic(f"Error reading sitemap index in {site_dir}: {e}")
+        return {}
+
+
+def save_index(site_dir, index):
+    """
+    Atomically write the sitemap tree of this run.
+    Args:
+        site_dir (str): The website's snapshot directory.
+        index (dict): A mapping of sitemap URL to {"lastmod", "parent", "ok"}.
+    """
+    index_path = os.path.join(site_dir, INDEX_FILE)
+    with open(f"{index_path}.tmp", "w") as file:
+        json.dump(index, file)
+    os.replace(f"{index_path}.tmp", index_path)
+
+
+def with_descendants(index, roots):
+    """
+    Extend a set of sitemaps with every sitemap nested below them.
+    Args:
+        index (dict): A mapping of sitemap URL to {"lastmod", "parent", "ok"}.
+        roots (set): The sitemaps to start from.
+    Returns:
+        set: The roots plus all their descendants.
+    """
+    children = {}
+    for url, entry in index.items():
+        children.setdefault(entry.get("parent"), []).append(url)
+    found = set()
+    stack = list(roots)
+    while stack:
+        url = stack.pop()
+        if url not in found:
+            found.add(url)
+            stack.extend(children.get(url, []))
+    return found
+
+
+async def diff_site(results, base_url, snapshot_dir, user_agent, **expand_options):
+    """
+    Expand a website's sitemaps and stream the changes since the previous run.
+    Child sitemaps whose index-level <lastmod> is unchanged are not fetched, and
+    their URLs, like those of sitemaps that failed this time, are carried over from
+    the previous snapshot. The new inventory is externally sorted in chunks and
+    diffed against the old one with a streaming merge, so memory does not grow
+    with the number of URLs. The snapshot is replaced once the diff is complete.
+    Args:
+        results (list): Result dictionaries from the sitemap checks.
+        base_url (str): The base URL of the website.
+        snapshot_dir (str): The root directory for all snapshots.
+        user_agent (str): The user agent to use for the requests.
+        **expand_options: Extra keyword arguments forwarded to expand_reachable.
+    Yields:
+        dict: The changes produced by diff_snapshots.
+    """
+    site_dir = site_snapshot_dir(snapshot_dir, base_url)
+    os.makedirs(site_dir, exist_ok=True)
+    snapshot_path = os.path.join(site_dir, SNAPSHOT_FILE)
+    old_index = load_index(site_dir)
+    new_index = {
+        result["url"]: {"lastmod": None, "parent": None, "ok": True}
+        for result in results if result.get("reachable")
+    }
+    unchanged = set()
+    failed = set()
+
+    def should_follow(entry):
+        previous = old_index.get(entry["loc"])
+        new_index[entry["loc"]] = {"lastmod": entry["lastmod"], "parent": entry["parent"], "ok": True}
+        if previous and previous["ok"] and entry["lastmod"] and previous["lastmod"] == entry["lastmod"]:
+            unchanged.add(entry["loc"])
+            return False
+        return True
+
+    runs = []
+    buffer = []
+    try:
+        async for record in expand_reachable(
+            results, user_agent, should_follow=should_follow, **expand_options
+        ):
+            if "error" in record:
+                failed.add(record["sitemap"])
+                new_index.setdefault(record["sitemap"], {"lastmod": None, "parent": None})["ok"] = False
+                continue
+            buffer.append(format_line(record["loc"], record["lastmod"], record["sitemap"]))
+            if len(buffer) >= SORT_CHUNK_SIZE:
+                runs.append(write_sorted_run(buffer, site_dir))
+                buffer = []
+        if buffer:
+            runs.append(write_sorted_run(buffer, site_dir))
+        buffer = []
+
+        # Carry over the URLs of unchanged and failed sitemaps from the previous run
+        carried = with_descendants(old_index, unchanged | failed)
+        for url in carried - unchanged - failed:
+            new_index.setdefault(url, old_index[url])
+        carried_lines = (
+            line for line in read_lines(snapshot_path) if parse_line(line)[2] in carried
+        )
+        ic(f"Expanded {base_url}: {len(unchanged)} unchanged and {len(failed)} failed sitemaps carried over")
+
+        new_snapshot_path = f"{snapshot_path}.new"
+        with open(new_snapshot_path, "w", encoding="utf-8", newline="\n") as file:
+            file.writelines(merge_unique([read_lines(run) for run in runs] + [carried_lines]))
+
+        for change in diff_snapshots(read_lines(snapshot_path), read_lines(new_snapshot_path)):
+            yield change
+
+        os.replace(new_snapshot_path, snapshot_path)
+        save_index(site_dir, new_index)
+    finally:
+        for run in runs:
+            os.remove(run)
@@ -0,0 +1,277 @@
+import httpx
+import zlib
+import asyncio
+from xml.etree.ElementTree import XMLPullParser, ParseError
+from icecream import ic
+
+
+# Constants
+DEFAULT_EXPAND_CONCURRENCY = 8
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_TIMEOUT = 30
+OUTPUT_BUFFER_SIZE = 1000
+DEFAULT_MAX_DECOMPRESSED_BYTES = 100 * 1024 * 1024
+INFLATE_CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+# Only codings that inflate_stream decodes under the size limit are negotiated
+ACCEPT_ENCODING = "gzip, identity"
+# Every key of a URL record (or of a sitemap that failed to expand), e.g. for CSV columns
+URL_RECORD_FIELDS = ("loc", "lastmod", "sitemap", "error")
+
+
+class SitemapTooLargeError(Exception):
+    """Raised when a sitemap decompresses to more than the configured maximum size."""
+
+
+def local_name(tag):
+    """
+    Strip the XML namespace from an element tag.
+    Args:
+        tag (str): The tag, e.g. "{http://www.sitemaps.org/schemas/sitemap/0.9}url".
+    Returns:
+        str: The tag without its namespace, e.g. "url".
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def child_text(element, name):
+    """
+    Get the stripped text of the first child with the given local name.
+    Args:
+        element (Element): The parent element.
+        name (str): The local name of the child, e.g. "loc".
+    Returns:
+        str | None: The child's text, or None if there is no such child.
+    """
+    for child in element:
+        if local_name(child.tag) == name:
+            return (child.text or "").strip() or None
+    return None
+
+
+async def inflate_stream(chunks, max_output_bytes=DEFAULT_MAX_DECOMPRESSED_BYTES):
+    """
+    Transparently gunzip a byte stream chunk by chunk, passing plain data through.
+    The stream is sniffed for the gzip magic number, so both .xml.gz files and plain
+    XML work. Output is produced in bounded slices and counted, which stops zip bombs
+    before they are expanded in memory.
+    Args:
+        chunks (async iterable): The possibly gzip-compressed bytes.
+        max_output_bytes (int): The maximum number of bytes to produce.
+    Yields:
+        bytes: The decompressed data.
+    Raises:
+        SitemapTooLargeError: If the output would exceed max_output_bytes.
+    """
+    total = 0
+
+    def count(data):
+        nonlocal total
+        total += len(data)
+        if total > max_output_bytes:
+            raise SitemapTooLargeError(f"sitemap exceeds {max_output_bytes} decompressed bytes")
+        return data
+
+    iterator = chunks.__aiter__()
+    head = b""
+    async for chunk in iterator:
+        head += chunk
+        if len(head) >= len(GZIP_MAGIC):
+            break
+
+    if not head.startswith(GZIP_MAGIC):
+        if head:
+            yield count(head)
+        async for chunk in iterator:
+            yield count(chunk)
+        return
+
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    pending = head
+    while True:
+        while pending:
+            data = decompressor.decompress(pending, INFLATE_CHUNK_SIZE)
+            pending = decompressor.unconsumed_tail
+            if data:
+                yield count(data)
+            if decompressor.eof:
+                # Concatenated gzip members are decoded one after another
+                pending = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        try:
+            pending = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+
+    if data := decompressor.flush():
+        yield count(data)
+
+
+def iter_document(response, max_decompressed_bytes=DEFAULT_MAX_DECOMPRESSED_BYTES):
+    """
+    Get the decoded document bytes of a streamed sitemap response.
+    Content-Encoding gzip is undone by inflate_stream rather than by httpx, so the
+    size guard covers both transport compression and .xml.gz payloads. Other codings
+    would be inflated by httpx before the guard sees them, so they are refused; the
+    expander only sends ACCEPT_ENCODING.
+    Args:
+        response (httpx.Response): The streamed response.
+        max_decompressed_bytes (int): The maximum decompressed document size.
+    Returns:
+        async iterable: The document bytes, chunk by chunk.
+    Raises:
+        httpx.DecodingError: If the response uses another Content-Encoding.
+    """
+    encoding = response.headers.get("Content-Encoding", "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        chunks = inflate_stream(response.aiter_raw(), max_decompressed_bytes)
+    elif encoding in ("", "identity"):
+        chunks = response.aiter_raw()
+    else:
+        raise httpx.DecodingError(
+            f"unsupported Content-Encoding {encoding!r}, only gzip is decoded with a size limit",
+            request=response.request,
+        )
+    return inflate_stream(chunks, max_decompressed_bytes)
+
+
+async def parse_sitemap_stream(chunks):
+    """
+    Incrementally parse a sitemap or sitemapindex document.
+    Each <url> and <sitemap> entry is dropped from the tree as soon as it has been
+    read, so memory stays flat regardless of document size.
+    Args:
+        chunks (async iterable): The document bytes, chunk by chunk.
+    Yields:
+        tuple: ("url", record) for <url> entries and ("sitemap", record) for index
+            entries, where record is a dict with "loc" and "lastmod".
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    root = None
+
+    async for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+            kind = local_name(element.tag)
+            if kind not in ("url", "sitemap"):
+                continue
+            loc = child_text(element, "loc")
+            if loc:
+                yield kind, {"loc": loc, "lastmod": child_text(element, "lastmod")}
+            element.clear()
+            root.clear()
+
+    parser.close()
+
+
+async def expand_sitemaps(client, sitemap_urls, concurrency=DEFAULT_EXPAND_CONCURRENCY,
+                          max_depth=DEFAULT_MAX_DEPTH,
+                          max_decompressed_bytes=DEFAULT_MAX_DECOMPRESSED_BYTES,
+                          should_follow=None):
+    """
+    Recursively expand sitemaps and sitemap indexes into their URL records.
+    Child sitemaps listed in an index are fetched concurrently by a pool of workers.
+    Records are passed through a bounded buffer, so a slow consumer applies
+    backpressure instead of letting parsed records pile up in memory.
+    Args:
+        client (httpx.AsyncClient): The shared client to fetch sitemaps with.
+        sitemap_urls (iterable): The sitemap URLs to start from.
+        concurrency (int): The number of sitemaps fetched at once.
+        max_depth (int): How many levels of nested sitemap indexes to follow.
+        max_decompressed_bytes (int): The maximum decompressed size of a single sitemap.
+        should_follow (callable): Called with each index entry ({"loc", "lastmod",
+            "parent"}) within max_depth; the child sitemap is skipped if it returns
+            False, and is fetched otherwise (optional).
+    Yields:
+        dict: {"loc", "lastmod", "sitemap"} for every URL, or {"sitemap", "error"}
+            for a sitemap that could not be fetched or parsed.
+    """
+    pending = asyncio.Queue()
+    output = asyncio.Queue(maxsize=OUTPUT_BUFFER_SIZE)
+    seen = set()
+
+    def schedule(url, depth):
+        if url not in seen:
+            seen.add(url)
+            pending.put_nowait((url, depth))
+
+    async def expand_one(url, depth):
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            document = iter_document(response, max_decompressed_bytes)
+            async for kind, record in parse_sitemap_stream(document):
+                if kind == "url":
+                    record["sitemap"] = url
+                    await output.put(record)
+                elif depth >= max_depth:
+                    ic(f"Not following {record['loc']}: maximum depth {max_depth} reached")
+                elif should_follow is not None and not should_follow({**record, "parent": url}):
+                    ic(f"Skipping unchanged sitemap {record['loc']}")
+                else:
+                    schedule(record["loc"], depth + 1)
+
+    async def work():
+        while True:
+            url, depth = await pending.get()
+            try:
+                await expand_one(url, depth)
+                ic(f"Expanded {url}")
+            except (httpx.HTTPError, ParseError, zlib.error, SitemapTooLargeError) as e:
+                ic(f"Could not expand {url}: {e}")
+                await output.put({"sitemap": url, "error": str(e)})
+            except Exception as e:
+                # A dead worker would leave its URL unfinished and hang pending.join()
+                ic(f"Unexpected error expanding {url}: {e}")
+                await output.put({"sitemap": url, "error": str(e)})
+            finally:
+                pending.task_done()
+
+    async def finish():
+        await pending.join()
+        await output.put(None)
+
+    for url in sitemap_urls:
+        schedule(url, 0)
+
+    tasks = [asyncio.create_task(work()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(finish()))
+    try:
+        while (record := await output.get()) is not None:
+            yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def expand_reachable(results, user_agent, concurrency=DEFAULT_EXPAND_CONCURRENCY,
+                           max_depth=DEFAULT_MAX_DEPTH,
+                           max_decompressed_bytes=DEFAULT_MAX_DECOMPRESSED_BYTES,
+                           should_follow=None):
+    """
+    Expand every sitemap that check_sitemap reported as reachable.
+    Args:
+        results (list): Result dictionaries from check_sitemap or its async variants.
+        user_agent (str): The user agent to use for the requests.
+        concurrency (int): The number of sitemaps fetched at once.
+        max_depth (int): How many levels of nested sitemap indexes to follow.
+        max_decompressed_bytes (int): The maximum decompressed size of a single sitemap.
+        should_follow (callable): Filter for child sitemaps, see expand_sitemaps (optional).
+    Yields:
+        dict: The records produced by expand_sitemaps.
+    """
+    sitemap_urls = [result["url"] for result in results if result.get("reachable")]
+    headers = {"User-Agent": user_agent, "Accept-Encoding": ACCEPT_ENCODING}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        headers=headers, timeout=DEFAULT_TIMEOUT, limits=limits, follow_redirects=True
+    ) as client:
+        async for record in expand_sitemaps(
+            client, sitemap_urls, concurrency, max_depth, max_decompressed_bytes, should_follow
+        ):
+            yield record
@@ -0,0 +1,106 @@
+import os
+import json
+from icecream import ic
+
+
+# Constants
+PRIOR_WEIGHT = 2
+
+
+def load_stats(file_path):
+    """
+    Load per-path hit statistics from previous runs.
+    Args:
+        file_path (str): The path to the JSON stats file.
+    Returns:
+        dict: A mapping of sitemap path to {"checks": int, "hits": int}.
+    """
+    try:
+        with open(file_path, "r") as file:
+            stats = json.load(file)
+            ic(f"Loaded hit statistics for {len(stats)} sitemap paths from {file_path}")
+            return stats
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        ic(f"Error reading stats file {file_path}: {e}")
+        return {}
+
+
+def save_stats(file_path, stats):
+    """
+    Atomically write per-path hit statistics to disk.
+    Args:
+        file_path (str): The path to the JSON stats file.
+        stats (dict): The statistics returned by load_stats and updated by record_result.
+    """
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(stats, file, indent=2, sort_keys=True)
+    os.replace(temp_path, file_path)
+
+
+def record_result(stats, result):
+    """
+    Count a sitemap check towards the hit rate of its candidate path.
+    Checks that never got a response, and sitemaps declared as absolute URLs in
+    robots.txt, say nothing about the candidate list and are ignored.
+    Args:
+        stats (dict): The statistics to update in place.
+        result (dict): A result dictionary from check_sitemap_async.
+    """
+    path = result.get("path")
+    if not path or "status_code" not in result or path.startswith(("http://", "https://")):
+        return
+    entry = stats.setdefault(path, {"checks": 0, "hits": 0})
+    entry["checks"] += 1
+    entry["hits"] += int(bool(result["reachable"]))
+
+
+def fleet_hit_rate(stats):
+    """
+    Compute the hit rate over all recorded checks of all paths.
+    Args:
+        stats (dict): The statistics returned by load_stats.
+    Returns:
+        float: The overall hit rate, or 0.0 if nothing has been recorded.
+    """
+    total_checks = sum(entry["checks"] for entry in stats.values())
+    total_hits = sum(entry["hits"] for entry in stats.values())
+    return total_hits / total_checks if total_checks else 0.0
+
+
+def hit_probability(stats, path, prior=None):
+    """
+    Estimate the probability that a sitemap path is reachable on a new site.
+    The observed hit rate is smoothed towards the fleet-wide hit rate, so paths
+    with few checks are neither trusted blindly nor pushed to the back.
+    Args:
+        stats (dict): The statistics returned by load_stats.
+        path (str): The sitemap path.
+        prior (float): The fleet-wide hit rate, computed from stats if not given.
+    Returns:
+        float: The smoothed hit probability.
+    """
+    if prior is None:
+        prior = fleet_hit_rate(stats)
+    entry = stats.get(path, {"checks": 0, "hits": 0})
+    return (entry["hits"] + PRIOR_WEIGHT * prior) / (entry["checks"] + PRIOR_WEIGHT)
+
+
+def order_by_hit_rate(paths, stats):
+    """
+    Order candidate paths by descending hit probability, dropping duplicates.
+    Paths with equal probability keep their file order.
+    Args:
+        paths (list): The candidate sitemap paths in file order.
+        stats (dict): The statistics returned by load_stats.
+    Returns:
+        list: The unique paths, most likely hit first.
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    if not stats:
+        return unique_paths
+    prior = fleet_hit_rate(stats)
+    probabilities = {path: hit_probability(stats, path, prior) for path in unique_paths}
+    return sorted(unique_paths, key=lambda path: -probabilities[path])
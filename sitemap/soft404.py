@@ -0,0 +1,220 @@
+import re
+import uuid
+import httpx
+import asyncio
+import hashlib
+from collections import OrderedDict
+from contextlib import nullcontext
+from urllib.parse import quote, urlsplit
+from icecream import ic
+
+
+# Constants
+DEFAULT_PREFIX_BYTES = 4 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+VOLATILE_HEADERS = {
+    "age", "cf-ray", "content-length", "date", "etag", "expires", "last-modified",
+    "report-to", "server-timing", "set-cookie", "x-cache", "x-request-id", "x-served-by",
+    "x-timer", "x-trace-id",
+}
+NUMBERS = re.compile(rb"\d+")
+WORDS = re.compile(rb"\w+")
+# Share of words a page must have in common with the baseline to count as the same page
+DEFAULT_SIMILARITY = 0.8
+# Baselines are kept for this many origins, the least recently used are dropped
+DEFAULT_MAX_BASELINES = 1024
+
+
+def sniff_content_kind(prefix, content_type=None):
+    """
+    Classify a response body from its first bytes.
+    Args:
+        prefix (bytes): The first bytes of the body.
+        content_type (str): The Content-Type header, used when the bytes are inconclusive.
+    Returns:
+        str: "gzip", "xml", "html" or "text".
+    """
+    if prefix.startswith(GZIP_MAGIC):
+        return "gzip"
+    head = prefix.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if head.startswith(b"<!doctype html") or head.startswith(b"<html") or b"<html" in head[:512]:
+        return "html"
+    if head.startswith(b"<?xml") or head.startswith(b"<urlset") or head.startswith(b"<sitemapindex"):
+        return "xml"
+    content_type = (content_type or "").lower()
+    if "html" in content_type:
+        return "html"
+    if "xml" in content_type:
+        return "xml"
+    if "gzip" in content_type:
+        return "gzip"
+    return "text"
+
+
+def normalize_body(response, prefix):
+    """
+    Blank out the requested path and all numbers from a body prefix, because error
+    pages commonly echo the URL, timestamps or request IDs.
+    Args:
+        response (httpx.Response): The response.
+        prefix (bytes): The first bytes of the body.
+    Returns:
+        bytes: The normalized body.
+    """
+    path = response.request.url.path
+    body = prefix
+    for variant in {path, quote(path), path.lstrip("/")}:
+        if variant:
+            body = body.replace(variant.encode("utf-8", "ignore"), b"")
+    return NUMBERS.sub(b"0", body)
+
+
+def similarity(body, other):
+    """
+    Compare two normalized bodies by the words they have in common.
+    Args:
+        body (bytes): A normalized body.
+        other (bytes): Another normalized body.
+    Returns:
+        float: The Jaccard similarity of their word sets, from 0 to 1.
+    """
+    words = set(WORDS.findall(body))
+    other_words = set(WORDS.findall(other))
+    if not words and not other_words:
+        return 1.0
+    return len(words & other_words) / len(words | other_words)
+
+
+def fingerprint(response, prefix):
+    """
+    Hash the parts of a response that stay the same across a site's "not found" pages.
+    Args:
+        response (httpx.Response): The response.
+        prefix (bytes): The first bytes of the body.
+    Returns:
+        str: A hex digest of the status, stable header names, content type and normalized body.
+    """
+    body = normalize_body(response, prefix)
+    header_names = sorted(
+        name for name in (key.lower() for key in response.headers.keys())
+        if name not in VOLATILE_HEADERS
+    )
+    digest = hashlib.sha256()
+    digest.update(str(response.status_code).encode())
+    digest.update(response.headers.get("Content-Type", "").split(";")[0].strip().lower().encode())
+    digest.update(",".join(header_names).encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def read_prefix(client, url, max_bytes=DEFAULT_PREFIX_BYTES, headers=None):
+    """
+    GET a URL but read only the first bytes of the body, then close the stream.
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to fetch.
+        max_bytes (int): The maximum number of body bytes to read.
+        headers (dict): Extra request headers (optional).
+    Returns:
+        tuple: (httpx.Response, bytes) with the closed response and the body prefix.
+    """
+    prefix = b""
+    async with client.stream("GET", url, headers=headers) as response:
+        async for chunk in response.aiter_bytes():
+            prefix += chunk
+            if len(prefix) >= max_bytes:
+                break
+    return response, prefix[:max_bytes]
+
+
+class Soft404Detector:
+    """
+    Detects "soft 404s": servers answering 200 with an error page for any path.
+    Requests one random, nonexistent path per origin, remembers its fingerprint,
+    and compares every candidate's partial read against that baseline. Baselines
+    are kept for a bounded number of recently probed origins.
+    """
+
+    def __init__(self, prefix_bytes=DEFAULT_PREFIX_BYTES, min_similarity=DEFAULT_SIMILARITY,
+                 max_baselines=DEFAULT_MAX_BASELINES):
+        """
+        Args:
+            prefix_bytes (int): How many body bytes to read per response.
+            min_similarity (float): The word similarity to the baseline from which a
+                page counts as the not-found page.
+            max_baselines (int): The number of origins to keep baselines for.
+        """
+        self.prefix_bytes = prefix_bytes
+        self.min_similarity = min_similarity
+        self.max_baselines = max(1, max_baselines)
+        self.baselines = OrderedDict()
+
+    async def _fetch_baseline(self, client, origin, semaphore=None):
+        url = f"{origin}/{uuid.uuid4().hex}.xml"
+        try:
+            async with semaphore or nullcontext():
+                response, prefix = await read_prefix(client, url, self.prefix_bytes)
+        except httpx.HTTPError as e:
+            ic(f"Could not fetch soft-404 baseline {url}: {e}")
+            return None
+        baseline = {
+            "status_code": response.status_code,
+            "content_kind": sniff_content_kind(prefix, response.headers.get("Content-Type")),
+            "fingerprint": fingerprint(response, prefix),
+            "body": normalize_body(response, prefix),
+        }
+        ic(f"Soft-404 baseline for {origin}: {baseline['status_code']} {baseline['content_kind']}")
+        return baseline
+
+    async def baseline(self, client, url, semaphore=None):
+        """
+        Get the baseline of the URL's origin, fetching it once per origin.
+        Args:
+            client (httpx.AsyncClient): The client to send the request with.
+            url (str): Any URL on the origin.
+            semaphore (asyncio.Semaphore): The limit the baseline request counts against,
+                e.g. the per-host semaphore of the probes (optional).
+        Returns:
+            dict | None: {"status_code", "content_kind", "fingerprint", "body"}, or None on error.
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin in self.baselines:
+            self.baselines.move_to_end(origin)
+        else:
+            self.baselines[origin] = asyncio.ensure_future(self._fetch_baseline(client, origin, semaphore))
+            if len(self.baselines) > self.max_baselines:
+                # Requests still waiting for the dropped baseline keep their own reference
+                self.baselines.popitem(last=False)
+        return await self.baselines[origin]
+
+    async def classify(self, client, response, prefix, result, semaphore=None):
+        """
+        Add "content_kind" and "soft_404" to a probe result.
+        A 200 response is a soft 404 if the origin also answers 200 for a random path
+        and the candidate matches that baseline's fingerprint, or is an HTML/text page
+        of the same kind whose words are at least min_similarity alike. The content
+        kind alone never decides it, so e.g. a real text sitemap on a site whose
+        not-found page is text stays reachable. Soft 404s are reported as not reachable.
+        Args:
+            client (httpx.AsyncClient): The client to fetch the baseline with.
+            response (httpx.Response): The candidate's response.
+            prefix (bytes): The first bytes of the candidate's body.
+            result (dict): The result dictionary to update in place.
+            semaphore (asyncio.Semaphore): The limit the baseline request counts against (optional).
+        """
+        kind = sniff_content_kind(prefix, response.headers.get("Content-Type"))
+        result["content_kind"] = kind
+        result["soft_404"] = False
+        if response.status_code != 200:
+            return
+
+        baseline = await self.baseline(client, str(response.request.url), semaphore)
+        if baseline is None or baseline["status_code"] != 200:
+            return
+        same_page = baseline["fingerprint"] == fingerprint(response, prefix)
+        if not same_page and kind in ("html", "text") and baseline["content_kind"] == kind:
+            same_page = similarity(baseline["body"], normalize_body(response, prefix)) >= self.min_similarity
+        if same_page:
+            result["soft_404"] = True
+            result["reachable"] = False
@@ -0,0 +1,106 @@
+import math
+import hashlib
+from icecream import ic
+
+
+# Constants
+DEFAULT_DEDUP_CAPACITY = 10_000_000
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter for URL deduplication.
+    Uses one bit array sized for the expected capacity and false-positive rate, and
+    derives all bit positions from a single 128-bit BLAKE2b hash (double hashing).
+    Memory is constant: about 1.8 bytes per URL at a 0.1% false-positive rate.
+    """
+
+    def __init__(self, capacity=DEFAULT_DEDUP_CAPACITY, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """
+        Size the filter for an expected number of distinct URLs.
+        Args:
+            capacity (int): The expected number of distinct URLs.
+            false_positive_rate (float): The accepted chance of dropping an unseen URL,
+                strictly between 0 and 1.
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        self.capacity = max(1, capacity)
+        self.false_positive_rate = false_positive_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self.warned = False
+
+    @property
+    def memory_bytes(self):
+        """
+        The size of the bit array in bytes.
+        """
+        return len(self.bits)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def add(self, item):
+        """
+        Add an item to the filter.
+        Args:
+            item (str): The item, e.g. a URL.
+        Returns:
+            bool: True if the item was new, False if it was (probably) seen before.
+        """
+        new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+            if self.count > self.capacity and not self.warned:
+                ic(f"Dedup filter exceeded its capacity of {self.capacity} URLs, "
+                   f"false positives will rise above {self.false_positive_rate}")
+                self.warned = True
+        return new
+
+    def describe(self):
+        """
+        Summarise the filter's size and load.
+        Returns:
+            dict: Capacity, configured false-positive rate, hash count, memory and URL count.
+        """
+        return {
+            "capacity": self.capacity,
+            "false_positive_rate": self.false_positive_rate,
+            "num_hashes": self.num_hashes,
+            "memory_bytes": self.memory_bytes,
+            "unique_urls": self.count,
+        }
+
+
+async def dedup_records(records, seen):
+    """
+    Drop URL records whose loc has already been seen.
+    Error records are passed through untouched.
+    Args:
+        records (async iterable): Records produced by expand_sitemaps.
+        seen (BloomFilter): The filter tracking seen URLs.
+    Yields:
+        dict: The records with a loc that was not seen before.
+    """
+    duplicates = 0
+    async for record in records:
+        if "loc" not in record or seen.add(record["loc"]):
+            yield record
+        else:
+            duplicates += 1
+    ic(f"Dropped {duplicates} duplicate URLs", seen.describe())
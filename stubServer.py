@@ -0,0 +1,128 @@
+import gzip
+import time
+import zlib
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from icecream import ic
+
+
+# Constants
+DEFAULT_PORT = 8080
+DEFAULT_BODY_SIZE = 16 * 1024
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every GET with a fixed-size body after a configurable delay, and fails
+    a configurable share of requests with 503, so the tools can be run offline.
+    With compression enabled the body is sent gzip- or deflate-encoded when the
+    client's Accept-Encoding allows it.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one write
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    delay = 0.0
+    jitter = 0.0
+    body = b""
+    error_rate = 0.0
+    # Precompressed bodies by content coding
+    encoded_bodies = {}
+
+    def negotiate_encoding(self):
+        for coding in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = coding.strip().partition(";")
+            if name.strip() in self.encoded_bodies and params.replace(" ", "") not in ("q=0", "q=0.0"):
+                return name.strip()
+        return None
+
+    def do_GET(self):
+        time.sleep(max(0.0, self.delay + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        if encoding := self.negotiate_encoding():
+            body = self.encoded_bodies[encoding]
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host="127.0.0.1", port=DEFAULT_PORT, delay=0.0, jitter=0.0, body_size=DEFAULT_BODY_SIZE,
+                  error_rate=0.0, compress=False):
+    """
+    Create a threaded stub HTTP server.
+    Args:
+        host (str): The address to bind to.
+        port (int): The port to bind to; 0 picks a free port.
+        delay (float): Seconds to wait before answering.
+        jitter (float): Maximum seconds added to or removed from the delay.
+        body_size (int): The size of every response body in bytes.
+        error_rate (float): The share of requests answered with 503.
+        compress (bool): Whether to honour Accept-Encoding gzip and deflate.
+    Returns:
+        ThreadingHTTPServer: The server; call serve_forever() to run it.
+    """
+    body = b"x" * body_size
+    encoded_bodies = {"gzip": gzip.compress(body), "deflate": zlib.compress(body)} if compress else {}
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "delay": delay,
+        "jitter": jitter,
+        "body": body,
+        "error_rate": error_rate,
+        "encoded_bodies": encoded_bodies,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    """
+    Main function to handle command-line arguments and run the stub server.
+    """
+    parser = argparse.ArgumentParser(description="Run a local stub HTTP server to test the tools against.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to bind to (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to bind to (default: {DEFAULT_PORT}).")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering (default: 0).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds added to the delay (default: 0).")
+    parser.add_argument(
+        "--body-size",
+        type=int,
+        default=DEFAULT_BODY_SIZE,
+        help=f"Response body size in bytes (default: {DEFAULT_BODY_SIZE})."
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503 (default: 0).")
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Send the body gzip- or deflate-encoded when the client accepts it."
+    )
+    args = parser.parse_args()
+
+    server = create_server(
+        args.host, args.port, args.delay, args.jitter, args.body_size, args.error_rate, args.compress
+    )
+    ic(f"Stub server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StubSite:
+    """
+    A local website whose responses the tests set per path.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.url = f"http://127.0.0.1:{server.server_port}"
+        self.routes = {}
+        self.requests = []
+        self.delays = {}
+        # The response to paths without a route
+        self.fallback = (404, {}, b"not found")
+
+    def add(self, path, body=b"", status=200, headers=None, delay=0.0):
+        """
+        Serve a response for a path.
+        Args:
+            path (str): The request path, e.g. "/robots.txt".
+            body (bytes | str): The response body.
+            status (int): The response status.
+            headers (dict): Extra response headers (optional).
+            delay (float): Seconds to wait before responding.
+        """
+        body = body.encode() if isinstance(body, str) else body
+        self.routes[path] = (status, headers or {}, body)
+        self.delays[path] = delay
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def respond(self, send_body):
+            site.requests.append((self.command, self.path))
+            time.sleep(site.delays.get(self.path, 0.0))
+            status, headers, body = site.routes.get(self.path, site.fallback)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self.respond(True)
+
+        def do_HEAD(self):
+            self.respond(False)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+    stub = StubSite(server)
+    server.RequestHandlerClass = make_handler(stub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Start stubServer.create_server servers on free ports; returns a function that
+    takes create_server's options and gives the base URL.
+    """
+    from stubServer import create_server
+
+    servers = []
+
+    def start(**options):
+        server = create_server(port=0, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import httpx
+
+from checkForSitemap import check_paths_in_order, discover_sitemaps_async, probe_sites
+
+URLSET = '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"></urlset>'
+
+
+def test_discovery_follows_a_redirected_robots_txt(site):
+    site.add("/robots.txt", status=301, headers={"Location": f"{site.url}/live/robots.txt"})
+    site.add("/live/robots.txt", f"User-agent: *\nSitemap: {site.url}/declared.xml\n")
+    site.add("/declared.xml", URLSET, headers={"Content-Type": "application/xml"})
+
+    results = asyncio.run(discover_sitemaps_async(site.url, ["/sitemap.xml", "/sitemap_index.xml"], "test"))
+
+    assert [(result["url"], result["source"], result["reachable"]) for result in results] == [
+        (f"{site.url}/declared.xml", "robots.txt", True)
+    ]
+    # The declared sitemap worked, so no candidate was probed
+    assert not any(path.startswith("/sitemap") for _, path in site.requests)
+
+
+def test_stop_after_drops_checks_finishing_together():
+    async def handler(request):
+        return httpx.Response(200, headers={"Content-Type": "application/xml"}, text=URLSET)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await check_paths_in_order(
+                client, "https://example.com", ["/a.xml", "/b.xml", "/c.xml"], stop_after=1
+            )
+
+    results = asyncio.run(run())
+
+    assert [result["path"] for result in results] == ["/a.xml"]
+
+
+def test_batch_stop_after_cancels_checks_in_flight(site):
+    site.add("/sitemap.xml", URLSET, headers={"Content-Type": "application/xml"})
+    site.add("/slow.xml", URLSET, headers={"Content-Type": "application/xml"}, delay=1.0)
+
+    async def run():
+        return [result async for result in probe_sites(
+            [site.url], ["/slow.xml", "/sitemap.xml"], "test", concurrency=2, per_host_limit=2,
+            stop_after=1
+        )]
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+
+    assert [result["url"] for result in results] == [f"{site.url}/sitemap.xml"]
+    assert time.monotonic() - started < 1.0
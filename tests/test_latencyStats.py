@@ -0,0 +1,107 @@
+import random
+import statistics
+
+import pytest
+
+from latencyStats import HdrHistogram, mann_whitney
+
+
+def histogram_of(values, **settings):
+    histogram = HdrHistogram(**settings)
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def test_percentiles_within_precision():
+    values = [random.Random(seed).uniform(0.001, 2.0) for seed in range(5000)]
+    histogram = histogram_of(values)
+    ordered = sorted(values)
+    for percent, rank in ((1, 50), (50, 2500), (90, 4500), (99, 4950), (99.9, 4995)):
+        assert histogram.percentile(percent) == pytest.approx(ordered[rank - 1], rel=1e-3)
+    assert histogram.percentile(0) == pytest.approx(ordered[0], rel=1e-3)
+    assert histogram.percentile(100) == pytest.approx(ordered[-1], abs=1e-6)
+    assert histogram.mean == pytest.approx(statistics.fmean(values), abs=1e-6)
+
+
+def test_tail_percentile_rank_is_exact():
+    # p99.9 of 100000 values is the 99900th; a float rank of 99901 would pick the slow bucket
+    histogram = HdrHistogram()
+    histogram.record(0.001, count=99900)
+    histogram.record(1.0, count=100)
+    assert histogram.percentile(99.9) == pytest.approx(0.001, rel=1e-3)
+    assert histogram.percentile(99.91) == pytest.approx(1.0, rel=1e-3)
+
+
+def test_empty_histogram():
+    histogram = HdrHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.mean is None
+    assert histogram.stddev() is None
+    assert histogram.summary()["count"] == 0
+
+
+def test_stddev():
+    assert histogram_of([0.123457] * 10).stddev() == 0.0
+    values = [random.Random(seed).gauss(1.0, 0.1) for seed in range(2000)]
+    assert histogram_of(values).stddev() == pytest.approx(statistics.pstdev(values), rel=1e-2)
+
+
+def test_values_above_the_range_are_clamped():
+    histogram = HdrHistogram(highest=1000, unit=1)
+    histogram.record(5000)
+    assert histogram.clamped == 1
+    assert histogram.percentile(100) == 1000
+
+
+def test_merge_equals_recording_everything():
+    first = [random.Random(seed).uniform(0.01, 1.0) for seed in range(500)]
+    second = [random.Random(seed).uniform(0.5, 3.0) for seed in range(500, 1000)]
+    merged = histogram_of(first)
+    merged.merge(histogram_of(second))
+    combined = histogram_of(first + second)
+    assert list(merged.nonzero()) == list(combined.nonzero())
+    assert merged.summary() == combined.summary()
+
+
+def test_merge_rejects_other_settings():
+    with pytest.raises(ValueError):
+        HdrHistogram().merge(HdrHistogram(significant_figures=2))
+
+
+@pytest.mark.parametrize("values", [[], [0.5], [0.0001, 0.002, 0.002, 1.5, 3599.0]])
+def test_serialization_round_trip(values):
+    histogram = histogram_of(values, highest=3600 * 1000, significant_figures=2, unit=1e-3)
+    for restored in (HdrHistogram.from_bytes(histogram.to_bytes()), HdrHistogram.from_text(histogram.to_text())):
+        assert list(restored.nonzero()) == list(histogram.nonzero())
+        assert restored.summary() == histogram.summary()
+        assert (restored.highest, restored.significant_figures, restored.unit) == (3600 * 1000, 2, 1e-3)
+
+
+def test_mann_whitney_u_matches_pairwise_count():
+    baseline_values = [0.010, 0.020, 0.020, 0.030]
+    current_values = [0.020, 0.040, 0.050]
+    u, _ = mann_whitney(histogram_of(baseline_values), histogram_of(current_values))
+    expected = sum(
+        1.0 if c > b else 0.5 if c == b else 0.0 for c in current_values for b in baseline_values
+    )
+    assert u == expected
+
+
+def test_mann_whitney_detects_a_slowdown():
+    rng = random.Random(7)
+    baseline = histogram_of(rng.gauss(0.100, 0.010) for _ in range(200))
+    same = histogram_of(rng.gauss(0.100, 0.010) for _ in range(200))
+    slower = histogram_of(rng.gauss(0.120, 0.010) for _ in range(200))
+    assert mann_whitney(baseline, slower)[1] < 1e-6
+    assert mann_whitney(baseline, same)[1] > 0.01
+    # One-sided: a speed-up is not a regression
+    assert mann_whitney(slower, baseline)[1] > 0.99
+
+
+def test_mann_whitney_edge_cases():
+    assert mann_whitney(HdrHistogram(), histogram_of([0.1])) == (None, None)
+    # All values tied: no evidence either way
+    assert mann_whitney(histogram_of([0.1] * 5), histogram_of([0.1] * 5))[1] == 1.0
+    with pytest.raises(ValueError):
+        mann_whitney(histogram_of([0.1]), histogram_of([0.1], significant_figures=2))
@@ -0,0 +1,46 @@
+import asyncio
+
+from loadGenerator import run_load
+
+
+def run_steps(url, **load_options):
+    async def collect():
+        return [step async for step in run_load(url, {"User-Agent": "test"}, **load_options)]
+    return asyncio.run(collect())
+
+
+def test_fixed_concurrency_counts_only_in_window_completions(stub_server):
+    url = stub_server(delay=0.3, body_size=100)
+    [step] = run_steps(url, concurrency_steps=[2], duration=1.0, ramp_up=0.0)
+
+    # Each worker completes at about 0.3, 0.6 and 0.9 s; the requests still in
+    # flight at 1.0 s complete after the window and are not counted
+    assert step["requests"] == 6
+    assert step["throughput_rps"] == 6.0
+    assert step["errors"] == 0
+    assert step["error_rate"] == 0.0
+    assert step["status_codes"] == {200: 6}
+    assert step["bytes"] == 600
+    assert step["peak_in_flight"] == 2
+
+
+def test_rate_step_counts_only_in_window_completions(stub_server):
+    url = stub_server(delay=0.25, body_size=100)
+    [step] = run_steps(url, rate_steps=[10], duration=1.0, ramp_up=0.0, max_in_flight=5)
+
+    # Requests start every 0.1 s; the ones started at 0.8 and 0.9 s complete after the window
+    assert step["target_rps"] == 10
+    assert step["requests"] == 8
+    assert step["throughput_rps"] == 8.0
+    assert step["error_rate"] == 0.0
+    assert step["peak_in_flight"] <= 5
+
+
+def test_failed_responses_count_as_errors(stub_server):
+    url = stub_server(error_rate=1.0)
+    [step] = run_steps(url, rate_steps=[20], duration=0.5, ramp_up=0.0)
+
+    assert step["requests"] == 10
+    assert step["errors"] == 10
+    assert step["error_rate"] == 1.0
+    assert step["status_codes"] == {503: 10}
@@ -0,0 +1,21 @@
+import re
+
+from metricsExporter import MetricsRegistry
+
+
+def bucket_bounds(text):
+    return re.findall(r'probe_duration_seconds_bucket\{tool="robots",le="([^"]+)"\}', text)
+
+
+def test_bucket_bounds_are_canonical_floats_in_both_formats():
+    registry = MetricsRegistry(buckets=(0.25, 1, 10))
+    registry.observe("probe_duration_seconds", (("tool", "robots"),), 0.5)
+    registry.observe("probe_duration_seconds", (("tool", "robots"),), 20)
+
+    prometheus = registry.render()
+    openmetrics = registry.render(openmetrics=True)
+
+    assert bucket_bounds(prometheus) == ["0.25", "1.0", "10.0", "+Inf"]
+    assert bucket_bounds(openmetrics) == bucket_bounds(prometheus)
+    assert 'probe_duration_seconds_bucket{tool="robots",le="1.0"} 1' in prometheus
+    assert 'probe_duration_seconds_bucket{tool="robots",le="+Inf"} 2' in openmetrics
@@ -0,0 +1,19 @@
+import csv
+
+from outputSinks import open_sink
+
+
+def test_csv_sink_drops_values_without_a_column(tmp_path):
+    path = tmp_path / "results.csv"
+    with open_sink(str(path), fields=["url", "status"]) as sink:
+        sink.write({"url": "https://a.example/", "status": 200})
+        sink.write({"url": "https://b.example/", "status": None, "error": "timed out"})
+        sink.write({"url": "https://c.example/", "status": 404, "error": "not found"})
+
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["url"] for row in rows] == [
+        "https://a.example/", "https://b.example/", "https://c.example/"
+    ]
+    assert [row["status"] for row in rows] == ["200", "", "404"]
+    assert all(set(row) == {"url", "status"} for row in rows)
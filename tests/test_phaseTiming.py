@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from phaseTiming import PhaseTrace, create_timed_async_client, create_timed_client
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request itself and records the request targets, like a forward proxy would see them.
+    """
+
+    protocol_version = "HTTP/1.1"
+    targets = []
+
+    def do_GET(self):
+        self.targets.append(self.path)
+        body = b"proxied"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def proxy_url(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProxyHandler)
+    ProxyHandler.targets = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.lower(), raising=False)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_timed_client_uses_environment_proxy(proxy_url, monkeypatch):
+    monkeypatch.setenv("HTTP_PROXY", proxy_url)
+    with create_timed_client() as client, PhaseTrace() as trace:
+        response = client.get("http://example.invalid/page", extensions={"trace": trace})
+
+    assert response.text == "proxied"
+    assert ProxyHandler.targets == ["http://example.invalid/page"]
+    assert trace.results()["hops"][0]["status_code"] == 200
+
+
+def test_timed_client_skips_no_proxy_hosts(proxy_url, monkeypatch):
+    monkeypatch.setenv("HTTP_PROXY", "http://127.0.0.1:9")
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    with create_timed_client() as client:
+        response = client.get(f"{proxy_url}/direct")
+
+    assert response.text == "proxied"
+    assert ProxyHandler.targets == ["/direct"]
+
+
+def test_timed_client_ignores_environment_proxy_without_trust_env(proxy_url, monkeypatch):
+    monkeypatch.setenv("HTTP_PROXY", "http://127.0.0.1:9")
+    with create_timed_client(trust_env=False) as client:
+        response = client.get(f"{proxy_url}/direct")
+
+    assert response.text == "proxied"
+    assert ProxyHandler.targets == ["/direct"]
+
+
+def test_timed_client_times_name_resolution(proxy_url):
+    url = proxy_url.replace("127.0.0.1", "localhost")
+    with create_timed_client() as client, PhaseTrace() as trace:
+        client.get(f"{url}/first", extensions={"trace": trace})
+        client.get(f"{url}/second", extensions={"trace": trace})
+
+    first, second = trace.results()["hops"]
+    assert first["timings"]["dns"] is not None
+    assert first["timings"]["connect"] is not None
+    # The second request reuses the connection, so it does no lookup or connect
+    assert second["connection_reused"]
+    assert second["timings"]["dns"] is None
+    assert second["timings"]["connect"] is None
+
+
+def test_timed_async_client_times_name_resolution(proxy_url):
+    async def fetch():
+        async with create_timed_async_client() as client:
+            with PhaseTrace() as trace:
+                response = await client.get(proxy_url.replace("127.0.0.1", "localhost"),
+                                            extensions={"trace": trace.atrace})
+        return response, trace.results()
+
+    response, results = asyncio.run(fetch())
+    assert response.status_code == 200
+    assert results["hops"][0]["timings"]["dns"] is not None
@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+from robotsCheck import fetch_robots_txt, fetch_robots_txt_async, is_fetch_error, same_site_redirect
+
+
+def redirect(url, location, status=301):
+    return httpx.Response(status, headers={"Location": location}, request=httpx.Request("GET", url))
+
+
+@pytest.mark.parametrize("url, location, expected", [
+    ("http://example.com/robots.txt", "https://example.com/robots.txt", "https://example.com/robots.txt"),
+    ("https://example.com/robots.txt", "https://www.example.com/robots.txt", "https://www.example.com/robots.txt"),
+    ("https://www.example.com/robots.txt", "/robots-live.txt", "https://www.example.com/robots-live.txt"),
+    ("https://example.com/robots.txt", "https://other.example.net/robots.txt", None),
+    ("https://example.com/robots.txt", "ftp://example.com/robots.txt", None),
+])
+def test_same_site_redirect(url, location, expected):
+    target = same_site_redirect(redirect(url, location))
+    assert (str(target) if target is not None else None) == expected
+
+
+def test_not_a_redirect():
+    response = httpx.Response(200, request=httpx.Request("GET", "https://example.com/robots.txt"))
+    assert same_site_redirect(response) is None
+
+
+def test_moved_robots_txt_is_followed(site):
+    site.add("/robots.txt", status=301, headers={"Location": f"{site.url}/live/robots.txt"})
+    site.add("/live/robots.txt", "Sitemap: https://example.com/sitemap.xml\n")
+
+    async def fetch():
+        async with httpx.AsyncClient() as client:
+            return await fetch_robots_txt_async(client, site.url)
+
+    assert asyncio.run(fetch()) == "Sitemap: https://example.com/sitemap.xml\n"
+    assert fetch_robots_txt(site.url) == "Sitemap: https://example.com/sitemap.xml\n"
+
+
+def test_redirect_to_another_site_is_not_followed(site):
+    other = site.url.replace("127.0.0.1", "localhost")
+    site.add("/robots.txt", status=301, headers={"Location": f"{other}/robots.txt"})
+
+    async def fetch():
+        async with httpx.AsyncClient() as client:
+            return await fetch_robots_txt_async(client, site.url)
+
+    assert is_fetch_error(asyncio.run(fetch()))
+    assert site.requests == [("GET", "/robots.txt")]
+
+
+def test_redirect_loop_stops(site):
+    site.add("/robots.txt", status=302, headers={"Location": "/robots.txt"})
+    assert is_fetch_error(fetch_robots_txt(site.url))
+    assert len(site.requests) == 6
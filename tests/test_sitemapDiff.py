@@ -0,0 +1,50 @@
+import gzip
+import asyncio
+
+from sitemapDiff import diff_site
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def sitemap_index(site, children):
+    entries = "".join(
+        f"<sitemap><loc>{site.url}{path}</loc><lastmod>{lastmod}</lastmod></sitemap>"
+        for path, lastmod in children.items()
+    )
+    return f'<?xml version="1.0"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'
+
+
+def gzipped_urlset(*locs):
+    entries = "".join(f"<url><loc>{loc}</loc></url>" for loc in locs)
+    return gzip.compress(f'<?xml version="1.0"?><urlset xmlns="{SITEMAP_NS}">{entries}</urlset>'.encode())
+
+
+def run_diff(site, snapshot_dir):
+    async def collect():
+        results = [{"url": f"{site.url}/sitemap.xml", "reachable": True}]
+        return [change async for change in diff_site(results, site.url, snapshot_dir, "test")]
+    return asyncio.run(collect())
+
+
+def test_url_listed_in_an_unchanged_sitemap_is_not_removed(site, tmp_path):
+    shared = "https://example.com/shared"
+    site.add("/sitemap.xml", sitemap_index(site, {"/a.xml.gz": "2024-01-01", "/b.xml.gz": "2024-01-01"}))
+    site.add("/a.xml.gz", gzipped_urlset(shared, "https://example.com/a"))
+    site.add("/b.xml.gz", gzipped_urlset(shared, "https://example.com/b"))
+    first = run_diff(site, tmp_path)
+    assert sorted(change["loc"] for change in first) == [
+        "https://example.com/a", "https://example.com/b", shared
+    ]
+    assert {change["change"] for change in first} == {"added"}
+
+    # a.xml.gz changes and drops the shared URL; b.xml.gz is unchanged and not fetched again
+    site.add("/sitemap.xml", sitemap_index(site, {"/a.xml.gz": "2024-02-01", "/b.xml.gz": "2024-01-01"}))
+    site.add("/a.xml.gz", gzipped_urlset("https://example.com/a"))
+    site.requests.clear()
+    assert run_diff(site, tmp_path) == []
+    assert ("GET", "/b.xml.gz") not in site.requests
+
+    # Once b.xml.gz drops it too, the URL is gone
+    site.add("/sitemap.xml", sitemap_index(site, {"/a.xml.gz": "2024-02-01", "/b.xml.gz": "2024-03-01"}))
+    site.add("/b.xml.gz", gzipped_urlset("https://example.com/b"))
+    assert [(change["change"], change["loc"]) for change in run_diff(site, tmp_path)] == [("removed", shared)]
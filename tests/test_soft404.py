@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+
+from soft404 import Soft404Detector, read_prefix
+
+NOT_FOUND_PAGE = "<html><body><h1>Sorry, we could not find that page</h1><p>Try the search {}</p></body></html>"
+
+
+def classify(detector, url):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            response, prefix = await read_prefix(client, url)
+            result = {"url": url, "reachable": True}
+            await detector.classify(client, response, prefix, result)
+            return result
+    return asyncio.run(run())
+
+
+def test_not_found_page_answered_with_200_is_a_soft_404(site):
+    site.fallback = (200, {"Content-Type": "text/html"}, NOT_FOUND_PAGE.format("box").encode())
+    result = classify(Soft404Detector(), f"{site.url}/sitemap.xml")
+    assert result["soft_404"]
+    assert not result["reachable"]
+
+
+def test_similar_not_found_page_is_a_soft_404(site):
+    site.fallback = (200, {"Content-Type": "text/html"}, NOT_FOUND_PAGE.format("box").encode())
+    # The same page with one differing word, e.g. a nonce, does not share the fingerprint
+    site.add("/sitemap.xml", NOT_FOUND_PAGE.format("field").replace("Sorry", "Sorry!"),
+             headers={"Content-Type": "text/html"})
+    assert classify(Soft404Detector(), f"{site.url}/sitemap.xml")["soft_404"]
+
+
+def test_text_sitemap_on_a_site_with_a_text_not_found_page_is_reachable(site):
+    site.fallback = (200, {"Content-Type": "text/plain"}, b"Nothing to see here.")
+    site.add("/sitemap.txt", "https://example.com/\nhttps://example.com/about\n",
+             headers={"Content-Type": "text/plain"})
+    result = classify(Soft404Detector(), f"{site.url}/sitemap.txt")
+    assert result["content_kind"] == "text"
+    assert not result["soft_404"]
+    assert result["reachable"]
+
+
+def test_baselines_are_bounded(site):
+    detector = Soft404Detector(max_baselines=2)
+
+    async def fetch_baseline(client, origin, semaphore=None):
+        return {"status_code": 404}
+
+    detector._fetch_baseline = fetch_baseline
+
+    async def run():
+        for origin in ("http://a.test", "http://b.test", "http://a.test", "http://c.test"):
+            await detector.baseline(None, f"{origin}/sitemap.xml")
+
+    asyncio.run(run())
+    # b.test was the least recently used origin
+    assert list(detector.baselines) == ["http://a.test", "http://c.test"]
@@ -0,0 +1,54 @@
+import pytest
+
+from latencyStats import HdrHistogram
+from timeSeriesStore import TimeSeriesStore
+
+
+def sample(timestamp, total_ms):
+    return {
+        "url": "https://example.com/", "timestamp": timestamp, "status_code": 200, "ok": True,
+        "bytes": 1000, "total_ms": total_ms, "ttfb_ms": total_ms / 2,
+    }
+
+
+def stored_counts(store):
+    rows = store.connection.execute(
+        "SELECT bucket, histogram FROM rollup_minute_histogram WHERE metric = 'total_ms' ORDER BY bucket"
+    ).fetchall()
+    return {bucket: HdrHistogram.from_bytes(blob).total_count for bucket, blob in rows}
+
+
+def test_minute_histograms_are_written_on_rollover_and_commit(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "monitor.db"))
+    store.record(sample(120.5, 100))
+    store.record(sample(130.0, 200))
+    assert stored_counts(store) == {}
+
+    # The next minute writes out the previous one
+    store.record(sample(185.0, 300))
+    assert stored_counts(store) == {120: 2}
+
+    # A late sample for the written minute is merged into it
+    store.record(sample(125.0, 400))
+    assert stored_counts(store) == {120: 3}
+
+    store.close()
+    store = TimeSeriesStore(str(tmp_path / "monitor.db"))
+    assert stored_counts(store) == {120: 3, 180: 1}
+    [summary] = store.summary(0)
+    assert summary["count"] == 4
+    assert summary["total_ms"]["p50"] == pytest.approx(200, rel=0.01)
+    assert summary["total_ms"]["p99"] == pytest.approx(400, rel=0.01)
+    store.close()
+
+
+def test_summary_includes_the_current_minute(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "monitor.db"))
+    for total_ms in (100, 200, 300):
+        store.record(sample(60.0, total_ms))
+
+    [summary] = store.summary(0)
+
+    assert summary["ttfb_ms"]["p50"] == pytest.approx(100, rel=0.01)
+    assert summary["total_ms"]["p90"] == pytest.approx(300, rel=0.01)
+    store.close()
@@ -0,0 +1,335 @@
+import time
+import sqlite3
+from icecream import ic
+from latencyStats import SUMMARY_PERCENTILES, HdrHistogram
+
+
+# Constants
+METRICS = ("total_ms", "ttfb_ms", "dns_ms", "connect_ms", "tls_ms", "wait_ms", "receive_ms")
+ROLLUP_RESOLUTIONS = {"minute": 60, "hour": 3600}
+DEFAULT_RETENTION = {"raw": 2 * 24 * 3600, "minute": 30 * 24 * 3600, "hour": 400 * 24 * 3600}
+COMMIT_INTERVAL = 5.0
+# Metrics whose rollups also keep a histogram (in milliseconds, to 2 significant figures)
+HISTOGRAM_METRICS = ("total_ms", "ttfb_ms")
+HISTOGRAM_HIGHEST = 3600 * 1000
+HISTOGRAM_SIGNIFICANT_FIGURES = 2
+
+
+class TimeSeriesStore:
+    """
+    Compact SQLite store for probe samples.
+    Raw samples are kept for a short retention with integer millisecond columns,
+    and every insert also updates per-minute and per-hour rollups (count, errors,
+    and count / sum / sum of squares / min / max of each metric, plus a serialized
+    histogram of the total and first-byte times for percentiles), which are kept
+    longer.
+    Writes are committed at most every few seconds. The histograms of the current
+    buckets are kept in memory and written when their bucket rolls over or on commit.
+    """
+
+    def __init__(self, path, retention=None):
+        """
+        Open (or create) the database.
+        Args:
+            path (str): The database file.
+            retention (dict): Seconds to keep "raw", "minute" and "hour" data (optional).
+        """
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.url_ids = {}
+        # (rollup, url id, metric) -> (bucket, histogram) of the current buckets
+        self.histograms = {}
+        self.dirty_histograms = set()
+        self.last_commit = time.monotonic()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL)")
+        metric_columns = ", ".join(f"{metric} INTEGER" for metric in METRICS)
+        self.connection.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS samples (
+                url_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                status INTEGER,
+                ok INTEGER NOT NULL,
+                bytes INTEGER,
+                {metric_columns},
+                PRIMARY KEY (url_id, ts)
+            ) WITHOUT ROWID
+            """
+        )
+        rollup_columns = ", ".join(
+            f"{metric}_n INTEGER, {metric}_sum INTEGER, {metric}_sq INTEGER, {metric}_min INTEGER, {metric}_max INTEGER"
+            for metric in METRICS
+        )
+        for name in ROLLUP_RESOLUTIONS:
+            self.connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS rollup_{name} (
+                    url_id INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    errors INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    {rollup_columns},
+                    PRIMARY KEY (url_id, bucket)
+                ) WITHOUT ROWID
+                """
+            )
+            self.connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS rollup_{name}_histogram (
+                    url_id INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    metric TEXT NOT NULL,
+                    histogram BLOB NOT NULL,
+                    PRIMARY KEY (url_id, bucket, metric)
+                ) WITHOUT ROWID
+                """
+            )
+        self.connection.commit()
+
+    def url_id(self, url):
+        """
+        Get the id of a URL, adding it if needed.
+        Args:
+            url (str): The URL.
+        Returns:
+            int: The id.
+        """
+        if url not in self.url_ids:
+            self.connection.execute("INSERT OR IGNORE INTO urls (url) VALUES (?)", (url,))
+            self.url_ids[url] = self.connection.execute("SELECT id FROM urls WHERE url = ?", (url,)).fetchone()[0]
+        return self.url_ids[url]
+
+    def record(self, sample):
+        """
+        Store one sample and fold it into the rollups.
+        Args:
+            sample (dict): "url", "timestamp" (Unix seconds), "status_code", "ok",
+                "bytes" and the METRICS in milliseconds (None if not measured).
+        """
+        url_id = self.url_id(sample["url"])
+        ts = int(sample["timestamp"] * 1000)
+        values = [None if sample.get(metric) is None else round(sample[metric]) for metric in METRICS]
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(METRICS))})",
+            (url_id, ts, sample["status_code"], int(sample["ok"]), sample["bytes"], *values),
+        )
+
+        # Missing metrics are left out of the metric's count, sums, min and max
+        inserts = []
+        updates = []
+        for metric, value in zip(METRICS, values):
+            inserts += [int(value is not None), value or 0, (value or 0) ** 2, value, value]
+            updates.append(
+                f"{metric}_n = {metric}_n + excluded.{metric}_n, "
+                f"{metric}_sum = {metric}_sum + excluded.{metric}_sum, "
+                f"{metric}_sq = {metric}_sq + excluded.{metric}_sq, "
+                f"{metric}_min = min(coalesce({metric}_min, excluded.{metric}_min), "
+                f"coalesce(excluded.{metric}_min, {metric}_min)), "
+                f"{metric}_max = max(coalesce({metric}_max, excluded.{metric}_max), "
+                f"coalesce(excluded.{metric}_max, {metric}_max))"
+            )
+        for name, resolution in ROLLUP_RESOLUTIONS.items():
+            bucket = int(sample["timestamp"]) // resolution * resolution
+            self.connection.execute(
+                f"""
+                INSERT INTO rollup_{name} VALUES (?, ?, 1, ?, ?, {', '.join('?' * len(inserts))})
+                ON CONFLICT (url_id, bucket) DO UPDATE SET
+                    count = count + 1,
+                    errors = errors + excluded.errors,
+                    bytes = bytes + excluded.bytes,
+                    {', '.join(updates)}
+                """,
+                (url_id, bucket, int(not sample["ok"]), sample["bytes"] or 0, *inserts),
+            )
+            for metric in HISTOGRAM_METRICS:
+                if sample.get(metric) is not None:
+                    self.record_histogram(name, url_id, bucket, metric, sample[metric])
+        if time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+            self.commit()
+
+    def record_histogram(self, name, url_id, bucket, metric, value):
+        """
+        Add a value to the histogram of a rollup bucket.
+        The current bucket's histogram is updated in memory; a newer bucket writes it
+        out first, and a late value for an older bucket goes straight to the database.
+        Args:
+            name (str): The rollup, "minute" or "hour".
+            url_id (int): The URL id.
+            bucket (int): The bucket start in Unix seconds.
+            metric (str): The metric name.
+            value (float): The value in milliseconds.
+        """
+        key = (name, url_id, metric)
+        current = self.histograms.get(key)
+        if current is not None and bucket < current[0]:
+            histogram = self.load_histogram(name, url_id, bucket, metric)
+            histogram.record(value)
+            self.write_histogram(name, url_id, bucket, metric, histogram)
+            return
+        if current is None or bucket > current[0]:
+            if key in self.dirty_histograms:
+                self.write_histogram(name, url_id, current[0], metric, current[1])
+            current = self.histograms[key] = (bucket, self.load_histogram(name, url_id, bucket, metric))
+        current[1].record(value)
+        self.dirty_histograms.add(key)
+
+    def load_histogram(self, name, url_id, bucket, metric):
+        """
+        Read the stored histogram of a rollup bucket.
+        Args:
+            name (str): The rollup, "minute" or "hour".
+            url_id (int): The URL id.
+            bucket (int): The bucket start in Unix seconds.
+            metric (str): The metric name.
+        Returns:
+            HdrHistogram: The histogram, empty if none is stored yet.
+        """
+        row = self.connection.execute(
+            f"SELECT histogram FROM rollup_{name}_histogram WHERE url_id = ? AND bucket = ? AND metric = ?",
+            (url_id, bucket, metric),
+        ).fetchone()
+        if row is None:
+            return HdrHistogram(HISTOGRAM_HIGHEST, HISTOGRAM_SIGNIFICANT_FIGURES, unit=1)
+        return HdrHistogram.from_bytes(row[0])
+
+    def write_histogram(self, name, url_id, bucket, metric, histogram):
+        """
+        Store the histogram of a rollup bucket, replacing the previous one.
+        Args:
+            name (str): The rollup, "minute" or "hour".
+            url_id (int): The URL id.
+            bucket (int): The bucket start in Unix seconds.
+            metric (str): The metric name.
+            histogram (HdrHistogram): The histogram.
+        """
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO rollup_{name}_histogram VALUES (?, ?, ?, ?)",
+            (url_id, bucket, metric, histogram.to_bytes()),
+        )
+
+    def flush_histograms(self, now=None):
+        """
+        Write the in-memory histograms changed since the last flush, and forget the
+        ones whose bucket has ended.
+        Args:
+            now (float): The current Unix time (default: now).
+        """
+        now = time.time() if now is None else now
+        for key, (bucket, histogram) in list(self.histograms.items()):
+            name, url_id, metric = key
+            if key in self.dirty_histograms:
+                self.write_histogram(name, url_id, bucket, metric, histogram)
+            if bucket + ROLLUP_RESOLUTIONS[name] <= now:
+                del self.histograms[key]
+        self.dirty_histograms.clear()
+
+    def commit(self):
+        """
+        Write the in-memory histograms and commit pending writes.
+        """
+        self.flush_histograms()
+        self.connection.commit()
+        self.last_commit = time.monotonic()
+
+    def prune(self, now=None):
+        """
+        Delete raw samples and rollups older than their retention.
+        Args:
+            now (float): The current Unix time (default: now).
+        Returns:
+            int: The number of deleted rows.
+        """
+        now = time.time() if now is None else now
+        deleted = self.connection.execute(
+            "DELETE FROM samples WHERE ts < ?", (int((now - self.retention["raw"]) * 1000),)
+        ).rowcount
+        for name in ROLLUP_RESOLUTIONS:
+            for table in (f"rollup_{name}", f"rollup_{name}_histogram"):
+                deleted += self.connection.execute(
+                    f"DELETE FROM {table} WHERE bucket < ?", (int(now - self.retention[name]),)
+                ).rowcount
+        self.commit()
+        ic(f"Pruned {deleted} expired rows")
+        return deleted
+
+    def summary(self, since, resolution="minute"):
+        """
+        Aggregate the rollups of every URL since a point in time.
+        Args:
+            since (float): Unix time to aggregate from.
+            resolution (str): The rollup to read, "minute" or "hour".
+        Returns:
+            list: One dict per URL with count, errors, error_rate, bytes, and the
+                mean, standard deviation, min and max in milliseconds of every metric
+                (None for metrics that were never measured), plus the SUMMARY_PERCENTILES
+                of the HISTOGRAM_METRICS.
+        """
+        self.flush_histograms()
+        bucket_start = int(since) // ROLLUP_RESOLUTIONS[resolution] * ROLLUP_RESOLUTIONS[resolution]
+        metric_columns = ", ".join(
+            f"sum({metric}_n), sum({metric}_sum), sum({metric}_sq), min({metric}_min), max({metric}_max)"
+            for metric in METRICS
+        )
+        rows = self.connection.execute(
+            f"""
+            SELECT url, sum(count), sum(errors), sum(bytes), {metric_columns}
+            FROM rollup_{resolution} JOIN urls ON urls.id = url_id
+            WHERE bucket >= ?
+            GROUP BY url ORDER BY url
+            """,
+            (bucket_start,),
+        ).fetchall()
+
+        # Merge the bucket histograms of each URL and metric
+        histograms = {}
+        for url, metric, blob in self.connection.execute(
+            f"""
+            SELECT url, metric, histogram
+            FROM rollup_{resolution}_histogram JOIN urls ON urls.id = url_id
+            WHERE bucket >= ?
+            """,
+            (bucket_start,),
+        ):
+            histogram = HdrHistogram.from_bytes(blob)
+            if (url, metric) in histograms:
+                histograms[url, metric].merge(histogram)
+            else:
+                histograms[url, metric] = histogram
+
+        summaries = []
+        for url, count, errors, total_bytes, *metric_values in rows:
+            summary = {
+                "url": url,
+                "count": count,
+                "errors": errors,
+                "error_rate": errors / count if count else 0.0,
+                "bytes": total_bytes,
+            }
+            for number, metric in enumerate(METRICS):
+                n, total, squares, minimum, maximum = metric_values[number * 5:number * 5 + 5]
+                if not n:
+                    summary[metric] = None
+                    continue
+                mean = total / n
+                summary[metric] = {
+                    "mean": mean,
+                    "stddev": max(0.0, squares / n - mean ** 2) ** 0.5,
+                    "min": minimum,
+                    "max": maximum,
+                }
+                histogram = histograms.get((url, metric))
+                if histogram is not None:
+                    for percent in SUMMARY_PERCENTILES:
+                        summary[metric][f"p{percent}"] = histogram.percentile(percent)
+            summaries.append(summary)
+        return summaries
+
+    def close(self):
+        """
+        Commit pending writes and close the database.
+        """
+        self.commit()
+        self.connection.close()